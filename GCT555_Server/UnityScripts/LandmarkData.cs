@@ -12,37 +12,79 @@ public class Landmark
     public Vector3 worldPosition;
 }
 
+//[Serializable]
+//public class PoseData
+//{
+    //public List<Landmark> landmarks;
+    //public List<Landmark> world_landmarks;
+//}
+
+//[Serializable]
+//public class Hand
+//{
+    //public string handedness;
+    //public List<Landmark> landmarks;
+    //public List<Landmark> world_landmarks;
+//}
+
 [Serializable]
-public class PoseData
+public class HandData
 {
-    public List<Landmark> landmarks;
-    public List<Landmark> world_landmarks;
+    public List<Hand> hands;
 }
 
+//[Serializable]
+//public class Face
+//{
+    //public List<Landmark> landmarks;
+//}
+
 [Serializable]
-public class Hand
+public class FaceData
 {
-    public string handedness;
-    public List<Landmark> landmarks;
-    public List<Landmark> world_landmarks;
+    public List<Face> faces;
+    // Blendshapes parsing might need a custom parser or different structure depending on JsonUtility limits
+    // but for now we focus on landmarks.
 }
 
+//------------------------------------------------------
 [Serializable]
-public class HandData
+public class DepthInfo
 {
-    public List<Hand> hands;
+    public string mode;
+    public float global_z;
+    public List<float> per_landmark_z;
+}
+
+[Serializable]
+public class FacePose
+{
+    public float tx;
+    public float ty;
+    public float tz;
 }
 
 [Serializable]
 public class Face
 {
     public List<Landmark> landmarks;
+    public FacePose face_pose;
+    public DepthInfo depth;
 }
 
 [Serializable]
-public class FaceData
+public class PoseData
 {
-    public List<Face> faces;
-    // Blendshapes parsing might need a custom parser or different structure depending on JsonUtility limits
-    // but for now we focus on landmarks.
+    public List<Landmark> landmarks;
+    public List<Landmark> world_landmarks;
+    public DepthInfo depth;
 }
+
+[Serializable]
+public class Hand
+{
+    public string handedness;
+    public List<Landmark> landmarks;
+    public List<Landmark> world_landmarks;
+    public DepthInfo depth;
+}
\ No newline at end of file
@@ -1,6 +1,7 @@
 using System;
 using System.Collections;
 using System.Collections.Generic;
+using System.Net;
 using System.Net.Sockets;
 using System.Text;
 using System.Threading;
@@ -15,27 +16,106 @@ public class StreamClient : MonoBehaviour
     public int port = 5050;
     public ClientType clientType;
     public bool autoConnect = true;
+    public bool useBinaryProtocol = false;
+    // Requests the compact binary framing (length-prefixed float32 arrays) instead of newline JSON.
+    // Requires a server that understands the {"encoding": "binary"} hello line.
+    public bool useDeltaProtocol = false;
+    // Requests keyframes + int16 deltas of only the landmarks that moved (lowest bandwidth, e.g. Wi-Fi headsets).
+    // Takes precedence over useBinaryProtocol. Requires a server that understands {"encoding": "delta"}.
+    public bool useUdp = false;
+    // Receives frames as UDP datagrams instead of the TCP stream (same LAN, server with UDP_STREAM = True).
+    // A late or lost frame is skipped instead of holding back newer ones. Delta is received as binary over UDP.
+    public string subscribeSubset = "";
+    // Named landmark subsets, comma-separated: e.g. "lips,eyes" (face), "upper_body" (pose), "fingertips" (hand).
+    // Only those landmarks are sent, in the subset's order (see GCT555_Server/subscription.py). Empty = all.
+    // A subset (or fields) is received as binary when delta is selected; the server's info message says so.
+    public string subscribeFields = "";
+    // Comma-separated fields to receive, e.g. "landmarks,depth". Empty = all.
+    public float maxRate = 0f;
+    // Most frames per second the server sends this client, 0 = every frame.
+    public bool blendshapeStream = false;
+    // Face only: receives just the blendshape scores and head transform of the first face, into
+    // blendshapeNames / latestBlendshapes / latestHeadTransform (no landmarks are drawn).
+    public bool quantizeBlendshapes = false;
+    // Blendshape scores as one byte each instead of float32.
+
+    [Header("Blendshapes (blendshapeStream)")]
+    public string[] blendshapeNames;        // score order, sent once by the server at connect
+    public float[] latestBlendshapes;       // 0..1, in blendshapeNames order
+    public float[] latestHeadTransform;     // 3x4 row-major, see HeadTransform()
 
     [Header("Visualization")]
     public GameObject landmarkPrefab; 
     public float landmarkScale = 0.04f;
+    // Size of each landmark GameObject in Unity world space.
+    // Increase for better visibility, decrease if landmarks look too large.
     public float depthMultiplier = 10.0f; 
-    public Vector3 positionOffset = new Vector3(0, 0, -0.2f); // Offset to bring closer/push back
+    // Multiplies incoming depth values before applying them to Z.
+    // Increase this if forward/backward movement is too subtle.
+    // Decrease it if landmarks move too far in depth.
+    public Vector3 positionOffset = new Vector3(0, 0, -0.2f); 
+    // Global offset applied after XY/Z placement.
+    // Useful for moving the whole landmark set slightly forward/backward or sideways.
     public bool usePseudoDepth = true;
+    // Enables image-size-based heuristic depth adjustment.
+    // Disable this if you want to rely mainly on the depth module output.
     public float depthScale = 2.0f;
+    // Strength of pseudo-depth when usePseudoDepth is enabled.
+    // Increase to exaggerate image-size-based distance changes.
+    // Decrease if pseudo-depth interferes with the new depth module.
     public bool invertDepth = false;
-    public bool mirrorX = true; // Default to true for "Mirror" feel on webcam
+    // Inverts the pseudo-depth direction only.
+    // Turn this on if pseudo-depth moves objects in the wrong direction.
+    public bool mirrorX = true; 
+    // Mirrors X coordinates horizontally.
+    // Keep this on for webcam-style mirror behavior.
+    // Turn it off if you want true camera-space left/right behavior.
     public Transform visualizationRoot; 
     public QuadDisplay quadDisplay;
 
+    //-----------------------------
+    [Header("Depth-based XY Compensation")] 
+    public bool useXYDepthCompensation = true;
+    // Enables depth-based XY scale compensation.
+    // Turn this on to reduce the apparent size change when the user moves closer/farther.
+    public float xyDepthCompensationStrength = 1.0f;
+    // Controls how strongly XY spread is reduced as depth changes.
+    // Increase this if landmarks still grow too much when moving closer.
+    // Decrease this if the shape becomes too compressed.
+
+    public bool useAbsGlobalDepthForCompensation = true;
+    // Uses the absolute value of global depth when computing XY compensation.
+    // Usually safer if depth sign may vary.
+    // Turn this off only if you explicitly want sign-dependent XY scaling behavior.
+
+    public float xyCompensationMinScale = 0.2f;
+    // Minimum allowed XY compensation scale.
+    // Prevents landmarks from collapsing too much toward the center.
+    public float xyCompensationMaxScale = 2.0f;
+    // Maximum allowed XY compensation scale.
+    // Usually keep this near 1.0 if the goal is only to shrink close-up spread.
+    //-----------------------------
+
     private TcpClient socket;
+    private UdpClient udpSocket;
+    private const double UdpHelloInterval = 1.0; // seconds; the server forgets clients silent for 5 s
     private NetworkStream stream;
     private Thread receiveThread;
     private bool isRunning = false;
     private bool dataReceived = false;
     private string latestJsonData = "";
+    private object latestBinaryFrame;
+    private bool hasDeltaKeyframe = false;
+    private volatile bool receivingDelta = false;   // the encoding the server actually sends (see OnInfoFrame)
+    private volatile bool reconnectRequested = false;
+    private const int MaxFrameBytes = 1 << 24;      // larger "lengths" are JSON text: the hello reached the server too late
+    private uint deltaKeyframeId;
+    private List<float[][]> deltaKeyframe = new List<float[][]>();
+    private List<float[][]> deltaCurrent = new List<float[][]>();
+    private static readonly string[] BinaryDepthModes = { "pose_world", "pose_face_abs", "hand_world", "face_transform_plus_local" };
     private List<GameObject> spawnedLandmarks = new List<GameObject>();
     public List<Landmark> activeLandmarks;
+    public PoseData latestPoseData;
 
     void Start()
     {
@@ -50,13 +130,22 @@ public class StreamClient : MonoBehaviour
     public void Connect()
     {
         if (isRunning) return;
+        if (useUdp) { ConnectUdp(); return; }
         try
         {
             socket = new TcpClient();
             socket.Connect(ipAddress, port);
             stream = socket.GetStream();
+            if (UsesFraming || HasSubscription)
+            {
+                string encoding = blendshapeStream ? "binary" : (useDeltaProtocol ? "delta" : (useBinaryProtocol ? "binary" : "json"));
+                byte[] hello = Encoding.UTF8.GetBytes(Hello(encoding) + "\n");
+                stream.Write(hello, 0, hello.Length);
+            }
+            hasDeltaKeyframe = false;
+            receivingDelta = useDeltaProtocol && !blendshapeStream;
             isRunning = true;
-            receiveThread = new Thread(ReceiveData);
+            receiveThread = new Thread(UsesFraming ? ReceiveBinaryData : ReceiveData);
             receiveThread.IsBackground = true;
             receiveThread.Start();
             Debug.Log($"[{clientType}] Connected to {ipAddress}:{port}");
@@ -70,6 +159,113 @@ public class StreamClient : MonoBehaviour
         if (receiveThread != null && receiveThread.IsAlive) receiveThread.Join(100);
         if (stream != null) stream.Close();
         if (socket != null) socket.Close();
+        if (udpSocket != null)
+        {
+            try { SendUdpHello("{\"bye\": true}"); } catch (Exception) { }
+            udpSocket.Close();
+            udpSocket = null;
+        }
+    }
+
+    private void ConnectUdp()
+    {
+        try
+        {
+            udpSocket = new UdpClient();
+            udpSocket.Connect(ipAddress, port);
+            udpSocket.Client.ReceiveTimeout = 1000;
+            SendUdpHello(UdpHello);
+            isRunning = true;
+            receiveThread = new Thread(ReceiveUdpData);
+            receiveThread.IsBackground = true;
+            receiveThread.Start();
+            Debug.Log($"[{clientType}] Receiving UDP from {ipAddress}:{port}");
+        }
+        catch (Exception e) { Debug.LogError($"[{clientType}] Connection Error: {e.Message}"); }
+    }
+
+    private string UdpHello { get { return Hello(UsesFraming ? "binary" : "json"); } }
+
+    private bool HasSubscription
+    {
+        get
+        {
+            return !string.IsNullOrEmpty(subscribeSubset) || !string.IsNullOrEmpty(subscribeFields) || maxRate > 0f
+                || blendshapeStream;
+        }
+    }
+
+    // The hello line / datagram: encoding plus the optional subscription
+    private string Hello(string encoding)
+    {
+        StringBuilder hello = new StringBuilder("{\"encoding\": \"" + encoding + "\"");
+        if (!string.IsNullOrEmpty(subscribeSubset)) hello.Append(", \"subset\": \"" + subscribeSubset + "\"");
+        if (!string.IsNullOrEmpty(subscribeFields)) hello.Append(", \"fields\": \"" + subscribeFields + "\"");
+        if (maxRate > 0f) hello.Append(", \"max_rate\": " + maxRate.ToString(System.Globalization.CultureInfo.InvariantCulture));
+        if (blendshapeStream) hello.Append(", \"mode\": \"blendshapes\"" + (quantizeBlendshapes ? ", \"quantize\": \"uint8\"" : ""));
+        return hello.Append("}").ToString();
+    }
+
+    // Subscribed clients first receive one info message describing the subscription: the encoding
+    // the server chose (a narrowed delta subscription is served as binary) and the blendshape score names
+    private const byte InfoModality = 0xFF;
+    private const byte BlendshapeModality = 3;
+    private static bool IsInfoLine(string line) { return line.StartsWith("{\"info\""); }
+    private static bool IsInfoFrame(byte[] body) { return body.Length > 1 && body[1] == InfoModality; }
+
+    [Serializable]
+    private class StreamInfo { public string encoding; public string[] blendshape_names; }
+
+    private void OnInfoFrame(byte[] body)
+    {
+        StreamInfo info = JsonUtility.FromJson<StreamInfo>(Encoding.UTF8.GetString(body, 16, body.Length - 16));
+        if (info == null) return;
+        if (!string.IsNullOrEmpty(info.encoding))
+        {
+            bool delta = info.encoding == "delta";
+            if (delta != receivingDelta)
+                Debug.Log($"[{clientType}] Server sends {info.encoding} frames for this subscription");
+            receivingDelta = delta;
+        }
+        if (info.blendshape_names != null && info.blendshape_names.Length > 0)
+            blendshapeNames = info.blendshape_names;
+    }
+
+    // "Blendshape frames" in GCT555_Server/wire_protocol.py: 16-byte header (face count at 2, quantized at 3),
+    // then per face uint8 flags, uint8 n_scores, the scores and, if flagged, float32[12] head transform
+    private void ParseBlendshapeFrame(byte[] body)
+    {
+        int faceCount = body[2];
+        bool quantized = body[3] != 0;
+        if (faceCount == 0) return;
+        int offset = 16;
+        byte flags = body[offset++];
+        int count = body[offset++];
+        float[] scores = new float[count];
+        for (int i = 0; i < count; i++)
+        {
+            if (quantized) scores[i] = body[offset++] / 255f;
+            else { scores[i] = BitConverter.ToSingle(body, offset); offset += 4; }
+        }
+        if ((flags & 0x01) != 0) latestHeadTransform = ReadFloats(body, ref offset, 12).ToArray();
+        latestBlendshapes = scores;
+    }
+
+    // The head transform as a Unity matrix (MediaPipe's right-handed camera space, not converted)
+    public Matrix4x4 HeadTransform()
+    {
+        float[] t = latestHeadTransform;
+        Matrix4x4 m = Matrix4x4.identity;
+        if (t == null || t.Length < 12) return m;
+        for (int row = 0; row < 3; row++)
+            m.SetRow(row, new Vector4(t[row * 4], t[row * 4 + 1], t[row * 4 + 2], t[row * 4 + 3]));
+        return m;
+    }
+
+    private void SendUdpHello(string hello)
+    {
+        byte[] data = Encoding.UTF8.GetBytes(hello);
+        udpSocket.Send(data, data.Length);
     }
 
     private void ReceiveData()
@@ -92,79 +288,583 @@ public class StreamClient : MonoBehaviour
                     while ((newlineIndex = currentStr.IndexOf('\n')) != -1)
                     {
                         string jsonLine = currentStr.Substring(0, newlineIndex);
+                        currentStr = currentStr.Substring(newlineIndex + 1);
+                        if (IsInfoLine(jsonLine)) continue;
                         latestJsonData = jsonLine;
                         dataReceived = true;
-                        currentStr = currentStr.Substring(newlineIndex + 1);
                     }
                     jsonBuilder.Clear();
                     jsonBuilder.Append(currentStr);
                 }
-                else Thread.Sleep(5);
+                else
+                    Thread.Sleep(100);
+            }
+            catch (Exception) { isRunning = false; }
+        }
+    }
+
+    private void ReceiveBinaryData()
+    {
+        byte[] lengthBuffer = new byte[4];
+
+        while (isRunning)
+        {
+            try
+            {
+                if (!ReadExactly(lengthBuffer, 4)) { isRunning = false; break; }
+                int length = BitConverter.ToInt32(lengthBuffer, 0);
+                if (length < 0 || length > MaxFrameBytes)
+                {
+                    // The server sent JSON (it closes such connections); connect again with the hello first
+                    Debug.LogWarning($"[{clientType}] Received JSON instead of binary frames, reconnecting");
+                    reconnectRequested = true;
+                    isRunning = false;
+                    break;
+                }
+                byte[] body = new byte[length];
+                if (!ReadExactly(body, length)) { isRunning = false; break; }
+                if (IsInfoFrame(body)) { OnInfoFrame(body); continue; }
+                if (blendshapeStream)
+                {
+                    if (body[1] == BlendshapeModality) { ParseBlendshapeFrame(body); dataReceived = true; }
+                    continue;
+                }
+
+                object frame = receivingDelta ? ParseDeltaFrame(body) : ParseBinaryFrame(body);
+                if (frame == null) continue; // delta against a keyframe we never received
+                latestBinaryFrame = frame;
+                dataReceived = true;
             }
             catch (Exception) { isRunning = false; }
         }
     }
 
+    // Datagram framing, see the "UDP datagrams" section of GCT555_Server/wire_protocol.py:
+    // "GU", chunk index, chunk count, uint32 frame seq, float64 timestamp, then a piece of the frame.
+    private void ReceiveUdpData()
+    {
+        IPEndPoint remote = new IPEndPoint(IPAddress.Any, 0);
+        DateTime nextHello = DateTime.UtcNow.AddSeconds(UdpHelloInterval);
+        bool hasCompleted = false;
+        uint completedSeq = 0;
+        bool assembling = false;
+        uint assemblingSeq = 0;
+        byte[][] chunks = null;
+        int missing = 0;
+
+        while (isRunning)
+        {
+            byte[] datagram;
+            try
+            {
+                // The hello doubles as keep-alive
+                if (DateTime.UtcNow >= nextHello)
+                {
+                    SendUdpHello(UdpHello);
+                    nextHello = DateTime.UtcNow.AddSeconds(UdpHelloInterval);
+                }
+                datagram = udpSocket.Receive(ref remote);
+            }
+            catch (SocketException) { continue; } // receive timeout, or nothing listening yet
+            catch (ObjectDisposedException) { break; }
+
+            if (datagram.Length < 16 || datagram[0] != (byte)'G' || datagram[1] != (byte)'U') continue;
+            int index = datagram[2];
+            int count = datagram[3];
+            uint seq = BitConverter.ToUInt32(datagram, 4);
+            // Stale or duplicate: not newer than the last frame handed on
+            if (index >= count || (hasCompleted && !IsNewerSeq(seq, completedSeq))) continue;
+
+            if (!assembling || seq != assemblingSeq)
+            {
+                if (assembling && !IsNewerSeq(seq, assemblingSeq)) continue; // late chunk of an older frame
+                assembling = true;
+                assemblingSeq = seq;
+                chunks = new byte[count][];
+                missing = count;
+            }
+            if (count != chunks.Length || chunks[index] != null) continue;
+            chunks[index] = datagram;
+            if (--missing > 0) continue;
+
+            assembling = false;
+            hasCompleted = true;
+            completedSeq = seq;
+            try { OnUdpFrame(JoinUdpChunks(chunks)); }
+            catch (Exception e) { Debug.LogError($"[{clientType}] UDP frame error: {e.Message}"); }
+        }
+    }
+
+    private static bool IsNewerSeq(uint seq, uint than)
+    {
+        uint distance = unchecked(seq - than);
+        return distance != 0 && distance < 0x80000000u;
+    }
+
+    private static byte[] JoinUdpChunks(byte[][] chunks)
+    {
+        int total = 0;
+        foreach (byte[] chunk in chunks) total += chunk.Length - 16;
+        byte[] frame = new byte[total];
+        int offset = 0;
+        foreach (byte[] chunk in chunks)
+        {
+            Buffer.BlockCopy(chunk, 16, frame, offset, chunk.Length - 16);
+            offset += chunk.Length - 16;
+        }
+        return frame;
+    }
+
+    // The reassembled frame is exactly what the TCP stream carries
+    private void OnUdpFrame(byte[] frame)
+    {
+        if (UsesFraming)
+        {
+            int length = BitConverter.ToInt32(frame, 0);
+            byte[] body = new byte[length];
+            Buffer.BlockCopy(frame, 4, body, 0, length);
+            if (IsInfoFrame(body)) { OnInfoFrame(body); return; }
+            if (blendshapeStream)
+            {
+                if (body[1] == BlendshapeModality) { ParseBlendshapeFrame(body); dataReceived = true; }
+                return;
+            }
+            object parsed = ParseBinaryFrame(body);
+            if (parsed == null) return;
+            latestBinaryFrame = parsed;
+        }
+        else
+        {
+            string line = Encoding.UTF8.GetString(frame).TrimEnd('\n');
+            if (IsInfoLine(line)) return;
+            latestJsonData = line;
+        }
+        dataReceived = true;
+    }
+
+    private bool ReadExactly(byte[] buffer, int count)
+    {
+        int offset = 0;
+        while (offset < count)
+        {
+            int bytesRead = stream.Read(buffer, offset, count - offset);
+            if (bytesRead <= 0) return false;
+            offset += bytesRead;
+        }
+        return true;
+    }
+
+    // Layout mirrors GCT555_Server/wire_protocol.py (all values little-endian).
+    private object ParseBinaryFrame(byte[] body)
+    {
+        int offset = 0;
+        offset += 1; // protocol version
+        byte modality = body[offset++];
+        int itemCount = BitConverter.ToUInt16(body, offset); offset += 2;
+        offset += 4 + 8; // frame_id, timestamp
+
+        PoseData pose = null;
+        HandData handData = new HandData { hands = new List<Hand>() };
+        FaceData faceData = new FaceData { faces = new List<Face>() };
+
+        for (int item = 0; item < itemCount; item++)
+        {
+            int landmarkCount = BitConverter.ToUInt16(body, offset);
+            int worldCount = BitConverter.ToUInt16(body, offset + 2);
+            int blendshapeCount = BitConverter.ToUInt16(body, offset + 4);
+            byte depthMode = body[offset + 6];
+            byte flags = body[offset + 7];
+            float globalZ = BitConverter.ToSingle(body, offset + 8);
+            offset += 12;
+
+            List<Landmark> landmarks = ReadLandmarks(body, ref offset, landmarkCount);
+            List<Landmark> world = ReadLandmarks(body, ref offset, worldCount);
+
+            DepthInfo depth = new DepthInfo();
+            depth.mode = depthMode < BinaryDepthModes.Length ? BinaryDepthModes[depthMode] : "unknown";
+            depth.global_z = globalZ;
+            depth.per_landmark_z = ReadFloats(body, ref offset, landmarkCount);
+
+            // Blendshape scores are not used by this client yet
+            offset += blendshapeCount * 4;
+
+            FacePose facePose = null;
+            if ((flags & 0x04) != 0)
+            {
+                List<float> t = ReadFloats(body, ref offset, 3);
+                facePose = new FacePose { tx = t[0], ty = t[1], tz = t[2] };
+            }
+
+            AddParsedItem(modality, flags, landmarks, world, depth, facePose, ref pose, handData, faceData);
+        }
+
+        return SelectParsedFrame(modality, pose, handData, faceData);
+    }
+
+    private static void AddParsedItem(byte modality, byte flags, List<Landmark> landmarks, List<Landmark> world,
+        DepthInfo depth, FacePose facePose, ref PoseData pose, HandData handData, FaceData faceData)
+    {
+        switch (modality)
+        {
+            case 0:
+                pose = new PoseData { landmarks = landmarks, world_landmarks = world, depth = depth };
+                break;
+            case 1:
+                int handCode = flags & 0x03;
+                string handedness = handCode == 1 ? "Left" : (handCode == 2 ? "Right" : "Unknown");
+                handData.hands.Add(new Hand { handedness = handedness, landmarks = landmarks, world_landmarks = world, depth = depth });
+                break;
+            case 2:
+                faceData.faces.Add(new Face { landmarks = landmarks, face_pose = facePose, depth = depth });
+                break;
+        }
+    }
+
+    private static object SelectParsedFrame(byte modality, PoseData pose, HandData handData, FaceData faceData)
+    {
+        switch (modality)
+        {
+            case 0: return pose;
+            case 1: return handData;
+            case 2: return faceData;
+        }
+        return null;
+    }
+
+    // Delta framing, see the "delta" section of GCT555_Server/wire_protocol.py.
+    // Keyframes replace the stored values; delta frames patch the rows that moved:
+    //   value = keyframe_value + delta * resolution
+    private object ParseDeltaFrame(byte[] body)
+    {
+        int offset = 0;
+        offset += 1; // protocol version
+        byte modality = body[offset++];
+        bool isKeyframe = body[offset++] == 0;
+        int itemCount = BitConverter.ToUInt16(body, offset); offset += 2;
+        offset += 4; // frame_id
+        uint keyframeId = BitConverter.ToUInt32(body, offset); offset += 4;
+        offset += 8; // timestamp
+        float resolution = BitConverter.ToSingle(body, offset); offset += 4;
+
+        if (isKeyframe)
+        {
+            deltaKeyframe.Clear();
+            deltaCurrent.Clear();
+            deltaKeyframeId = keyframeId;
+            hasDeltaKeyframe = true;
+        }
+        else if (!hasDeltaKeyframe || keyframeId != deltaKeyframeId)
+            return null;
+
+        PoseData pose = null;
+        HandData handData = new HandData { hands = new List<Hand>() };
+        FaceData faceData = new FaceData { faces = new List<Face>() };
+
+        for (int item = 0; item < itemCount; item++)
+        {
+            byte depthMode = body[offset];
+            byte flags = body[offset + 1];
+            int channelCount = body[offset + 2];
+            float globalZ = BitConverter.ToSingle(body, offset + 3);
+            offset += 7;
+
+            FacePose facePose = null;
+            if ((flags & 0x04) != 0)
+            {
+                List<float> t = ReadFloats(body, ref offset, 3);
+                facePose = new FacePose { tx = t[0], ty = t[1], tz = t[2] };
+            }
+
+            if (isKeyframe)
+            {
+                deltaKeyframe.Add(new float[channelCount][]);
+                deltaCurrent.Add(new float[channelCount][]);
+            }
+
+            int[] rowCounts = new int[channelCount];
+            for (int ch = 0; ch < channelCount; ch++)
+            {
+                int rows = BitConverter.ToUInt16(body, offset);
+                int cols = body[offset + 2];
+                int sent = BitConverter.ToUInt16(body, offset + 3);
+                offset += 5;
+                rowCounts[ch] = rows;
+
+                if (isKeyframe)
+                {
+                    float[] values = new float[rows * cols];
+                    Buffer.BlockCopy(body, offset, values, 0, values.Length * 4);
+                    offset += values.Length * 4;
+                    deltaKeyframe[item][ch] = values;
+                    deltaCurrent[item][ch] = (float[])values.Clone();
+                }
+                else
+                {
+                    float[] key = deltaKeyframe[item][ch];
+                    float[] current = deltaCurrent[item][ch];
+                    int deltaOffset = offset + sent * 2;
+                    for (int i = 0; i < sent; i++)
+                    {
+                        int row = BitConverter.ToUInt16(body, offset + i * 2);
+                        for (int c = 0; c < cols; c++)
+                        {
+                            int k = row * cols + c;
+                            current[k] = key[k] + BitConverter.ToInt16(body, deltaOffset) * resolution;
+                            deltaOffset += 2;
+                        }
+                    }
+                    offset = deltaOffset;
+                }
+            }
+
+            // Channel 0: x, y, z, visibility, per_landmark_z. Channel 1: world landmarks (pose / hand) or blendshapes (face).
+            float[] lm = deltaCurrent[item][0];
+            List<Landmark> landmarks = new List<Landmark>(rowCounts[0]);
+            List<float> perLandmarkZ = new List<float>(rowCounts[0]);
+            for (int i = 0; i < rowCounts[0]; i++)
+            {
+                landmarks.Add(new Landmark { x = lm[i * 5], y = lm[i * 5 + 1], z = lm[i * 5 + 2], visibility = lm[i * 5 + 3] });
+                perLandmarkZ.Add(lm[i * 5 + 4]);
+            }
+
+            List<Landmark> world = new List<Landmark>();
+            if (modality != 2 && channelCount > 1)
+            {
+                float[] w = deltaCurrent[item][1];
+                for (int i = 0; i < rowCounts[1]; i++)
+                    world.Add(new Landmark { x = w[i * 4], y = w[i * 4 + 1], z = w[i * 4 + 2], visibility = w[i * 4 + 3] });
+            }
+
+            DepthInfo depth = new DepthInfo();
+            depth.mode = depthMode < BinaryDepthModes.Length ? BinaryDepthModes[depthMode] : "unknown";
+            depth.global_z = globalZ;
+            depth.per_landmark_z = perLandmarkZ;
+
+            AddParsedItem(modality, flags, landmarks, world, depth, facePose, ref pose, handData, faceData);
+        }
+
+        return SelectParsedFrame(modality, pose, handData, faceData);
+    }
+
+    private static List<Landmark> ReadLandmarks(byte[] body, ref int offset, int count)
+    {
+        List<Landmark> list = new List<Landmark>(count);
+        for (int i = 0; i < count; i++)
+        {
+            Landmark lm = new Landmark();
+            lm.x = BitConverter.ToSingle(body, offset);
+            lm.y = BitConverter.ToSingle(body, offset + 4);
+            lm.z = BitConverter.ToSingle(body, offset + 8);
+            lm.visibility = BitConverter.ToSingle(body, offset + 12);
+            offset += 16;
+            list.Add(lm);
+        }
+        return list;
+    }
+
+    private static List<float> ReadFloats(byte[] body, ref int offset, int count)
+    {
+        List<float> list = new List<float>(count);
+        for (int i = 0; i < count; i++)
+        {
+            list.Add(BitConverter.ToSingle(body, offset));
+            offset += 4;
+        }
+        return list;
+    }
+
+    private bool UsesFraming { get { return useBinaryProtocol || useDeltaProtocol || blendshapeStream; } }
+
     void Update()
     {
+        if (reconnectRequested)
+        {
+            reconnectRequested = false;
+            Disconnect();
+            Connect();
+        }
         if (dataReceived)
         {
             dataReceived = false;
-            ProcessData(latestJsonData);
+            if (UsesFraming)
+            {
+                if (latestBinaryFrame != null) ProcessData(null, latestBinaryFrame);
+            }
+            else ProcessData(latestJsonData);
         }
     }
 
-    private void ProcessData(string json)
+    // parsedFrame is set when the binary protocol already produced the data objects.
+    private void ProcessData(string json, object parsedFrame = null)
     {
         try
         {
             switch (clientType)
             {
                 case ClientType.Pose:
-                    PoseData pose = JsonUtility.FromJson<PoseData>(json);
+                    PoseData pose = (parsedFrame != null) ? parsedFrame as PoseData : JsonUtility.FromJson<PoseData>(json);
                     if (pose != null)
                     {
+                        latestPoseData = pose;
+                        //--------------------------
                         // Reverting to Hybrid/Normalized Visuals
-                        UpdateHybridVisuals(pose.landmarks, pose.world_landmarks); 
+                        //UpdateHybridVisuals(pose.landmarks, pose.world_landmarks);
+                        UpdateHybridVisuals(pose.landmarks, pose.world_landmarks, pose.depth);
+                        //--------------------------
+
                     }
                     break;
+
+                //--------------------------
+                //case ClientType.Hand:
+                    //HandData handData = JsonUtility.FromJson<HandData>(json);
+                    //if (handData != null && handData.hands != null)
+                    //{
+                        //List<Landmark> allNorm = new List<Landmark>();
+                        //List<Landmark> allWorld = new List<Landmark>();
+                        
+                        //foreach(var hand in handData.hands)
+                        //{
+                            //allNorm.AddRange(hand.landmarks);
+                             //// If world exists, add it, otherwise fill with nulls to stay consistent index-wise
+                            //if (hand.world_landmarks != null && hand.world_landmarks.Count > 0)
+                                //allWorld.AddRange(hand.world_landmarks);
+                            //else
+                                //// fill dummy to keep counts synced if mixing (shouldn't happen if server consistent)
+                                //for(int i=0; i<hand.landmarks.Count; i++) allWorld.Add(null);
+                        //}
+                        //UpdateHybridVisuals(allNorm, allWorld); 
+                    //}
+                    //break;
                 case ClientType.Hand:
-                    HandData handData = JsonUtility.FromJson<HandData>(json);
+                    HandData handData = (parsedFrame != null) ? parsedFrame as HandData : JsonUtility.FromJson<HandData>(json);
                     if (handData != null && handData.hands != null)
                     {
                         List<Landmark> allNorm = new List<Landmark>();
                         List<Landmark> allWorld = new List<Landmark>();
-                        
-                        foreach(var hand in handData.hands)
+                        List<float> allDepthZ = new List<float>();
+
+                        float globalZSum = 0f;
+                        int globalZCount = 0;
+
+                        foreach (var hand in handData.hands)
                         {
-                            allNorm.AddRange(hand.landmarks);
-                             // If world exists, add it, otherwise fill with nulls to stay consistent index-wise
+                            if (hand.landmarks != null)
+                                allNorm.AddRange(hand.landmarks);
+
                             if (hand.world_landmarks != null && hand.world_landmarks.Count > 0)
+                            {
                                 allWorld.AddRange(hand.world_landmarks);
-                            else
-                                // fill dummy to keep counts synced if mixing (shouldn't happen if server consistent)
-                                for(int i=0; i<hand.landmarks.Count; i++) allWorld.Add(null);
+                            }
+                            else if (hand.landmarks != null)
+                            {
+                                for (int i = 0; i < hand.landmarks.Count; i++) allWorld.Add(null);
+                            }
+
+                            if (hand.depth != null)
+                            {
+                                globalZSum += hand.depth.global_z;
+                                globalZCount++;
+
+                                if (hand.depth.per_landmark_z != null && hand.depth.per_landmark_z.Count > 0)
+                                {
+                                    allDepthZ.AddRange(hand.depth.per_landmark_z);
+                                }
+                                else if (hand.landmarks != null)
+                                {
+                                    for (int i = 0; i < hand.landmarks.Count; i++) allDepthZ.Add(0f);
+                                }
+                            }
+                            else if (hand.landmarks != null)
+                            {
+                                for (int i = 0; i < hand.landmarks.Count; i++) allDepthZ.Add(0f);
+                            }
                         }
-                        UpdateHybridVisuals(allNorm, allWorld); 
+
+                        DepthInfo mergedDepth = new DepthInfo();
+                        mergedDepth.mode = "hand_world";
+                        mergedDepth.global_z = (globalZCount > 0) ? (globalZSum / globalZCount) : 0f;
+                        mergedDepth.per_landmark_z = allDepthZ;
+
+                        UpdateHybridVisuals(allNorm, allWorld, mergedDepth);
                     }
                     break;
+                //--------------------------
+
+                //--------------------------
+                //case ClientType.Face:
+                    //FaceData faceData = JsonUtility.FromJson<FaceData>(json);
+                    //if (faceData != null && faceData.faces != null)
+                    //{
+                         //List<Landmark> allFaces = new List<Landmark>();
+                        //foreach(var face in faceData.faces) allFaces.AddRange(face.landmarks);
+                        //// Face currently no world landmarks support in this script
+                        //UpdateHybridVisuals(allFaces, null); 
+                    //}
+                    //break;
                 case ClientType.Face:
-                    FaceData faceData = JsonUtility.FromJson<FaceData>(json);
+                    FaceData faceData = (parsedFrame != null) ? parsedFrame as FaceData : JsonUtility.FromJson<FaceData>(json);
                     if (faceData != null && faceData.faces != null)
                     {
-                         List<Landmark> allFaces = new List<Landmark>();
-                        foreach(var face in faceData.faces) allFaces.AddRange(face.landmarks);
-                        // Face currently no world landmarks support in this script
-                        UpdateHybridVisuals(allFaces, null); 
+                        List<Landmark> allFaces = new List<Landmark>();
+                        List<float> allDepthZ = new List<float>();
+
+                        float globalZSum = 0f;
+                        int globalZCount = 0;
+
+                        foreach (var face in faceData.faces)
+                        {
+                            if (face.landmarks != null)
+                                allFaces.AddRange(face.landmarks);
+
+                            if (face.depth != null)
+                            {
+                                globalZSum += face.depth.global_z;
+                                globalZCount++;
+
+                                if (face.depth.per_landmark_z != null && face.depth.per_landmark_z.Count > 0)
+                                {
+                                    allDepthZ.AddRange(face.depth.per_landmark_z);
+                                }
+                                else if (face.landmarks != null)
+                                {
+                                    for (int i = 0; i < face.landmarks.Count; i++) allDepthZ.Add(0f);
+                                }
+                            }
+                            else if (face.landmarks != null)
+                            {
+                                for (int i = 0; i < face.landmarks.Count; i++) allDepthZ.Add(0f);
+                            }
+                        }
+
+                        DepthInfo mergedDepth = new DepthInfo();
+                        mergedDepth.mode = "face_transform_plus_local";
+                        mergedDepth.global_z = (globalZCount > 0) ? (globalZSum / globalZCount) : 0f;
+                        mergedDepth.per_landmark_z = allDepthZ;
+
+                        UpdateHybridVisuals(allFaces, null, mergedDepth);
                     }
                     break;
+                //--------------------------
             }
         }
         catch (Exception e) { Debug.LogError($"JSON Parse Error: {e.Message}"); }
     }
 
-    private void UpdateHybridVisuals(List<Landmark> normalized, List<Landmark> world)
+    //--------------------------------------
+    //private void UpdateHybridVisuals(List<Landmark> normalized, List<Landmark> world)
+    private void UpdateHybridVisuals(List<Landmark> normalized, List<Landmark> world, DepthInfo depthInfo = null)
+    //--------------------------------------
     {
+
+        if (normalized == null || normalized.Count == 0)
+        {
+            Debug.LogWarning($"[{clientType}] normalized landmarks are empty");
+            for (int i = 0; i < spawnedLandmarks.Count; i++) spawnedLandmarks[i].SetActive(false);
+            return;
+        }
+
+
         // Check availability
         bool useWorld = (world != null && world.Count == normalized.Count && world.Count > 0 && world[0] != null);
         
@@ -204,6 +904,40 @@ public class StreamClient : MonoBehaviour
             }
         }
 
+        //-------------------------------------
+        float centerX = 0f;
+        float centerY = 0f;
+
+        for (int i = 0; i < count; i++)
+        {
+            centerX += normalized[i].x;
+            centerY += normalized[i].y;
+        }
+
+        if (count > 0)
+        {
+            centerX /= count;
+            centerY /= count;
+        }
+        else
+        {
+            centerX = 0.5f;
+            centerY = 0.5f;
+        }
+        float globalDepth = 0f;
+        if (depthInfo != null)
+            globalDepth = depthInfo.global_z;
+
+        float depthForScale = useAbsGlobalDepthForCompensation ? Mathf.Abs(globalDepth) : globalDepth;
+
+        // depth가 커질수록 XY 분포를 줄이는 방향
+        float xyScaleCompensation = 1.0f / (1.0f + depthForScale * xyDepthCompensationStrength);
+        xyScaleCompensation = Mathf.Clamp(xyScaleCompensation, xyCompensationMinScale, xyCompensationMaxScale);
+
+        if (!useXYDepthCompensation)
+            xyScaleCompensation = 1.0f;
+        //-------------------------------------
+
         for (int i = 0; i < count; i++)
         {
             GameObject obj = spawnedLandmarks[i];
@@ -214,29 +948,68 @@ public class StreamClient : MonoBehaviour
             
             if (quadDisplay == null) continue;
 
+            //----------------------------------------
             // 1. Get Base Position on Quad surface from Normalized XY
             // Flip Y for Unity (Top is +0.5)
             // Mirror X if requested
-            float localX = mirrorX ? -(lmNorm.x - 0.5f) : (lmNorm.x - 0.5f);
-            float localY = -(lmNorm.y - 0.5f);
+
+            //float localX = mirrorX ? -(lmNorm.x - 0.5f) : (lmNorm.x - 0.5f);
+            //float localY = -(lmNorm.y - 0.5f);
+
+            float centeredX = lmNorm.x - centerX;
+            float centeredY = lmNorm.y - centerY;
+
+            // depth 기반으로 landmark 분포를 축소
+            centeredX *= xyScaleCompensation;
+            centeredY *= xyScaleCompensation;
+
+            // 다시 중심점 기준으로 복원
+            float compensatedX = centerX + centeredX;
+            float compensatedY = centerY + centeredY;
+
+            // Unity quad local coordinates
+            float localX = mirrorX ? -(compensatedX - 0.5f) : (compensatedX - 0.5f);
+            float localY = -(compensatedY - 0.5f);
+            //----------------------------------------
             
             // 2. Depth
             // If we have World Data, use the Z from World Data (scaled).
             // If not, use Normalized Z (which is relative depth).
             
+            //--------------------------------------------------
+            //float zDepth = 0;
+            //if (useWorld)
+            //{
+                //// World Z is in meters. MP Negative Z is "Towards Camera".
+                //// Unity Quad Local Z- is "Front/Towards Camera".
+                //// So MP Z should map directly to Local Z (proportional).
+                //zDepth = world[i].z * depthMultiplier; 
+            //}
+            //else
+            //{
+                //// Normalized Z is also roughly scale-relative.
+                 //zDepth = lmNorm.z * 0.5f * depthMultiplier; 
+            //}
+
             float zDepth = 0;
-            if (useWorld)
+
+            bool useDepthPacket = (depthInfo != null &&
+                                depthInfo.per_landmark_z != null &&
+                                i < depthInfo.per_landmark_z.Count);
+
+            if (useDepthPacket)
+            {
+                zDepth = depthInfo.per_landmark_z[i] * depthMultiplier;
+            }
+            else if (useWorld && world[i] != null)
             {
-                // World Z is in meters. MP Negative Z is "Towards Camera".
-                // Unity Quad Local Z- is "Front/Towards Camera".
-                // So MP Z should map directly to Local Z (proportional).
-                zDepth = world[i].z * depthMultiplier; 
+                zDepth = world[i].z * depthMultiplier;
             }
             else
             {
-                // Normalized Z is also roughly scale-relative.
-                 zDepth = lmNorm.z * 0.5f * depthMultiplier; 
+                zDepth = lmNorm.z * 0.5f * depthMultiplier;
             }
+            //--------------------------------------------------
             
             // Combine: Offset + Relative Depth + Absolute Pseudo-Depth
             // Quad Back is +Z, Front is -Z. 
@@ -0,0 +1,72 @@
+# annotation.py
+from __future__ import annotations
+
+import os
+import re
+import sys
+from typing import Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Debug drawing for the /video_feed preview and the OpenCV window. Servers only
+# annotate while someone is watching (JpegBroadcaster.has_viewers or a preview
+# window), and draw each frame's landmarks with one array write for all points
+# and one cv2.polylines call for all connections instead of a cv2 call per
+# landmark.
+
+Color = Tuple[int, int, int]
+
+
+def landmark_pixels(landmarks: Sequence, width: int, height: int) -> np.ndarray:
+    """(N, 2) int32 pixel coordinates of normalized landmarks."""
+    points = np.array([(lm.x, lm.y) for lm in landmarks], dtype=np.float32).reshape(-1, 2)
+    points *= (width, height)
+    # Truncation, as int() in the old per-landmark drawing
+    return points.astype(np.int32)
+
+
+def _disk_offsets(radius: int) -> np.ndarray:
+    r = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(r, r)
+    inside = dx * dx + dy * dy <= radius * radius
+    return np.stack([dx[inside], dy[inside]], axis=1).astype(np.int32)
+
+
+_DISKS = {radius: _disk_offsets(radius) for radius in range(6)}
+
+
+def draw_points(image: np.ndarray, points: np.ndarray, radius: int, color: Color) -> None:
+    """Filled dots of `radius` pixels at every point, in place."""
+    if not len(points):
+        return
+    disk = _DISKS.get(radius)
+    if disk is None:
+        disk = _DISKS.setdefault(radius, _disk_offsets(radius))
+    pixels = (points[:, None, :] + disk[None, :, :]).reshape(-1, 2)
+    height, width = image.shape[:2]
+    inside = (pixels[:, 0] >= 0) & (pixels[:, 0] < width) & (pixels[:, 1] >= 0) & (pixels[:, 1] < height)
+    pixels = pixels[inside]
+    image[pixels[:, 1], pixels[:, 0]] = color
+
+
+def draw_connections(image: np.ndarray, points: np.ndarray, connections: np.ndarray, color: Color,
+                     thickness: int = 1) -> None:
+    """Line segments between point pairs (`connections` is an (M, 2) index array), in place."""
+    if not len(points) or not len(connections):
+        return
+    cv2.polylines(image, points[connections], False, color, thickness)
+
+
+def display_available() -> bool:
+    """
+    Whether cv2.imshow can open a window here. On a headless box (no X11 /
+    Wayland display, or an opencv-python-headless build) it would abort the
+    process or raise instead.
+    """
+    gui = re.search(r"^\s*GUI:\s*(\S+)", cv2.getBuildInformation(), re.MULTILINE)
+    if gui is not None and gui.group(1).upper() == "NONE":
+        return False
+    if sys.platform.startswith("linux"):
+        return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return True
@@ -0,0 +1,257 @@
+import argparse
+import importlib
+import json
+import platform
+import sys
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+#---------------------------
+# Headless end-to-end benchmark of one tracking server.
+#
+# Runs the same steps as server_<name>.py, one frame at a time and without
+# sockets, Flask or display: read -> cvtColor -> detect -> payload build ->
+# serialization (every socket encoding). Prints (or writes) one JSON result
+# with fps, per-stage latency percentiles and peak RSS for regression tracking.
+#
+#   python benchmark.py pose --source synthetic --frames 300
+#   python benchmark.py face --source clip.mp4 --fps 0 --output face.json
+#
+# Synthetic frames contain no person, so detection finds nothing and the
+# payload / serialization stages stay empty: use a recorded clip for those.
+#---------------------------
+from frame_source import open_frame_source
+from landmark_encoders import encode_face_frames, encode_hand_frames, encode_pose_frame
+from landmarkers import LandmarkerRunner
+from roi import RoiLandmarker, face_roi_from_pose, roi_running_mode
+from subscription import FULL_VIEWS
+from wire_protocol import ENCODINGS
+
+PERCENTILES = (50, 90, 99)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def run(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def summary(self):
+        stages = {}
+        for stage, samples in self.samples.items():
+            ms = np.asarray(samples) * 1000.0
+            stats = {'count': int(ms.size), 'mean_ms': float(ms.mean())}
+            for p in PERCENTILES:
+                stats[f'p{p}_ms'] = float(np.percentile(ms, p))
+            stats['max_ms'] = float(ms.max())
+            stages[stage] = stats
+        return stages
+
+
+def setup_pose(server, running_mode):
+    detector = LandmarkerRunner('pose', server.MODEL_PATH, running_mode, output_segmentation_masks=False)
+    face_detector = RoiLandmarker(
+        'face', server.FACE_MODEL_PATH, roi_running_mode(running_mode, server.USE_POSE_ROI),
+        output_face_blendshapes=False,
+        output_facial_transformation_matrixes=True,
+        num_faces=1)
+    face_interval = 1.0 / server.FACE_TARGET_FPS if server.FACE_TARGET_FPS > 0 else 0.0
+    state = {'face_result': None, 'face_time': 0.0, 'pose_result': None}
+
+    def detect(timer, image, mp_image):
+        # Face refines the pose depth at FACE_TARGET_FPS, as in the server's face thread
+        now = time.perf_counter()
+        if now - state['face_time'] >= face_interval:
+            state['face_time'] = now
+            roi = None
+            pose_result = state['pose_result']
+            if server.USE_POSE_ROI and pose_result and pose_result.pose_landmarks:
+                roi = face_roi_from_pose(pose_result.pose_landmarks[0], image.shape[1], image.shape[0])
+            face_result = timer.run('detect_face', face_detector.submit, image, roi, mp_image=mp_image)
+            if face_result and face_result.face_landmarks:
+                state['face_result'] = face_result
+        state['pose_result'] = timer.run('detect', detector.submit, mp_image)
+        return state['pose_result']
+
+    def build(result, capture_time):
+        if not result or not result.pose_landmarks:
+            return None
+        return server.compute_pose_frame(
+            result, server.depth_state, pose_index=0, face_result=state['face_result'], timestamp=capture_time)
+
+    def encode(view, frame, result, seq, timestamp):
+        return encode_pose_frame(view, frame, seq, timestamp, server.delta_encoder)
+
+    return detect, build, encode
+
+
+def setup_hand(server, running_mode):
+    detector = RoiLandmarker('hand', server.MODEL_PATH, roi_running_mode(running_mode, server.USE_ROI), num_hands=2)
+
+    def detect(timer, image, mp_image):
+        roi = detector.tracked_roi(image.shape[1], image.shape[0]) if server.USE_ROI else None
+        return timer.run('detect', detector.submit, image, roi, mp_image=mp_image)
+
+    def build(result, capture_time):
+        if not result or not result.hand_landmarks:
+            return None
+        return server.compute_hand_frames(result, server.depth_state, capture_time)
+
+    def encode(view, hands, result, seq, timestamp):
+        return encode_hand_frames(view, hands, seq, timestamp, server.delta_encoder)
+
+    return detect, build, encode
+
+
+def setup_face(server, running_mode):
+    detector = RoiLandmarker(
+        'face', server.MODEL_PATH, roi_running_mode(running_mode, server.USE_ROI),
+        output_face_blendshapes=True,
+        output_facial_transformation_matrixes=True,
+        num_faces=1)
+
+    def detect(timer, image, mp_image):
+        roi = detector.tracked_roi(image.shape[1], image.shape[0]) if server.USE_ROI else None
+        return timer.run('detect', detector.submit, image, roi, mp_image=mp_image)
+
+    def build(result, capture_time):
+        if not result or not result.face_landmarks:
+            return None
+        return server.compute_face_frames(result, server.depth_state, capture_time)
+
+    def encode(view, faces, result, seq, timestamp):
+        return encode_face_frames(view, faces, result, seq, timestamp, server.delta_encoder)
+
+    return detect, build, encode
+
+
+SETUPS = {'pose': setup_pose, 'hand': setup_hand, 'face': setup_face}
+
+
+def run_benchmark(name, source, frames, fps, warmup, running_mode, encodings):
+    server = importlib.import_module(f'server_{name}')
+    detect, build, encode = SETUPS[name](server, running_mode)
+
+    cap = open_frame_source(source, fps=fps, loop=True, max_frames=frames + warmup)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Could not open frame source {source!r}.")
+
+    timer = StageTimer()
+    frame_size = None
+    detected = 0
+    processed = 0
+    start = None
+    try:
+        for seq in range(1, frames + warmup + 1):
+            if seq == warmup + 1:
+                # Model warm-up and first allocations are not part of the result
+                timer = StageTimer()
+                detected = 0
+                start = time.perf_counter()
+            frame_start = time.perf_counter()
+
+            success, image = timer.run('read', cap.read)
+            if not success:
+                break
+            capture_time = time.time()
+            frame_size = (image.shape[1], image.shape[0])
+
+            image = timer.run('cvt_color', cv2.cvtColor, image, cv2.COLOR_BGR2RGB)
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
+            result = detect(timer, image, mp_image)
+
+            payload = timer.run('payload_build', build, result, capture_time)
+            if payload is not None:
+                detected += 1
+                for encoding in encodings:
+                    timer.run(f'encode_{encoding}', encode, FULL_VIEWS[encoding], payload, result, seq, capture_time)
+
+            timer.samples.setdefault('frame', []).append(time.perf_counter() - frame_start)
+            if seq > warmup:
+                processed += 1
+    finally:
+        cap.release()
+
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    return {
+        'server': name,
+        'source': str(source),
+        'frame_size': frame_size,
+        'running_mode': running_mode,
+        'frames': processed,
+        'warmup_frames': warmup,
+        'frames_with_landmarks': detected,
+        'elapsed_s': elapsed,
+        'fps': processed / elapsed if elapsed > 0 else 0.0,
+        'stages': timer.summary(),
+        'peak_rss_mb': peak_rss_mb(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mediapipe': getattr(mp, '__version__', 'unknown'),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'timestamp': time.time(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless end-to-end benchmark of a tracking server.")
+    parser.add_argument('server', choices=sorted(SETUPS))
+    parser.add_argument('--source', default='synthetic',
+                        help="webcam index, video file, image directory or 'synthetic[:WxH]' (default: synthetic)")
+    parser.add_argument('--frames', type=int, default=300, help="measured frames (default: 300)")
+    parser.add_argument('--warmup', type=int, default=10, help="unmeasured frames first (default: 10)")
+    parser.add_argument('--fps', type=float, default=0.0, help="source rate, 0 = as fast as possible (default: 0)")
+    parser.add_argument('--running-mode', default='VIDEO', choices=['IMAGE', 'VIDEO'],
+                        help="LIVE_STREAM is asynchronous and cannot be timed per stage")
+    parser.add_argument('--encodings', default=','.join(ENCODINGS),
+                        help=f"comma-separated socket encodings to serialize (default: {','.join(ENCODINGS)})")
+    parser.add_argument('--output', help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    encodings = [e.strip() for e in args.encodings.split(',') if e.strip()]
+    unknown = [e for e in encodings if e not in ENCODINGS]
+    if unknown:
+        parser.error(f"unknown encodings {unknown}, expected some of {list(ENCODINGS)}")
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    result = run_benchmark(args.server, source, args.frames, args.fps, args.warmup, args.running_mode, encodings)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print(f"[Benchmark] {args.server}: {result['fps']:.1f} fps over {result['frames']} frames -> {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
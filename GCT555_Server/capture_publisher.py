@@ -0,0 +1,82 @@
+import argparse
+import signal
+import sys
+import time
+
+#---------------------------
+# Opens the camera ONCE and publishes its frames on a shared-memory frame bus
+# (see frame_bus.py), so server_pose.py / server_hand.py / server_face.py can
+# run as separate processes on the same camera:
+#
+#   python capture_publisher.py --source 0
+#   # then in each server: FRAME_SOURCE = 'shm:gct555'
+#
+# Readers get the newest frame without a copy and without decoding the camera
+# stream themselves. Stop with Ctrl+C (the bus is removed on exit).
+#---------------------------
+from frame_bus import DEFAULT_SLOTS, FrameBusWriter
+from frame_source import open_frame_source
+
+DEFAULT_BUS_NAME = 'gct555'
+REPORT_INTERVAL = 5.0       # seconds between rate reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish camera frames on a shared-memory frame bus.")
+    parser.add_argument('--source', default='0',
+                        help="webcam index, video file, image directory or 'synthetic[:WxH]' (default: 0)")
+    parser.add_argument('--name', default=DEFAULT_BUS_NAME, help=f"bus name, read as 'shm:<name>' (default: {DEFAULT_BUS_NAME})")
+    parser.add_argument('--slots', type=int, default=DEFAULT_SLOTS,
+                        help=f"ring size; a reader's frame stays valid for slots - 1 frames (default: {DEFAULT_SLOTS})")
+    parser.add_argument('--fps', type=float, default=None, help="pace file / synthetic sources (default: native rate)")
+    args = parser.parse_args()
+    if args.slots < 2:
+        parser.error("--slots must be at least 2")
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    cap = open_frame_source(source, fps=args.fps, loop=True)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Could not open frame source {source!r}.")
+
+    # The bus is sized from the first frame
+    success, frame = cap.read()
+    if not success:
+        raise SystemExit(f"Error: No frame from {source!r}.")
+    height, width = frame.shape[:2]
+    channels = frame.shape[2] if frame.ndim == 3 else 1
+    bus = FrameBusWriter(args.name, width, height, channels, slots=args.slots)
+    print(f"[FrameBus] Publishing {source!r} ({width}x{height}) as 'shm:{args.name}', {args.slots} slots")
+
+    # Remove the bus on `kill` too, not only on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    published = 0
+    last_report = time.monotonic()
+    try:
+        while success:
+            if frame.shape != (height, width, channels)[:frame.ndim]:
+                print(f"[FrameBus] Skipping frame of size {frame.shape[1]}x{frame.shape[0]}")
+            else:
+                bus.write(frame.reshape(height, width, channels), time.time())
+                published += 1
+
+            now = time.monotonic()
+            if now - last_report >= REPORT_INTERVAL:
+                print(f"[FrameBus] {published / (now - last_report):.1f} fps")
+                published = 0
+                last_report = now
+
+            success, frame = cap.read()
+            while not success and cap.isOpened():
+                print("Ignoring empty camera frame.")
+                success, frame = cap.read()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+        cap.release()
+        print(f"[FrameBus] Closed 'shm:{args.name}'")
+
+
+if __name__ == "__main__":
+    main()
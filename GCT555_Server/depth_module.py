@@ -1,8 +1,10 @@
 # depth_module.py
 from __future__ import annotations
 
+import math
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 import numpy as np
 
 
@@ -13,6 +15,7 @@ class DepthConfig:
     # Controls how quickly depth follows new measurements.
     # Higher values respond faster but may jitter more.
     # Lower values are smoother but may feel delayed.
+    # Unused with landmark_filter="one_euro", which smooths global_z as well.
 
     clamp_min: float = -20.0
     clamp_max: float = 20.0
@@ -48,6 +51,38 @@ class DepthConfig:
     # Inverts hand world landmark Z values.
     # Turn this on if hand depth moves backward when it should move forward.
 
+    # --- Landmark filter ---
+    landmark_filter: str = "none"       # "none" | "one_euro"
+    # "one_euro" filters every landmark's x / y / z (and world x / y / z) with an
+    # adaptive low-pass filter, and replaces the smoothing_alpha EMA on global_z.
+    # It smooths strongly while a landmark is still and follows quickly while it moves.
+
+    filter_min_cutoff: float = 1.0      # Hz
+    # Cutoff while landmarks are still.
+    # Lower it if landmarks jitter at rest. Raise it if slow movements feel delayed.
+
+    filter_beta: float = 10.0
+    # How much the cutoff rises with speed (per normalized unit per second).
+    # Raise it if fast movements lag behind. Lower it if fast movements look noisy.
+
+    filter_world_min_cutoff: float = 1.0    # Hz
+    filter_world_beta: float = 5.0
+    # The same two settings for world landmarks and global_z, whose speeds are in
+    # meters per second (face tz: times face_global_scale). A body filling the frame
+    # height is about 2 m tall, so the same motion reads about twice as fast as in
+    # normalized units.
+
+    filter_d_cutoff: float = 1.0        # Hz
+    # Cutoff of the speed estimate used by filter_beta and prediction.
+
+    filter_prediction: bool = False
+    # Extrapolates the filtered landmarks at their current velocity from the camera
+    # capture time to the expected send time, hiding detection and filter latency.
+    # May overshoot on sudden stops.
+
+    filter_prediction_lead: float = 0.0  # seconds
+    # Extra prediction beyond the send time (e.g. network + Unity frame latency).
+
     # --- Debug output ---
     include_debug_raw: bool = True
     # If enabled, keeps extra raw debug values available for inspection.
@@ -59,6 +94,51 @@ def _clamp(v: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, v))
 
 
+LANDMARK_FILTERS = ("none", "one_euro")
+FILTER_RESET_AFTER = 0.5        # seconds without a sample before a target's filter starts over
+
+
+def _smoothing_factor(dt: float, cutoff: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+    r = 2.0 * math.pi * cutoff * dt
+    return r / (r + 1.0)
+
+
+class OneEuroFilter:
+    """
+    One Euro filter (Casiez et al., CHI 2012) over a whole array at once, each
+    element filtered independently, with optional constant-velocity prediction.
+    State is the previous filtered values, their filtered derivative and time.
+    """
+
+    def __init__(self, min_cutoff: float, beta: float, d_cutoff: float, reset_after: float = FILTER_RESET_AFTER):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset_after = reset_after
+        self._x: Optional[np.ndarray] = None
+        self._dx: Optional[np.ndarray] = None
+        self._t = 0.0
+
+    def __call__(self, x: np.ndarray, t: float, lead: float = 0.0) -> np.ndarray:
+        """Filters `x` sampled at time `t` (seconds), extrapolated `lead` seconds ahead."""
+        x = np.asarray(x, dtype=np.float32)
+        if self._x is None or self._x.shape != x.shape or not 0.0 <= t - self._t <= self.reset_after:
+            # First sample, new layout, clock jump or target lost for a while
+            self._x = x.copy()
+            self._dx = np.zeros_like(x)
+            self._t = t
+        elif t > self._t:
+            dt = t - self._t
+            dx = (x - self._x) / dt
+            self._dx += _smoothing_factor(dt, self.d_cutoff) * (dx - self._dx)
+            cutoff = self.min_cutoff + self.beta * np.abs(self._dx)
+            self._x += _smoothing_factor(dt, cutoff).astype(np.float32, copy=False) * (x - self._x)
+            self._t = t
+        if lead > 0.0:
+            return self._x + self._dx * lead
+        return self._x.copy()
+
+
 class DepthState:
     """
     Maintains smoothing between frames within the server process.
@@ -66,17 +146,70 @@ class DepthState:
     """
     def __init__(self, cfg: Optional[DepthConfig] = None):
         self.cfg = cfg or DepthConfig()
-        self._face_global_z: Dict[int, float] = {}
-        self._pose_global_z: Dict[int, float] = {}
-        self._hand_global_z: Dict[int, float] = {}
+        if self.cfg.landmark_filter not in LANDMARK_FILTERS:
+            raise ValueError(f"landmark_filter must be one of {LANDMARK_FILTERS}, got {self.cfg.landmark_filter!r}")
+        # float (EMA) or OneEuroFilter, per target
+        self._face_global_z: Dict[Any, Any] = {}
+        self._pose_global_z: Dict[Any, Any] = {}
+        self._hand_global_z: Dict[Any, Any] = {}
+        # (landmark filter, world landmark filter, filtered rows) per (modality, target)
+        self._landmark_filters: Dict[Tuple[str, Any], Tuple[OneEuroFilter, OneEuroFilter, Any]] = {}
+
+    @property
+    def filtering(self) -> bool:
+        return self.cfg.landmark_filter == "one_euro"
+
+    def _new_filter(self, world: bool = False) -> OneEuroFilter:
+        cfg = self.cfg
+        if world:
+            return OneEuroFilter(cfg.filter_world_min_cutoff, cfg.filter_world_beta, cfg.filter_d_cutoff)
+        return OneEuroFilter(cfg.filter_min_cutoff, cfg.filter_beta, cfg.filter_d_cutoff)
+
+    def _smooth(self, cache: Dict[Any, Any], key: Any, value: float, timestamp: Optional[float] = None) -> float:
+        if self.filtering:
+            filt = cache.get(key)
+            if filt is None:
+                filt = cache[key] = self._new_filter(world=True)
+            t = time.time() if timestamp is None else timestamp
+            return float(filt(np.array([value], dtype=np.float32), t)[0])
 
-    def _smooth(self, cache: Dict[int, float], key: int, value: float) -> float:
         prev = cache.get(key, value)
         a = self.cfg.smoothing_alpha
         smoothed = (1.0 - a) * prev + a * value
         cache[key] = smoothed
         return smoothed
 
+    def _filter_landmarks(
+        self,
+        modality: str,
+        key: Any,
+        lms: "LandmarkArray",
+        timestamp: Optional[float],
+        indices: Optional[Tuple[int, ...]] = None,
+    ) -> None:
+        """
+        Filters x / y / z of `lms` (and its world landmarks) in place; visibility is left as is.
+        `indices` limits filtering to those rows (see FrameScope); other rows start over when it changes.
+        """
+        if not self.filtering:
+            return
+        filters = self._landmark_filters.get((modality, key))
+        if filters is None or filters[2] != indices:
+            filters = self._landmark_filters[(modality, key)] = (
+                self._new_filter(), self._new_filter(world=True), indices)
+
+        now = time.time()
+        t = now if timestamp is None else timestamp
+        lead = 0.0
+        if self.cfg.filter_prediction:
+            # The frame is sent right after its payload is built
+            lead = max(0.0, now - t) + self.cfg.filter_prediction_lead
+
+        rows = slice(None) if indices is None else np.asarray(indices, dtype=np.intp)
+        lms.data[rows, :3] = filters[0](lms.data[rows, :3], t, lead)
+        if lms.has_world:
+            lms.world[rows, :3] = filters[1](lms.world[rows, :3], t, lead)
+
 
 def _parse_4x4_matrix(matrix_like: Any) -> Optional[np.ndarray]:
     try:
@@ -89,175 +222,299 @@ def _parse_4x4_matrix(matrix_like: Any) -> Optional[np.ndarray]:
         return None
 
 
-def _mean_z_from_world_landmarks(world_landmarks: Sequence[Any]) -> Optional[float]:
-    if not world_landmarks:
+_LANDMARK_KEYS = ("x", "y", "z", "visibility")
+
+
+def _landmarks_to_array(landmarks: Optional[Sequence[Any]], indices: Optional[Tuple[int, ...]] = None) -> np.ndarray:
+    """
+    Packs MediaPipe landmarks into an (N, 4) float32 array of x, y, z, visibility.
+    Missing coordinates become 0.0 and missing visibility becomes 1.0.
+    With `indices` only those rows are read; the others stay (0, 0, 0, 1).
+    """
+    if not landmarks:
+        return np.zeros((0, 4), dtype=np.float32)
+
+    # None -> NaN here, replaced with the defaults below
+    arr = np.array(
+        [
+            (getattr(lm, "x", None), getattr(lm, "y", None),
+             getattr(lm, "z", None), getattr(lm, "visibility", None))
+            for lm in (landmarks if indices is None else [landmarks[i] for i in indices])
+        ],
+        dtype=np.float32,
+    ).reshape(-1, 4)
+    missing = np.isnan(arr)
+    if missing.any():
+        arr[:, :3][missing[:, :3]] = 0.0
+        arr[:, 3][missing[:, 3]] = 1.0
+    if indices is None:
+        return arr
+
+    full = np.zeros((len(landmarks), 4), dtype=np.float32)
+    full[:, 3] = 1.0
+    full[np.asarray(indices, dtype=np.intp)] = arr
+    return full
+
+
+def _array_to_dicts(arr: Optional[np.ndarray]) -> List[Dict[str, float]]:
+    if arr is None:
+        return []
+    return [dict(zip(_LANDMARK_KEYS, row)) for row in arr.tolist()]
+
+
+@dataclass
+class LandmarkArray:
+    """
+    NumPy-backed landmarks of a single target (one pose / hand / face).
+
+      data  : (N, 4) float32 -> x, y, z, visibility (normalized image coords)
+      world : (M, 4) float32 or None -> world landmarks in meters
+    """
+    data: np.ndarray
+    world: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_landmarks(
+        cls,
+        landmarks: Sequence[Any],
+        world_landmarks: Optional[Sequence[Any]] = None,
+        indices: Optional[Tuple[int, ...]] = None,
+    ) -> "LandmarkArray":
+        world = _landmarks_to_array(world_landmarks, indices) if world_landmarks else None
+        return cls(_landmarks_to_array(landmarks, indices), world)
+
+    def __len__(self) -> int:
+        return int(self.data.shape[0])
+
+    @property
+    def has_world(self) -> bool:
+        return self.world is not None and self.world.shape[0] > 0
+
+    def to_dicts(self) -> List[Dict[str, float]]:
+        return _array_to_dicts(self.data)
+
+    def world_dicts(self) -> List[Dict[str, float]]:
+        return _array_to_dicts(self.world)
+
+
+@dataclass(frozen=True)
+class FrameScope:
+    """
+    Parts of a frame that the subscribed clients use (see subscription.frame_scope);
+    compute_*_frame(s) skip the rest.
+
+      indices        : landmark rows to read and filter, None = all. Arrays keep their
+                       full length, the other rows are left at zero
+      world          : world landmarks
+      per_landmark_z : per-landmark depth (an empty array otherwise)
+    """
+    indices: Optional[Tuple[int, ...]] = None
+    world: bool = True
+    per_landmark_z: bool = True
+
+
+FULL_SCOPE = FrameScope()
+_EMPTY_Z = np.zeros(0, dtype=np.float32)
+
+
+@dataclass
+class DepthFrame:
+    mode: str
+    global_z: float
+    per_landmark_z: np.ndarray      # (N,) float32
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "global_z": self.global_z,
+            "per_landmark_z": self.per_landmark_z.tolist(),
+        }
+
+
+@dataclass
+class PoseFrame:
+    landmarks: LandmarkArray
+    depth: DepthFrame
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "landmarks": self.landmarks.to_dicts(),
+            "world_landmarks": self.landmarks.world_dicts(),
+            "depth": self.depth.to_dict(),
+        }
+
+
+@dataclass
+class HandFrame:
+    handedness: str
+    landmarks: LandmarkArray
+    depth: DepthFrame
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "handedness": self.handedness,
+            "landmarks": self.landmarks.to_dicts(),
+            "world_landmarks": self.landmarks.world_dicts(),
+            "depth": self.depth.to_dict(),
+        }
+
+
+@dataclass
+class FaceFrame:
+    landmarks: LandmarkArray
+    depth: DepthFrame
+    face_pose: Optional[Tuple[float, float, float]] = None   # raw (tx, ty, tz)
+
+    def pose_dict(self) -> Optional[Dict[str, float]]:
+        if self.face_pose is None:
+            return None
+        tx, ty, tz = self.face_pose
+        return {"tx": tx, "ty": ty, "tz": tz}
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "landmarks": self.landmarks.to_dicts(),
+            "depth": self.depth.to_dict(),
+            "face_pose": self.pose_dict(),
+        }
+
+
+def _face_translation(matrix_like: Any) -> Optional[Tuple[float, float, float]]:
+    M = _parse_4x4_matrix(matrix_like)
+    if M is None:
         return None
-    zs = []
-    for lm in world_landmarks:
-        z = getattr(lm, "z", None)
-        if z is None:
-            continue
-        zs.append(float(z))
-    if not zs:
+    return float(M[0, 3]), float(M[1, 3]), float(M[2, 3])
+
+
+def _world_mean_z(world_landmarks: Optional[Sequence[Any]]) -> Optional[float]:
+    """
+    Mean world z over every landmark, before the landmark filter (global_z has its
+    own), so it does not depend on which rows the frame scope reads.
+    """
+    if not world_landmarks:
         return None
-    return float(np.mean(zs))
+    return float(np.array([getattr(lm, "z", None) or 0.0 for lm in world_landmarks], dtype=np.float32).mean())
 
 
-def _safe_float(value: Any, default: float = 0.0) -> float:
-    try:
-        if value is None:
-            return default
-        return float(value)
-    except (TypeError, ValueError):
-        return default
-
-
-def _safe_landmark_dict(lm: Any) -> Dict[str, float]:
-    return {
-        "x": _safe_float(getattr(lm, "x", 0.0), 0.0),
-        "y": _safe_float(getattr(lm, "y", 0.0), 0.0),
-        "z": _safe_float(getattr(lm, "z", 0.0), 0.0),
-        "visibility": _safe_float(getattr(lm, "visibility", None), 1.0),
-    }
+def _world_z_depth(
+    lms: LandmarkArray,
+    world_mean_z: Optional[float],
+    depth_state: DepthState,
+    cache: Dict[Any, Any],
+    key: Any,
+    invert: bool,
+    timestamp: Optional[float] = None,
+    scope: FrameScope = FULL_SCOPE,
+) -> Tuple[float, np.ndarray]:
+    """
+    Shared pose / hand fallback:
+      global_z       = smoothed mean world z
+      per_landmark_z = world z (or normalized z when no world landmarks)
+    """
+    cfg = depth_state.cfg
+    global_z = world_mean_z if world_mean_z is not None else 0.0
+
+    if invert:
+        global_z = -global_z
+    global_z = _clamp(global_z, cfg.clamp_min, cfg.clamp_max)
+    global_z = depth_state._smooth(cache, key, global_z, timestamp)
+
+    if not scope.per_landmark_z:
+        per_landmark_z = _EMPTY_Z
+    elif lms.has_world:
+        wz = lms.world[:, 2]
+        per_landmark_z = np.clip(-wz if invert else wz, cfg.clamp_min, cfg.clamp_max)
+    else:
+        per_landmark_z = lms.data[:, 2].copy()
+    return global_z, per_landmark_z
 
 
-def build_pose_payload(
+def compute_pose_frame(
     result: Any,
     depth_state: DepthState,
     pose_index: int = 0,
     face_result: Any = None,
-) -> Optional[Dict[str, Any]]:
+    timestamp: Optional[float] = None,
+    scope: FrameScope = FULL_SCOPE,
+) -> Optional[PoseFrame]:
     """
-    return :
-    {
-      "landmarks": [...],
-      "world_landmarks": [...],
-      "depth": {
-        "mode": "pose_face_abs" | "pose_world",
-        "global_z": ...,
-        "per_landmark_z": [...]
-      }
-    }
-
-    If face_result is provided and contains a facial transformation matrix,
-    global_z is derived from the face matrix tz (absolute depth).
-    Each per_landmark_z is then: global_z + (world_landmark_z - mean_world_z),
-    so pose world z acts as a relative offset from the absolute position.
-
-    Falls back to the old pose_world method if face_result is unavailable.
+    Array-backed version of build_pose_payload. See build_pose_payload for the depth rules.
+    `timestamp` is the capture time (time.time()) used by the landmark filter,
+    `scope` the parts of the frame to build.
     """
     if not result or not getattr(result, "pose_landmarks", None):
         return None
 
-    pose_landmarks = result.pose_landmarks[pose_index]
     world_landmarks = []
     if getattr(result, "pose_world_landmarks", None):
         if pose_index < len(result.pose_world_landmarks):
             world_landmarks = result.pose_world_landmarks[pose_index]
-
-    lm_list = [_safe_landmark_dict(lm) for lm in pose_landmarks]
-    world_list = [_safe_landmark_dict(lm) for lm in world_landmarks]
+    # Per-landmark depth is made from world z
+    lms = LandmarkArray.from_landmarks(
+        result.pose_landmarks[pose_index],
+        world_landmarks if scope.world or scope.per_landmark_z else None,
+        scope.indices)
+    depth_state._filter_landmarks("pose", pose_index, lms, timestamp, scope.indices)
+    world_mean_z = _world_mean_z(world_landmarks)
+    cfg = depth_state.cfg
 
     # --- Try to get absolute depth from face transformation matrix ---
     face_tz: Optional[float] = None
     if face_result is not None:
         matrices = getattr(face_result, "facial_transformation_matrixes", None)
         if matrices is not None and len(matrices) > 0 and matrices[0] is not None:
-            M = _parse_4x4_matrix(matrices[0])
-            if M is not None:
-                face_tz = float(M[2, 3])
+            translation = _face_translation(matrices[0])
+            if translation is not None:
+                face_tz = translation[2]
 
     if face_tz is not None:
         # ---- Face-based absolute depth mode ----
-        global_z = face_tz
-        if depth_state.cfg.face_invert_tz:
-            global_z = -global_z
-        global_z *= depth_state.cfg.face_global_scale
-        global_z = _clamp(global_z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max)
-        global_z = depth_state._smooth(depth_state._pose_global_z, pose_index, global_z)
-
-        # Pose world z as relative offset from mean
-        mean_wz = _mean_z_from_world_landmarks(world_landmarks)
-        if mean_wz is None:
-            mean_wz = 0.0
-
-        per_landmark_z = []
-        if world_landmarks:
-            for lm in world_landmarks:
-                rel_z = float(getattr(lm, "z", 0.0)) - mean_wz
-                if depth_state.cfg.pose_invert_world_z:
-                    rel_z = -rel_z
-                z = global_z + rel_z
-                per_landmark_z.append(_clamp(z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max))
+        global_z = -face_tz if cfg.face_invert_tz else face_tz
+        global_z *= cfg.face_global_scale
+        global_z = _clamp(global_z, cfg.clamp_min, cfg.clamp_max)
+        global_z = depth_state._smooth(depth_state._pose_global_z, pose_index, global_z, timestamp)
+
+        if not scope.per_landmark_z:
+            per_landmark_z = _EMPTY_Z
+        elif lms.has_world:
+            # Pose world z as relative offset from mean
+            rel_z = lms.world[:, 2] - world_mean_z
+            if cfg.pose_invert_world_z:
+                rel_z = -rel_z
+            per_landmark_z = np.clip(global_z + rel_z, cfg.clamp_min, cfg.clamp_max)
         else:
-            for lm in pose_landmarks:
-                per_landmark_z.append(global_z)
+            per_landmark_z = np.full(len(lms), global_z, dtype=np.float32)
 
         mode = "pose_face_abs"
     else:
         # ---- Fallback: old pose_world mode ----
-        global_z = _mean_z_from_world_landmarks(world_landmarks)
-        if global_z is None:
-            global_z = 0.0
-
-        if depth_state.cfg.pose_invert_world_z:
-            global_z = -global_z
-
-        global_z = _clamp(global_z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max)
-        global_z = depth_state._smooth(depth_state._pose_global_z, pose_index, global_z)
-
-        per_landmark_z = []
-        if world_landmarks:
-            for lm in world_landmarks:
-                z = float(getattr(lm, "z", 0.0))
-                if depth_state.cfg.pose_invert_world_z:
-                    z = -z
-                per_landmark_z.append(_clamp(z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max))
-        else:
-            for lm in pose_landmarks:
-                per_landmark_z.append(float(getattr(lm, "z", 0.0)))
-
+        global_z, per_landmark_z = _world_z_depth(
+            lms, world_mean_z, depth_state, depth_state._pose_global_z, pose_index, cfg.pose_invert_world_z,
+            timestamp, scope)
         mode = "pose_world"
 
-    payload = {
-        "landmarks": lm_list,
-        "world_landmarks": world_list,
-        "depth": {
-            "mode": mode,
-            "global_z": global_z,
-            "per_landmark_z": per_landmark_z,
-        }
-    }
-    return payload
+    return PoseFrame(lms, DepthFrame(mode, global_z, per_landmark_z.astype(np.float32, copy=False)))
 
 
-def build_hand_payloads(
+def compute_hand_frames(
     result: Any,
     depth_state: DepthState,
-) -> List[Dict[str, Any]]:
+    timestamp: Optional[float] = None,
+    scope: FrameScope = FULL_SCOPE,
+) -> List[HandFrame]:
     """
-    return :
-    [
-      {
-        "handedness": "...",
-        "landmarks": [...],
-        "world_landmarks": [...],
-        "depth": {
-          "mode": "hand_world",
-          "global_z": ...,
-          "per_landmark_z": [...]
-        }
-      },
-      ...
-    ]
+    Array-backed version of build_hand_payloads.
+    `timestamp` is the capture time (time.time()) used by the landmark filter,
+    `scope` the parts of the frames to build.
     """
     if not result or not getattr(result, "hand_landmarks", None):
         return []
 
-    outputs: List[Dict[str, Any]] = []
+    outputs: List[HandFrame] = []
     hand_world_landmarks = getattr(result, "hand_world_landmarks", None)
     handedness = getattr(result, "handedness", None)
 
+    seen_labels = set()
     for idx, hand_landmarks in enumerate(result.hand_landmarks):
         world_landmarks = []
         if hand_world_landmarks and idx < len(hand_world_landmarks):
@@ -267,44 +524,127 @@ def build_hand_payloads(
         if handedness and idx < len(handedness) and len(handedness[idx]) > 0:
             label = handedness[idx][0].category_name
 
-        lm_list = [_safe_landmark_dict(lm) for lm in hand_landmarks]
-        world_list = [_safe_landmark_dict(lm) for lm in world_landmarks]
+        # Track per hand rather than per slot, so two hands swapping order do not smear into each other;
+        # the slot is the fallback when the label is missing or repeats within the frame
+        key = label if label != "Unknown" and label not in seen_labels else idx
+        seen_labels.add(label)
+
+        lms = LandmarkArray.from_landmarks(
+            hand_landmarks, world_landmarks if scope.world or scope.per_landmark_z else None, scope.indices)
+        depth_state._filter_landmarks("hand", key, lms, timestamp, scope.indices)
+        global_z, per_landmark_z = _world_z_depth(
+            lms, _world_mean_z(world_landmarks), depth_state, depth_state._hand_global_z, key,
+            depth_state.cfg.hand_invert_world_z, timestamp, scope)
 
-        global_z = _mean_z_from_world_landmarks(world_landmarks)
-        if global_z is None:
-            global_z = 0.0
+        outputs.append(HandFrame(
+            label, lms, DepthFrame("hand_world", global_z, per_landmark_z.astype(np.float32, copy=False))))
+
+    return outputs
 
-        if depth_state.cfg.hand_invert_world_z:
-            global_z = -global_z
 
-        global_z = _clamp(global_z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max)
-        global_z = depth_state._smooth(depth_state._hand_global_z, idx, global_z)
+def compute_face_frames(
+    result: Any,
+    depth_state: DepthState,
+    timestamp: Optional[float] = None,
+    scope: FrameScope = FULL_SCOPE,
+) -> List[FaceFrame]:
+    """
+    Array-backed version of build_face_payloads.
+    `timestamp` is the capture time (time.time()) used by the landmark filter,
+    `scope` the parts of the frames to build.
+    """
+    if not result or not getattr(result, "face_landmarks", None):
+        return []
 
-        per_landmark_z = []
-        if world_landmarks:
-            for lm in world_landmarks:
-                z = float(getattr(lm, "z", 0.0))
-                if depth_state.cfg.hand_invert_world_z:
-                    z = -z
-                per_landmark_z.append(_clamp(z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max))
+    cfg = depth_state.cfg
+    matrices = getattr(result, "facial_transformation_matrixes", None)
+    outputs: List[FaceFrame] = []
+
+    for i, face_landmarks in enumerate(result.face_landmarks):
+        lms = LandmarkArray.from_landmarks(face_landmarks, indices=scope.indices)
+        depth_state._filter_landmarks("face", i, lms, timestamp, scope.indices)
+
+        face_pose = None
+        if matrices is not None and i < len(matrices) and matrices[i] is not None:
+            face_pose = _face_translation(matrices[i])
+        raw_tz = face_pose[2] if face_pose is not None else 0.0
+
+        global_z = -raw_tz if cfg.face_invert_tz else raw_tz
+        global_z *= cfg.face_global_scale
+        global_z = _clamp(global_z, cfg.clamp_min, cfg.clamp_max)
+        global_z = depth_state._smooth(depth_state._face_global_z, i, global_z, timestamp)
+
+        if scope.per_landmark_z:
+            local_z = lms.data[:, 2]
+            if cfg.face_invert_local_z:
+                local_z = -local_z
+            per_landmark_z = np.clip(global_z + local_z * cfg.face_local_scale, cfg.clamp_min, cfg.clamp_max)
         else:
-            for lm in hand_landmarks:
-                per_landmark_z.append(float(getattr(lm, "z", 0.0)))
-
-        outputs.append({
-            "handedness": label,
-            "landmarks": lm_list,
-            "world_landmarks": world_list,
-            "depth": {
-                "mode": "hand_world",
-                "global_z": global_z,
-                "per_landmark_z": per_landmark_z,
-            }
-        })
+            per_landmark_z = _EMPTY_Z
+
+        outputs.append(FaceFrame(
+            lms,
+            DepthFrame("face_transform_plus_local", global_z, per_landmark_z.astype(np.float32, copy=False)),
+            face_pose,
+        ))
 
     return outputs
 
 
+def build_pose_payload(
+    result: Any,
+    depth_state: DepthState,
+    pose_index: int = 0,
+    face_result: Any = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    return :
+    {
+      "landmarks": [...],
+      "world_landmarks": [...],
+      "depth": {
+        "mode": "pose_face_abs" | "pose_world",
+        "global_z": ...,
+        "per_landmark_z": [...]
+      }
+    }
+
+    If face_result is provided and contains a facial transformation matrix,
+    global_z is derived from the face matrix tz (absolute depth).
+    Each per_landmark_z is then: global_z + (world_landmark_z - mean_world_z),
+    so pose world z acts as a relative offset from the absolute position.
+
+    Falls back to the old pose_world method if face_result is unavailable.
+    """
+    frame = compute_pose_frame(result, depth_state, pose_index=pose_index, face_result=face_result)
+    if frame is None:
+        return None
+    return frame.to_payload()
+
+
+def build_hand_payloads(
+    result: Any,
+    depth_state: DepthState,
+) -> List[Dict[str, Any]]:
+    """
+    return :
+    [
+      {
+        "handedness": "...",
+        "landmarks": [...],
+        "world_landmarks": [...],
+        "depth": {
+          "mode": "hand_world",
+          "global_z": ...,
+          "per_landmark_z": [...]
+        }
+      },
+      ...
+    ]
+    """
+    return [hand.to_payload() for hand in compute_hand_frames(result, depth_state)]
+
+
 def build_face_payloads(
     result: Any,
     depth_state: DepthState,
@@ -319,66 +659,7 @@ def build_face_payloads(
     return:
       faces_data, raw_pose_debug
     """
-    if not result or not getattr(result, "face_landmarks", None):
-        return [], []
-
-    matrices = getattr(result, "facial_transformation_matrixes", None)
-    outputs: List[Dict[str, Any]] = []
-    raw_pose_debug: List[Dict[str, float]] = []
-
-    for i, face_landmarks in enumerate(result.face_landmarks):
-        lm_list = [_safe_landmark_dict(lm) for lm in face_landmarks]
-
-        raw_tx = raw_ty = raw_tz = 0.0
-        has_pose = False
-
-        if matrices is not None and i < len(matrices) and matrices[i] is not None:
-            M = _parse_4x4_matrix(matrices[i])
-            if M is not None:
-                raw_tx = float(M[0, 3])
-                raw_ty = float(M[1, 3])
-                raw_tz = float(M[2, 3])
-                has_pose = True
-
-        global_z = raw_tz
-        if depth_state.cfg.face_invert_tz:
-            global_z = -global_z
-        global_z *= depth_state.cfg.face_global_scale
-        global_z = _clamp(global_z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max)
-        global_z = depth_state._smooth(depth_state._face_global_z, i, global_z)
-
-        per_landmark_z = []
-        for lm in face_landmarks:
-            local_z = float(getattr(lm, "z", 0.0))
-            if depth_state.cfg.face_invert_local_z:
-                local_z = -local_z
-            z = global_z + (local_z * depth_state.cfg.face_local_scale)
-            z = _clamp(z, depth_state.cfg.clamp_min, depth_state.cfg.clamp_max)
-            per_landmark_z.append(z)
-
-        face_item: Dict[str, Any] = {
-            "landmarks": lm_list,
-            "depth": {
-                "mode": "face_transform_plus_local",
-                "global_z": global_z,
-                "per_landmark_z": per_landmark_z,
-            }
-        }
-
-        if has_pose:
-            face_item["face_pose"] = {
-                "tx": raw_tx,
-                "ty": raw_ty,
-                "tz": raw_tz
-            }
-            raw_pose_debug.append({
-                "tx": raw_tx,
-                "ty": raw_ty,
-                "tz": raw_tz
-            })
-        else:
-            face_item["face_pose"] = None
-
-        outputs.append(face_item)
-
-    return outputs, raw_pose_debug
\ No newline at end of file
+    faces = compute_face_frames(result, depth_state)
+    faces_data = [face.to_payload() for face in faces]
+    raw_pose_debug = [face.pose_dict() for face in faces if face.face_pose is not None]
+    return faces_data, raw_pose_debug
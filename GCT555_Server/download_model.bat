@@ -4,6 +4,10 @@ if not exist "models" mkdir models
 echo Downloading pose_landmarker_heavy.task...
 powershell -Command "Invoke-WebRequest -Uri 'https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_heavy/float16/1/pose_landmarker_heavy.task' -OutFile 'models/pose_landmarker_heavy.task'"
 
+echo Downloading pose_landmarker_full.task and pose_landmarker_lite.task (lighter quality tiers)...
+powershell -Command "Invoke-WebRequest -Uri 'https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_full/float16/1/pose_landmarker_full.task' -OutFile 'models/pose_landmarker_full.task'"
+powershell -Command "Invoke-WebRequest -Uri 'https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_lite/float16/1/pose_landmarker_lite.task' -OutFile 'models/pose_landmarker_lite.task'"
+
 echo Downloading hand_landmarker.task...
 powershell -Command "Invoke-WebRequest -Uri 'https://storage.googleapis.com/mediapipe-models/hand_landmarker/hand_landmarker/float16/1/hand_landmarker.task' -OutFile 'models/hand_landmarker.task'"
 
@@ -4,6 +4,10 @@ mkdir -p models
 echo "Downloading pose_landmarker_heavy.task..."
 curl -L "https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_heavy/float16/1/pose_landmarker_heavy.task" -o "models/pose_landmarker_heavy.task"
 
+echo "Downloading pose_landmarker_full.task and pose_landmarker_lite.task (lighter quality tiers)..."
+curl -L "https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_full/float16/1/pose_landmarker_full.task" -o "models/pose_landmarker_full.task"
+curl -L "https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_lite/float16/1/pose_landmarker_lite.task" -o "models/pose_landmarker_lite.task"
+
 echo "Downloading hand_landmarker.task..."
 curl -L "https://storage.googleapis.com/mediapipe-models/hand_landmarker/hand_landmarker/float16/1/hand_landmarker.task" -o "models/hand_landmarker.task"
 
@@ -0,0 +1,200 @@
+# frame_bus.py
+from __future__ import annotations
+
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from frame_source import FrameSource
+
+# Shared-memory frame bus: one capture process (capture_publisher.py) writes
+# camera frames into a ring of slots, any number of server processes read them
+# through frame source 'shm:<name>' instead of opening the camera themselves.
+#
+# Layout of the shared memory block:
+#   header  : magic "GCTFBUS1", uint32 width, height, channels, slot_count,
+#             uint64 latest_seq (0 = nothing written yet)
+#   slots   : slot_count x (uint64 seq, float64 capture time), then
+#             slot_count x frame bytes (height * width * channels, BGR uint8)
+#
+# Frame n goes to slot n % slot_count. The writer zeroes a slot's seq while it
+# copies into it and sets it to n afterwards, then publishes n as latest_seq,
+# so a reader can tell a complete slot from one being rewritten. Readers get a
+# view straight into the ring (no copy); it stays intact until the writer comes
+# round to that slot again, i.e. for slot_count - 1 frames.
+
+BUS_MAGIC = b"GCTFBUS1"
+BUS_HEADER = struct.Struct("<8sIIIIQ")
+SLOT_HEADER = struct.Struct("<Qd")
+LATEST_SEQ_OFFSET = BUS_HEADER.size - 8
+DEFAULT_SLOTS = 8
+POLL_INTERVAL = 0.001       # seconds between checks for a new frame
+READ_TIMEOUT = 2.0          # seconds without a new frame before read() reports an empty frame
+
+
+def _bus_size(width: int, height: int, channels: int, slots: int) -> int:
+    return BUS_HEADER.size + slots * (SLOT_HEADER.size + width * height * channels)
+
+
+class _BusLayout:
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        magic, width, height, channels, slots, _ = BUS_HEADER.unpack_from(shm.buf, 0)
+        if magic != BUS_MAGIC:
+            raise ValueError(f"Shared memory '{shm.name}' is not a frame bus")
+        self.width, self.height, self.channels, self.slots = width, height, channels, slots
+        frame_shape = (height, width, channels)
+        self.slot_headers = np.ndarray(
+            (slots, 2), dtype=np.uint64, buffer=shm.buf, offset=BUS_HEADER.size)
+        self.frames = np.ndarray(
+            (slots,) + frame_shape, dtype=np.uint8, buffer=shm.buf,
+            offset=BUS_HEADER.size + slots * SLOT_HEADER.size)
+
+    @property
+    def latest_seq(self) -> int:
+        return struct.unpack_from("<Q", self.shm.buf, LATEST_SEQ_OFFSET)[0]
+
+    def slot_seq(self, slot: int) -> int:
+        return int(self.slot_headers[slot, 0])
+
+    def slot_time(self, slot: int) -> float:
+        return float(self.slot_headers[slot, 1:2].view(np.float64)[0])
+
+    def release(self) -> None:
+        # The numpy views must go before the mapping can be closed
+        self.slot_headers = None
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # A frame view is still in use somewhere: the mapping goes when it does
+            pass
+
+
+class FrameBusWriter:
+    """Creates the bus `name` for frames of one size and publishes frames into it."""
+
+    def __init__(self, name: str, width: int, height: int, channels: int = 3, slots: int = DEFAULT_SLOTS):
+        size = _bus_size(width, height, channels, slots)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a publisher that did not exit cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        BUS_HEADER.pack_into(shm.buf, 0, BUS_MAGIC, width, height, channels, slots, 0)
+        self.name = name
+        self._bus = _BusLayout(shm)
+        self.seq = 0
+
+    def write(self, frame: np.ndarray, capture_time: Optional[float] = None) -> int:
+        bus = self._bus
+        if frame.shape != bus.frames.shape[1:]:
+            raise ValueError(f"Frame shape {frame.shape} does not match the bus ({bus.frames.shape[1:]})")
+        seq = self.seq + 1
+        slot = seq % bus.slots
+        bus.slot_headers[slot, 0] = 0
+        np.copyto(bus.frames[slot], frame)
+        bus.slot_headers[slot, 1:2].view(np.float64)[0] = time.time() if capture_time is None else capture_time
+        bus.slot_headers[slot, 0] = seq
+        struct.pack_into("<Q", bus.shm.buf, LATEST_SEQ_OFFSET, seq)
+        self.seq = seq
+        return seq
+
+    def close(self) -> None:
+        shm = self._bus.shm
+        self._bus.release()
+        shm.unlink()
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 every attaching process registers the block with its resource
+    # tracker, which would unlink it (under the publisher) when this reader exits
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class FrameBusSource(FrameSource):
+    """
+    Frame source reading the newest frame of bus `name` ('shm:<name>').
+    read() blocks until a frame newer than the last one read is published and
+    returns a read-only view into the ring, valid for the next slots - 1 frames.
+    If the publisher stalls, read() reports an empty frame every `timeout`
+    seconds and re-attaches, so a restarted publisher is picked up again.
+    """
+
+    def __init__(self, name: str, max_frames: Optional[int] = None, timeout: float = READ_TIMEOUT):
+        super().__init__(None, max_frames)
+        self.name = name
+        self.timeout = timeout
+        self.last_seq = 0
+        self.last_capture_time = 0.0
+        self.missed = 0         # frames published but skipped because this reader was busy
+        self._bus: Optional[_BusLayout] = None
+        self._attach()
+        self._opened = self._bus is not None
+        if self._bus is None:
+            print(f"[FrameBus] No frame bus '{name}' (is capture_publisher.py running?)")
+
+    @property
+    def frame_size(self) -> Tuple[int, int]:
+        return (self._bus.width, self._bus.height) if self._bus is not None else (0, 0)
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self._opened:
+            return False, None
+        if self.max_frames is not None and self.frames_read >= self.max_frames:
+            self.release()
+            return False, None
+        frame = self._next_frame() if self._bus is not None else None
+        if frame is None:
+            # Stay open: the server logs an empty frame and calls read() again
+            self._attach()
+            return False, None
+        self.frames_read += 1
+        return True, frame
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        bus = self._bus
+        deadline = time.monotonic() + self.timeout
+        while True:
+            seq = bus.latest_seq
+            if seq > self.last_seq:
+                slot = seq % bus.slots
+                if bus.slot_seq(slot) == seq:
+                    if self.last_seq:
+                        self.missed += seq - self.last_seq - 1
+                    self.last_seq = seq
+                    self.last_capture_time = bus.slot_time(slot)
+                    frame = bus.frames[slot]
+                    frame.flags.writeable = False
+                    return frame
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def _attach(self) -> None:
+        if self._bus is not None:
+            self._bus.release()
+            self._bus = None
+        try:
+            self._bus = _BusLayout(_attach_shm(self.name))
+        except FileNotFoundError:
+            return
+        self.last_seq = 0
+
+    def release(self) -> None:
+        super().release()
+        if self._bus is not None:
+            self._bus.release()
+            self._bus = None
@@ -0,0 +1,182 @@
+# frame_source.py
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+# Frame sources share cv2.VideoCapture's read() / isOpened() / release()
+# interface, so the servers can run from a webcam, a video file, a directory of
+# images or synthetic frames without changing their capture loop.
+#
+#   0, 1, ...            webcam index (cv2.VideoCapture)
+#   'clip.mp4'           video file
+#   'frames/'            directory of images, in file name order
+#   'synthetic'          generated frames, 'synthetic:1280x720' for a size
+#   'shm:gct555'         frames published by capture_publisher.py (see frame_bus.py)
+#
+# fps: None plays files at their native rate (webcams are never throttled),
+#      0 reads as fast as possible, >0 paces frames at that rate.
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+SYNTHETIC_SIZE = (1280, 720)
+SYNTHETIC_FRAMES = 30       # distinct synthetic frames, cycled
+SYNTHETIC_SEED = 555
+
+SourceSpec = Union[int, str]
+
+
+class _Throttle:
+    def __init__(self, fps: Optional[float]):
+        self.interval = 1.0 / fps if fps else 0.0
+        self._next = 0.0
+
+    def wait(self) -> None:
+        if self.interval <= 0:
+            return
+        now = time.perf_counter()
+        if self._next > now:
+            time.sleep(self._next - now)
+            now = self._next
+        # Skip ahead instead of bursting after a stall
+        self._next = max(self._next + self.interval, now)
+
+
+class FrameSource:
+    """Base class: read() returns (success, BGR frame) like cv2.VideoCapture."""
+
+    def __init__(self, fps: Optional[float] = None, max_frames: Optional[int] = None):
+        self._throttle = _Throttle(fps)
+        self.max_frames = max_frames
+        self.frames_read = 0
+        self._opened = True
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def release(self) -> None:
+        self._opened = False
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self._opened:
+            return False, None
+        if self.max_frames is not None and self.frames_read >= self.max_frames:
+            self.release()
+            return False, None
+        self._throttle.wait()
+        frame = self._next_frame()
+        if frame is None:
+            self.release()
+            return False, None
+        self.frames_read += 1
+        return True, frame
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path: str, fps: Optional[float] = None, loop: bool = False, max_frames: Optional[int] = None):
+        self.path = path
+        self.loop = loop
+        self._cap = cv2.VideoCapture(path)
+        if fps is None:
+            native = self._cap.get(cv2.CAP_PROP_FPS)
+            fps = native if native and native > 0 else 30.0
+        super().__init__(fps, max_frames)
+        self._opened = self._cap.isOpened()
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        success, frame = self._cap.read()
+        if not success and self.loop and self.frames_read > 0:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self._cap.read()
+        return frame if success else None
+
+    def release(self) -> None:
+        super().release()
+        self._cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, path: str, fps: Optional[float] = None, loop: bool = False, max_frames: Optional[int] = None):
+        super().__init__(30.0 if fps is None else fps, max_frames)
+        self.loop = loop
+        self.files: List[str] = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self._index = 0
+        self._opened = bool(self.files)
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        while True:
+            if self._index >= len(self.files):
+                if not self.loop:
+                    return None
+                self._index = 0
+            path = self.files[self._index]
+            self._index += 1
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                return frame
+            print(f"[Source] Skipping unreadable image {path}")
+
+
+class SyntheticSource(FrameSource):
+    """
+    Deterministic generated frames (moving gradient + noise, fixed seed). They
+    contain no person, so they exercise capture, color conversion and detection
+    only; use a video file to benchmark payload building too.
+    """
+
+    def __init__(self, size: Tuple[int, int] = SYNTHETIC_SIZE, fps: Optional[float] = None,
+                 max_frames: Optional[int] = None):
+        super().__init__(30.0 if fps is None else fps, max_frames)
+        width, height = size
+        rng = np.random.default_rng(SYNTHETIC_SEED)
+        xs = np.linspace(0, 255, width, dtype=np.float32)
+        self._frames = []
+        for i in range(SYNTHETIC_FRAMES):
+            shift = 255.0 * i / SYNTHETIC_FRAMES
+            row = ((xs + shift) % 256).astype(np.uint8)
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[:, :, 0] = row
+            frame[:, :, 1] = row[::-1]
+            frame[:, :, 2] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+            noise = rng.integers(0, 16, size=(height, width, 1), dtype=np.uint8)
+            self._frames.append(cv2.add(frame, np.repeat(noise, 3, axis=2)))
+
+    def _next_frame(self) -> Optional[np.ndarray]:
+        return self._frames[self.frames_read % len(self._frames)]
+
+
+def _parse_size(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def open_frame_source(
+    spec: SourceSpec,
+    fps: Optional[float] = None,
+    loop: bool = False,
+    max_frames: Optional[int] = None,
+) -> Any:
+    """
+    Opens a webcam index, video file, image directory, 'synthetic[:WxH]' or 'shm:<bus>'.
+    Check isOpened() on the result, as with cv2.VideoCapture.
+    """
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return cv2.VideoCapture(int(spec))
+    if spec.startswith('shm:'):
+        # frame_bus imports this module
+        from frame_bus import FrameBusSource
+        return FrameBusSource(spec[4:], max_frames=max_frames)
+    if spec == 'synthetic' or spec.startswith('synthetic:'):
+        size = _parse_size(spec.split(':', 1)[1]) if ':' in spec else SYNTHETIC_SIZE
+        return SyntheticSource(size, fps=fps, max_frames=max_frames)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, fps=fps, loop=loop, max_frames=max_frames)
+    return VideoFileSource(spec, fps=fps, loop=loop, max_frames=max_frames)
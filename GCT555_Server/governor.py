@@ -0,0 +1,122 @@
+# governor.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Sequence
+
+from metrics import metrics
+
+# Adaptive quality: a QualityGovernor watches how long inference takes against
+# a per-frame budget and steps through a list of tiers, best first. It steps
+# down when the recent p90 exceeds the budget and back up only when it is well
+# under it (UPGRADE_HEADROOM), after a minimum dwell time. An upgrade that gets
+# undone quickly doubles the wait before the next one, so a machine sitting
+# right at the edge of a tier does not flap between two models.
+
+GOVERNOR_WINDOW = 30            # samples per decision (about one second at 30 fps)
+GOVERNOR_PERCENTILE = 0.9
+UPGRADE_HEADROOM = 0.6          # step up only when p90 < budget * UPGRADE_HEADROOM
+MIN_DWELL = 3.0                 # seconds on a tier before the next change
+MAX_UPGRADE_DWELL = 120.0       # cap of the doubling upgrade back-off
+
+
+@dataclass(frozen=True)
+class QualityTier:
+    name: str
+    model_path: str
+    input_scale: float = 1.0        # primary model input size relative to the camera frame
+    secondary_fps: float = 0.0      # rate cap for secondary models (e.g. face for pose depth), 0 = no limit
+
+
+def available_tiers(tiers: Sequence[QualityTier]) -> List[QualityTier]:
+    """Tiers whose model file exists (download_model.sh fetches all of them)."""
+    found = [tier for tier in tiers if os.path.exists(tier.model_path)]
+    for tier in tiers:
+        if tier not in found:
+            print(f"[Governor] Skipping tier '{tier.name}': {tier.model_path} not found")
+    return found
+
+
+class QualityGovernor:
+    """
+    record(seconds) after every processed frame; `tier` is the tier to use for
+    the next one. Thread-safe: results may be recorded from a callback thread.
+    """
+
+    def __init__(
+        self,
+        tiers: Sequence[QualityTier],
+        frame_budget: float,
+        stream: str = "",
+        window: int = GOVERNOR_WINDOW,
+        min_dwell: float = MIN_DWELL,
+    ):
+        if not tiers:
+            raise ValueError("QualityGovernor needs at least one tier")
+        self.tiers = list(tiers)
+        self.frame_budget = frame_budget
+        self.stream = stream
+        self.min_dwell = min_dwell
+        self.level = 0
+        self.changes = 0
+
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._changed_at = time.monotonic()
+        self._upgrade_dwell = min_dwell
+        self._upgraded_at: Optional[float] = None
+
+        metrics.add_collector(
+            "quality_level", "gauge", "Current quality tier (0 = best), labeled with the tier name.",
+            lambda: [({"stream": self.stream, "tier": self.tier.name}, self.level)])
+        metrics.add_collector(
+            "quality_changes_total", "counter", "Quality tier changes since start.",
+            lambda: [({"stream": self.stream}, self.changes)])
+
+    @property
+    def tier(self) -> QualityTier:
+        return self.tiers[self.level]
+
+    def record(self, seconds: float) -> bool:
+        """Adds one inference time sample. Returns True if the tier changed."""
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append(seconds)
+            if len(self._samples) < self._samples.maxlen or now - self._changed_at < self.min_dwell:
+                return False
+
+            ordered = sorted(self._samples)
+            load = ordered[min(len(ordered) - 1, int(GOVERNOR_PERCENTILE * len(ordered)))]
+
+            if load > self.frame_budget and self.level < len(self.tiers) - 1:
+                if self._upgraded_at is not None and now - self._upgraded_at < 2 * self._upgrade_dwell:
+                    # The last upgrade did not hold: wait longer before trying again
+                    self._upgrade_dwell = min(self._upgrade_dwell * 2, MAX_UPGRADE_DWELL)
+                self._upgraded_at = None
+                self._change(self.level + 1, load, now)
+                return True
+
+            if (load < self.frame_budget * UPGRADE_HEADROOM and self.level > 0
+                    and now - self._changed_at >= self._upgrade_dwell):
+                self._upgraded_at = now
+                self._change(self.level - 1, load, now)
+                return True
+
+            if self._upgraded_at is not None and now - self._upgraded_at >= 2 * self._upgrade_dwell:
+                # The upgrade held: back to normal reaction time
+                self._upgraded_at = None
+                self._upgrade_dwell = self.min_dwell
+            return False
+
+    def _change(self, level: int, load: float, now: float) -> None:
+        previous = self.tier.name
+        self.level = level
+        self.changes += 1
+        self._changed_at = now
+        self._samples.clear()
+        print(f"[Governor] {self.stream or 'quality'}: {previous} -> {self.tier.name} "
+              f"(p90 {load * 1000:.1f} ms, budget {self.frame_budget * 1000:.1f} ms)")
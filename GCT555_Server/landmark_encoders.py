@@ -0,0 +1,61 @@
+# landmark_encoders.py
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence
+
+from depth_module import FaceFrame, HandFrame, PoseFrame
+from subscription import MODE_BLENDSHAPES, Subscription, select_faces, select_hands, select_pose
+from wire_protocol import (ENCODING_BINARY, ENCODING_DELTA, ENCODING_JSON, DeltaEncoder, blendshape_scores,
+                           encode_blendshapes_binary, encode_blendshapes_json, encode_faces_binary, encode_faces_json,
+                           encode_hands_binary, encode_hands_json, encode_pose_binary, encode_pose_json, head_transforms)
+
+# One frame in one client view: the encode(view) that the tracking servers
+# and replay.py hand to publish() (see stream_server.py). `view` is a client
+# subscription (subscription.py): encoding, fields and landmark subset.
+#
+# Only wire-format code lives here, so replay.py can serve recordings without
+# importing the servers (and building their Flask apps and landmarkers). The
+# delta state belongs to each stream and is passed in by the caller.
+
+
+def encode_pose_frame(view: Subscription, frame: Optional[PoseFrame], seq: int, timestamp: float,
+                      delta_encoder: DeltaEncoder, quality: Optional[str] = None) -> bytes:
+    """`quality` is the quality tier name sent in JSON frames (see governor.py)."""
+    frame = select_pose(frame, view)
+    if view.encoding == ENCODING_BINARY:
+        return encode_pose_binary(frame, seq, timestamp)
+    if view.encoding == ENCODING_DELTA:
+        return delta_encoder.encode_pose(frame, seq, timestamp)
+    # Newline-delimited JSON
+    return encode_pose_json(frame, seq, timestamp, quality, view.fields)
+
+
+def encode_hand_frames(view: Subscription, hands: Sequence[HandFrame], seq: int, timestamp: float,
+                       delta_encoder: DeltaEncoder) -> bytes:
+    hands = select_hands(hands, view)
+    if view.encoding == ENCODING_BINARY:
+        return encode_hands_binary(hands, seq, timestamp)
+    if view.encoding == ENCODING_DELTA:
+        return delta_encoder.encode_hands(hands, seq, timestamp)
+    return encode_hands_json(hands, seq, timestamp, view.fields)
+
+
+def encode_face_frames(view: Subscription, faces: Optional[Sequence[FaceFrame]], result: Any, seq: int,
+                       timestamp: float, delta_encoder: DeltaEncoder) -> Optional[bytes]:
+    """`result` is the FaceLandmarkerResult `faces` were computed from (blendshapes, head transform)."""
+    if view.mode == MODE_BLENDSHAPES:
+        # Scores in FACE_BLENDSHAPE_NAMES order (sent in the info message) and the head transform only
+        encode = encode_blendshapes_json if view.encoding == ENCODING_JSON else encode_blendshapes_binary
+        return encode(blendshape_scores(result), head_transforms(result), seq, timestamp, view.quantize)
+    if faces is None:
+        return None     # landmark frames were not built for this frame
+    faces = select_faces(faces, view)
+    scores = blendshape_scores(result) if view.wants("blendshapes") else []
+    if view.encoding == ENCODING_BINARY:
+        return encode_faces_binary(faces, scores, seq, timestamp)
+    if view.encoding == ENCODING_DELTA:
+        return delta_encoder.encode_faces(faces, scores, seq, timestamp)
+
+    face_blendshapes = (result.face_blendshapes or []) if view.wants("blendshapes") else []
+    names = [[category.category_name for category in categories] for categories in face_blendshapes]
+    return encode_faces_json(faces, names, scores, seq, timestamp, view.fields)
@@ -0,0 +1,223 @@
+# landmarkers.py
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import mediapipe as mp
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+
+# Running modes
+#   IMAGE       : detect() on every frame, full detection each time
+#   VIDEO       : detect_for_video() with monotonic timestamps, MediaPipe tracks
+#                 landmarks across frames and skips palm/pose/face detection
+#   LIVE_STREAM : detect_async(), results arrive on MediaPipe's own thread so the
+#                 capture loop never waits on the model (busy frames are dropped)
+RUNNING_MODES = {
+    "IMAGE": vision.RunningMode.IMAGE,
+    "VIDEO": vision.RunningMode.VIDEO,
+    "LIVE_STREAM": vision.RunningMode.LIVE_STREAM,
+}
+
+_TASKS = {
+    "pose": (vision.PoseLandmarker, vision.PoseLandmarkerOptions),
+    "hand": (vision.HandLandmarker, vision.HandLandmarkerOptions),
+    "face": (vision.FaceLandmarker, vision.FaceLandmarkerOptions),
+}
+
+ResultCallback = Callable[[Any, Any], None]     # (result, context)
+
+
+class LandmarkerRunner:
+    """
+    Runs one MediaPipe landmarker in the configured running mode.
+
+    submit(image, context) feeds a frame. Whatever the mode, on_result(result,
+    context) is called once per processed frame with the `context` that was
+    submitted alongside it (e.g. the capture time):
+      - IMAGE / VIDEO : inline, before submit() returns (submit also returns the result)
+      - LIVE_STREAM   : later, from MediaPipe's callback thread (submit returns None)
+
+    drain() waits for the results still in flight, e.g. before switching to
+    another landmarker whose results must not overtake them.
+    """
+
+    def __init__(
+        self,
+        task: str,
+        model_path: str,
+        running_mode: str = "VIDEO",
+        on_result: Optional[ResultCallback] = None,
+        **options: Any,
+    ):
+        if task not in _TASKS:
+            raise ValueError(f"Unknown landmarker task '{task}' (expected one of {sorted(_TASKS)})")
+        mode_name = running_mode.upper()
+        if mode_name not in RUNNING_MODES:
+            raise ValueError(f"Unknown running mode '{running_mode}' (expected one of {sorted(RUNNING_MODES)})")
+
+        self.task = task
+        self.running_mode = mode_name
+        self.on_result = on_result
+
+        self._last_timestamp_ms = -1
+        self._pending: Dict[int, Any] = {}      # LIVE_STREAM: timestamp_ms -> context
+        self._pending_lock = threading.Condition()
+
+        landmarker_cls, options_cls = _TASKS[task]
+        if mode_name == "LIVE_STREAM":
+            options["result_callback"] = self._on_async_result
+        self.detector = landmarker_cls.create_from_options(options_cls(
+            base_options=python.BaseOptions(model_asset_path=model_path),
+            running_mode=RUNNING_MODES[mode_name],
+            **options))
+
+    @property
+    def is_async(self) -> bool:
+        return self.running_mode == "LIVE_STREAM"
+
+    def submit(self, mp_image: mp.Image, context: Any = None) -> Optional[Any]:
+        if self.running_mode == "IMAGE":
+            result = self.detector.detect(mp_image)
+        else:
+            timestamp_ms = self._next_timestamp_ms()
+            if self.running_mode == "VIDEO":
+                result = self.detector.detect_for_video(mp_image, timestamp_ms)
+            else:
+                with self._pending_lock:
+                    self._pending[timestamp_ms] = context
+                self.detector.detect_async(mp_image, timestamp_ms)
+                return None
+
+        if self.on_result is not None:
+            self.on_result(result, context)
+        return result
+
+    def drain(self, timeout: float = 1.0) -> bool:
+        """Waits until every submitted frame has had its callback; False on timeout."""
+        with self._pending_lock:
+            # A frame MediaPipe dropped stays pending until a later result arrives
+            return self._pending_lock.wait_for(lambda: not self._pending, timeout)
+
+    def close(self) -> None:
+        self.detector.close()
+
+    def _next_timestamp_ms(self) -> int:
+        # MediaPipe requires strictly increasing timestamps
+        timestamp_ms = int(time.monotonic() * 1000)
+        if timestamp_ms <= self._last_timestamp_ms:
+            timestamp_ms = self._last_timestamp_ms + 1
+        self._last_timestamp_ms = timestamp_ms
+        return timestamp_ms
+
+    def _on_async_result(self, result: Any, output_image: mp.Image, timestamp_ms: int) -> None:
+        with self._pending_lock:
+            context = self._pending.pop(timestamp_ms, None)
+            # Frames MediaPipe dropped while busy never get a callback
+            for stale in [ts for ts in self._pending if ts < timestamp_ms]:
+                del self._pending[stale]
+            self._pending_lock.notify_all()
+        if self.on_result is not None:
+            self.on_result(result, context)
+
+
+class LandmarkerPool:
+    """
+    `workers` LandmarkerRunner instances working on consecutive frames in
+    parallel (MediaPipe releases the GIL while it runs the model), for
+    throughput beyond one inference at a time on many-core machines.
+
+    submit(image, context) hands the frame to the next instance in turn,
+    blocking only while that instance is still busy, and returns None like
+    LIVE_STREAM. on_result(result, context) is called in submission order
+    whatever order the instances finish in, so the socket stage and depth
+    smoothing see frames in sequence. Call submit() from a single thread.
+    Ordering is per pool: drain() one pool before submitting to another.
+    """
+
+    def __init__(
+        self,
+        task: str,
+        model_path: str,
+        running_mode: str = "VIDEO",
+        on_result: Optional[ResultCallback] = None,
+        workers: int = 2,
+        **options: Any,
+    ):
+        if running_mode.upper() == "LIVE_STREAM":
+            raise ValueError("LandmarkerPool runs IMAGE or VIDEO landmarkers (LIVE_STREAM is already asynchronous)")
+        if workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        self.task = task
+        self.running_mode = running_mode.upper()
+        self.on_result = on_result
+        # In VIDEO mode each instance tracks across the frames it gets (every `workers`-th one)
+        self.runners = [LandmarkerRunner(task, model_path, running_mode, **options) for _ in range(workers)]
+
+        self._inboxes: List[queue.SimpleQueue] = [queue.SimpleQueue() for _ in self.runners]
+        self._idle = [threading.Semaphore(1) for _ in self.runners]
+        self._submitted = 0
+        self._next_emit = 0
+        self._done: Dict[int, Tuple[Any, Any]] = {}    # finished out of order, seq -> (result, context)
+        self._emit_lock = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._work, args=(i,), name=f"{task}-landmarker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def is_async(self) -> bool:
+        return True
+
+    def submit(self, mp_image: mp.Image, context: Any = None) -> None:
+        seq = self._submitted
+        self._submitted += 1
+        worker = seq % len(self.runners)
+        self._idle[worker].acquire()
+        self._inboxes[worker].put((seq, mp_image, context))
+        return None
+
+    def drain(self, timeout: float = 1.0) -> bool:
+        """Waits until every submitted frame has been handed to on_result; False on timeout."""
+        with self._emit_lock:
+            return self._emit_lock.wait_for(lambda: self._next_emit >= self._submitted, timeout)
+
+    def close(self) -> None:
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        for runner in self.runners:
+            runner.close()
+
+    def _work(self, index: int) -> None:
+        runner = self.runners[index]
+        inbox = self._inboxes[index]
+        while True:
+            item = inbox.get()
+            if item is None:
+                return
+            seq, mp_image, context = item
+            try:
+                result = runner.submit(mp_image)
+            except Exception as e:
+                print(f"[Landmarker] {self.task} worker {index} failed: {e}")
+                result = None
+            self._idle[index].release()
+            self._finish(seq, result, context)
+
+    def _finish(self, seq: int, result: Any, context: Any) -> None:
+        # Reorder buffer: hold results until every earlier frame has been handed on
+        with self._emit_lock:
+            self._done[seq] = (result, context)
+            while self._next_emit in self._done:
+                result, context = self._done.pop(self._next_emit)
+                self._next_emit += 1
+                if result is not None and self.on_result is not None:
+                    self.on_result(result, context)
+            self._emit_lock.notify_all()
@@ -0,0 +1,181 @@
+# metrics.py
+from __future__ import annotations
+
+import bisect
+import contextlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Collection only runs for this long after the last /metrics scrape, so an
+# unscraped server pays one clock read per instrumented call and nothing else.
+# The first scrape after an idle period therefore only shows data from then on.
+METRICS_IDLE_TIMEOUT = 300.0    # seconds
+
+METRIC_PREFIX = "gct555"
+STAGE_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.2, 0.5, 1.0)
+LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], Iterable[Sample]]
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count", "lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)      # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.total += value
+            self.count += 1
+
+    def render(self, name: str, labels: Labels) -> List[str]:
+        with self.lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', repr(bound)))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: _Histogram):
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text exposition for the tracking servers.
+
+    Hot paths record into histograms (timer / observe); values that already
+    exist elsewhere (per-client frame counts, pipeline drops) are read by
+    collectors only when /metrics is scraped.
+    """
+
+    def __init__(self, idle_timeout: float = METRICS_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._active_until = 0.0
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}     # name -> (type, help)
+        self._collectors: List[Tuple[str, Collector]] = []
+
+        self.define_histogram("stage_seconds", "Time spent in one processing step.", STAGE_BUCKETS)
+        self.define_histogram("pipeline_stage_seconds", "Time one pipeline stage spent on one frame.", STAGE_BUCKETS)
+        self.define_histogram("capture_to_send_seconds",
+                              "Camera capture until the frame was fully written to a client socket.",
+                              LATENCY_BUCKETS)
+
+    @property
+    def active(self) -> bool:
+        return time.monotonic() < self._active_until
+
+    def define_histogram(self, name: str, help_text: str, buckets: Tuple[float, ...]) -> None:
+        full_name = f"{METRIC_PREFIX}_{name}"
+        with self._lock:
+            self._buckets[full_name] = tuple(buckets)
+            self._help[full_name] = ("histogram", help_text)
+            self._histograms.setdefault(full_name, {})
+
+    def add_collector(self, name: str, metric_type: str, help_text: str, collect: Collector) -> None:
+        """`collect()` returns (labels, value) samples; it is only called on scrape."""
+        full_name = f"{METRIC_PREFIX}_{name}"
+        with self._lock:
+            self._help[full_name] = (metric_type, help_text)
+            self._collectors.append((full_name, collect))
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if self.active:
+            self._histogram(f"{METRIC_PREFIX}_{name}", labels).observe(value)
+
+    def timer(self, stage: str, stream: str = ""):
+        """`with metrics.timer("detect", "pose"):` records into stage_seconds."""
+        if not self.active:
+            return _NULL_TIMER
+        return _Timer(self._histogram(f"{METRIC_PREFIX}_stage_seconds", {"stream": stream, "stage": stage}))
+
+    def render(self) -> str:
+        """Prometheus text format. Scraping (re)starts collection."""
+        self._active_until = time.monotonic() + self.idle_timeout
+
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            collectors = list(self._collectors)
+            helps = dict(self._help)
+
+        samples: Dict[str, List[str]] = {}
+        for name, collect in collectors:
+            try:
+                lines = [f"{name}{_format_labels(tuple(labels.items()))} {value}" for labels, value in collect()]
+            except Exception as e:
+                print(f"[Metrics] Collector {name} failed: {e}")
+                continue
+            samples.setdefault(name, []).extend(lines)
+
+        out: List[str] = []
+        for name, (metric_type, help_text) in helps.items():
+            lines: List[str] = []
+            for labels, histogram in sorted(histograms.get(name, {}).items()):
+                lines.extend(histogram.render(name, labels))
+            lines.extend(samples.get(name, []))
+            if not lines and metric_type != "histogram":
+                continue
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {metric_type}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+    def _histogram(self, full_name: str, labels: Dict[str, str]) -> _Histogram:
+        key = tuple(sorted(labels.items()))
+        series = self._histograms.get(full_name)
+        histogram = series.get(key) if series is not None else None
+        if histogram is None:
+            with self._lock:
+                series = self._histograms.setdefault(full_name, {})
+                histogram = series.get(key)
+                if histogram is None:
+                    histogram = _Histogram(self._buckets.get(full_name, STAGE_BUCKETS))
+                    series[key] = histogram
+        return histogram
+
+
+# One registry per process: server_multi.py serves every stream from the same /metrics
+metrics = MetricsRegistry()
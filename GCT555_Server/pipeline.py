@@ -0,0 +1,274 @@
+# pipeline.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+
+class FrameChannel:
+    """
+    Hands the latest value from a producer (the capture loop) to any number of
+    consumer threads.
+
+    Every publish() gets the next sequence number (1, 2, 3, ...). A consumer
+    remembers the last sequence it handled and blocks in wait() until a newer
+    one lands, so it wakes exactly once per new value and never handles the
+    same value twice. Consumers slower than the producer skip straight to the
+    newest value; the gap is visible in the sequence numbers.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._value: Any = None
+
+    def publish(self, value: Any) -> int:
+        with self._cond:
+            self._seq += 1
+            self._value = value
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self) -> Tuple[int, Any]:
+        with self._cond:
+            return self._seq, self._value
+
+    def wait(self, last_seq: int, timeout: Optional[float] = None) -> Tuple[int, Any]:
+        """
+        Blocks until a value newer than `last_seq` is published.
+        Returns (seq, value); on timeout seq is still `last_seq`.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != last_seq, timeout)
+            return self._seq, self._value
+
+
+class LatestSlot:
+    """
+    Single-slot, latest-wins buffer between two pipeline stages.
+
+    put() never blocks: an item the consumer has not taken yet is replaced
+    (and counted in `dropped`), so a slow stage always works on the newest
+    frame and nothing queues up behind it.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item: Any = None
+        self._has_item = False
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        with self._cond:
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Takes the newest item, or returns None if nothing arrives within `timeout`."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._has_item, timeout):
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+
+class RoundRobinSlots:
+    """
+    Latest-wins slots for several producers (e.g. cameras) feeding one stage.
+
+    put(index, item) replaces producer `index`'s pending item, like LatestSlot.
+    get() takes the pending item of the next producer in turn, so one fast
+    producer cannot starve the others: with N busy producers each gets 1/N of
+    the consumer.
+    """
+
+    def __init__(self, count: int):
+        self._cond = threading.Condition()
+        self._items: List[Any] = [None] * count
+        self._has_item = [False] * count
+        self._next = 0
+        self.dropped = 0
+
+    def put(self, index: int, item: Any) -> None:
+        with self._cond:
+            if self._has_item[index]:
+                self.dropped += 1
+            self._items[index] = item
+            self._has_item[index] = True
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Takes the next producer's newest item, or returns None if nothing arrives within `timeout`."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: any(self._has_item), timeout):
+                return None
+            count = len(self._items)
+            for offset in range(count):
+                index = (self._next + offset) % count
+                if self._has_item[index]:
+                    break
+            item = self._items[index]
+            self._items[index] = None
+            self._has_item[index] = False
+            self._next = (index + 1) % count
+            return item
+
+
+class PipelineStage:
+    """
+    One pipeline stage running on its own thread.
+
+    A source stage (no inbox) calls fn() in a loop; every other stage calls
+    fn(item) for each item taken from its inbox. A non-None return value is
+    put into the outbox.
+    """
+
+    def __init__(
+        self,
+        pipeline: "Pipeline",
+        name: str,
+        fn: Callable[..., Any],
+        inbox: Optional[LatestSlot] = None,
+        outbox: Optional[LatestSlot] = None,
+    ):
+        self.pipeline = pipeline
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.processed = 0
+        self.processed_total = 0
+        self._busy = 0.0
+        self._dropped_reported = 0
+        self._thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    def take_busy_time(self) -> float:
+        busy, self._busy = self._busy, 0.0
+        return busy
+
+    def take_dropped(self) -> int:
+        """Frames overwritten in this stage's inbox since the last call."""
+        if self.inbox is None:
+            return 0
+        total = self.inbox.dropped
+        dropped, self._dropped_reported = total - self._dropped_reported, total
+        return dropped
+
+    def _run(self) -> None:
+        try:
+            while self.pipeline.running:
+                if self.inbox is None:
+                    start = time.perf_counter()
+                    out = self.fn()
+                else:
+                    item = self.inbox.get(timeout=0.1)
+                    if item is None:
+                        continue
+                    start = time.perf_counter()
+                    out = self.fn(item)
+                elapsed = time.perf_counter() - start
+                self._busy += elapsed
+                self.processed += 1
+                self.processed_total += 1
+                metrics.observe("pipeline_stage_seconds", elapsed, stream=self.pipeline.stream, stage=self.name)
+                if out is not None and self.outbox is not None:
+                    self.outbox.put(out)
+        except Exception as e:
+            print(f"[Pipeline] Stage '{self.name}' failed: {e}")
+            self.pipeline.stop()
+
+
+class Pipeline:
+    """
+    Stages connected by LatestSlot buffers, e.g. capture -> infer -> annotate.
+
+    Throughput is set by the slowest stage alone; faster upstream stages just
+    overwrite the slot in front of it (stale frames are dropped, never queued).
+    Every `report_interval` seconds a line with each stage's occupancy (fraction
+    of wall time spent working), rate and drops is printed. Per-frame stage
+    times, frame counts and drops are also exported on /metrics, labelled
+    with `stream`.
+    """
+
+    def __init__(self, report_interval: float = 5.0, stream: str = ""):
+        self.stages: List[PipelineStage] = []
+        self.report_interval = report_interval
+        self.stream = stream
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set()
+
+    def add_stage(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        inbox: Optional[LatestSlot] = None,
+        outbox: Optional[LatestSlot] = None,
+    ) -> PipelineStage:
+        stage = PipelineStage(self, name, fn, inbox, outbox)
+        self.stages.append(stage)
+        return stage
+
+    def start(self) -> None:
+        metrics.add_collector(
+            "pipeline_frames_total", "counter", "Frames each pipeline stage has processed.",
+            lambda: [({"stream": self.stream, "stage": s.name}, s.processed_total) for s in self.stages])
+        metrics.add_collector(
+            "pipeline_frames_dropped_total", "counter",
+            "Frames overwritten in a stage's inbox before the stage could take them.",
+            lambda: [({"stream": self.stream, "stage": s.name}, s.inbox.dropped)
+                     for s in self.stages if s.inbox is not None])
+        for stage in self.stages:
+            stage.start()
+        if self.report_interval > 0:
+            threading.Thread(target=self._report_loop, daemon=True).start()
+
+    def stop(self, join_timeout: float = 1.0) -> None:
+        """Stops every stage and waits (briefly) for their threads to finish."""
+        self._stop.set()
+        for stage in self.stages:
+            if stage._thread is not threading.current_thread() and stage._thread.is_alive():
+                stage.join(join_timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Returns True once the pipeline has been stopped."""
+        return self._stop.wait(timeout)
+
+    def stage_stats(self, elapsed: float) -> List[Dict[str, Any]]:
+        stats = []
+        for stage in self.stages:
+            processed, stage.processed = stage.processed, 0
+            stats.append({
+                "stage": stage.name,
+                "occupancy": stage.take_busy_time() / elapsed if elapsed > 0 else 0.0,
+                "fps": processed / elapsed if elapsed > 0 else 0.0,
+                "dropped": stage.take_dropped(),
+            })
+        return stats
+
+    def _report_loop(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.report_interval):
+            now = time.perf_counter()
+            parts = [
+                f"{s['stage']} {s['occupancy'] * 100:3.0f}% {s['fps']:5.1f}fps drop={s['dropped']}"
+                for s in self.stage_stats(now - last)
+            ]
+            last = now
+            print("[Pipeline] " + " | ".join(parts))
@@ -0,0 +1,166 @@
+# recording.py
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from wire_protocol import LENGTH_PREFIX, MODALITY_FACE, MODALITY_HAND, MODALITY_POSE, read_frame_header
+
+# Landmark stream recordings (*.lmrec)
+#
+# The main file is append-only:
+#   magic "GCTLMREC", uint16 version, uint8 modality, uint8 reserved,
+#   uint32 metadata_length, metadata (UTF-8 JSON),
+#   then every frame exactly as the binary socket framing sends it
+#   (uint32 length prefix + body, see wire_protocol.py).
+#
+# A sidecar "<file>.idx" holds one (uint64 offset, float64 timestamp) record
+# per frame, so a reader can memory-map both files and seek to any frame or
+# time without parsing. A missing or short index (e.g. after a crash) is
+# rebuilt by walking the length prefixes.
+
+RECORDING_MAGIC = b"GCTLMREC"
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct("<8sHBBI")
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("timestamp", "<f8")])
+INDEX_SUFFIX = ".idx"
+
+FLUSH_INTERVAL = 1.0        # seconds between flushes while recording
+
+MODALITY_NAMES = {MODALITY_POSE: "pose", MODALITY_HAND: "hand", MODALITY_FACE: "face"}
+
+
+class RecordingWriter:
+    """
+    Appends binary-framed landmark frames (encode_*_binary output) to a recording.
+    Used from a single thread (the server's socket thread).
+    """
+
+    def __init__(self, path: str, modality: int, metadata: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.modality = modality
+        self.frames = 0
+        meta = {"modality": MODALITY_NAMES.get(modality, str(modality)), "created": time.time()}
+        meta.update(metadata or {})
+        meta_bytes = json.dumps(meta).encode("utf-8")
+
+        self._file = open(path, "wb")
+        self._index = open(path + INDEX_SUFFIX, "wb")
+        self._file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, modality, 0, len(meta_bytes)))
+        self._file.write(meta_bytes)
+        self._offset = self._file.tell()
+        self._last_flush = time.monotonic()
+        print(f"[Record] Writing {meta['modality']} landmarks to {path}")
+
+    def append(self, frame: bytes) -> None:
+        timestamp = read_frame_header(memoryview(frame)[LENGTH_PREFIX.size:])[4]
+        self._file.write(frame)
+        self._index.write(np.array([(self._offset, timestamp)], dtype=INDEX_DTYPE).tobytes())
+        self._offset += len(frame)
+        self.frames += 1
+
+        now = time.monotonic()
+        if now - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+            self._last_flush = now
+
+    def flush(self) -> None:
+        # Frames first, so the index never points past the end of the file
+        self._file.flush()
+        self._index.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+        self._index.close()
+        print(f"[Record] Closed {self.path} ({self.frames} frames)")
+
+
+class Recording:
+    """
+    Read-only, memory-mapped view of a recording.
+
+    frame(i) returns the i-th frame's body (without length prefix) as a
+    memoryview into the map, ready for wire_protocol.decode_binary; nothing is
+    copied until it is decoded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, modality, _, meta_len = RECORDING_HEADER.unpack_from(self._map, 0)
+        if magic != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not a landmark recording")
+        if version != RECORDING_VERSION:
+            raise ValueError(f"{path}: unsupported recording version {version}")
+        self.modality = modality
+        self.metadata = json.loads(bytes(self._map[RECORDING_HEADER.size:RECORDING_HEADER.size + meta_len]))
+        self._data_start = RECORDING_HEADER.size + meta_len
+
+        self.index = self._load_index()
+        self.timestamps = self.index["timestamp"]
+
+    def __len__(self) -> int:
+        return int(self.index.shape[0])
+
+    @property
+    def start_time(self) -> float:
+        return float(self.timestamps[0]) if len(self) else 0.0
+
+    @property
+    def duration(self) -> float:
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+    def frame(self, i: int) -> memoryview:
+        offset = int(self.index["offset"][i])
+        (length,) = LENGTH_PREFIX.unpack_from(self._map, offset)
+        start = offset + LENGTH_PREFIX.size
+        return memoryview(self._map)[start:start + length]
+
+    def frame_at(self, timestamp: float) -> int:
+        """Index of the last frame at or before `timestamp` (0 if before the first)."""
+        return max(0, int(np.searchsorted(self.timestamps, timestamp, side="right")) - 1)
+
+    def close(self) -> None:
+        self.index = self.index[:0]
+        self.timestamps = self.timestamps[:0]
+        self._map.close()
+        self._file.close()
+
+    def _load_index(self) -> np.ndarray:
+        index_path = self.path + INDEX_SUFFIX
+        size = os.path.getsize(index_path) // INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+        if size:
+            index = np.memmap(index_path, dtype=INDEX_DTYPE, mode="r", shape=(size,))
+            last = int(index[-1]["offset"])
+            if self._frame_fits(last):
+                # The index is flushed after the frames, so a crash can leave it short
+                tail = self._scan_index(last + self._frame_size(last))
+                return index if not len(tail) else np.concatenate([index, tail])
+        print(f"[Record] Rebuilding index of {self.path}")
+        return self._scan_index(self._data_start)
+
+    def _frame_size(self, offset: int) -> int:
+        return LENGTH_PREFIX.size + LENGTH_PREFIX.unpack_from(self._map, offset)[0]
+
+    def _frame_fits(self, offset: int) -> bool:
+        if offset + LENGTH_PREFIX.size > len(self._map):
+            return False
+        return offset + self._frame_size(offset) <= len(self._map)
+
+    def _scan_index(self, offset: int) -> np.ndarray:
+        records = []
+        while self._frame_fits(offset):
+            body = memoryview(self._map)[offset + LENGTH_PREFIX.size:offset + self._frame_size(offset)]
+            records.append((offset, read_frame_header(body)[4]))
+            body.release()
+            offset += self._frame_size(offset)
+        return np.array(records, dtype=INDEX_DTYPE)
@@ -0,0 +1,275 @@
+import argparse
+import collections
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+#---------------------------
+# Serves recorded landmark streams (see recording.py) on the normal socket
+# ports, so Unity can be tuned without a camera or a model running:
+#
+#   python replay.py session/pose.lmrec session/face.lmrec
+#   python replay.py hand.lmrec --speed 2 --loop
+#   python replay.py pose.lmrec --paused          (then step with Enter)
+#
+# Every recording plays on one shared clock. Clients connect and negotiate an
+# encoding exactly as with the live servers. Binary clients get the recorded
+# bytes with a patched header; JSON / delta frames and narrowed subscriptions
+# (subscription.py) are rebuilt from the decoded arrays with the servers' own
+# encoders (landmark_encoders.py). Sent frames carry a fresh, increasing seq
+# and the send time, so loops and seeks look live to Unity.
+#
+# Commands on stdin:
+#   Enter / n      step to the next frame (pauses)     b        step back
+#   p              pause / resume                      x <k>    speed factor
+#   s <sec>        seek to seconds from the start      f <i>    seek to frame i
+#   q              quit
+#---------------------------
+from landmark_encoders import encode_face_frames, encode_hand_frames, encode_pose_frame
+from recording import MODALITY_NAMES, Recording
+from stream_server import make_stream_server
+from subscription import FULL_VIEWS
+from wire_protocol import (ENCODING_BINARY, ENCODING_DELTA, FACE_BLENDSHAPE_NAMES, FRAME_HEADER, LENGTH_PREFIX,
+                           MODALITY_FACE, MODALITY_HAND, MODALITY_POSE, DeltaEncoder, decode_binary, read_frame_header)
+
+# Configuration (the servers' SOCKET_HOST / SOCKET_PORT / UDP_STREAM)
+SOCKET_HOST = '0.0.0.0'
+SOCKET_PORTS = {MODALITY_POSE: 5050, MODALITY_HAND: 5051, MODALITY_FACE: 5052}
+UDP_STREAM = False          # also send frames as datagrams on each port/udp (see wire_protocol.py)
+IDLE_WAIT = 0.5     # seconds between checks while paused or finished
+
+
+def face_transform(face):
+    # Recordings keep only the head translation
+    if face.face_pose is None:
+        return None
+    matrix = np.eye(4, dtype=np.float32)
+    matrix[:3, 3] = face.face_pose
+    return matrix
+
+
+def face_result(frame):
+    """Stand-in for a FaceLandmarkerResult, enough for landmark_encoders.encode_face_frames."""
+    return SimpleNamespace(
+        face_blendshapes=[
+            [SimpleNamespace(category_name=name, score=float(score)) for name, score in zip(FACE_BLENDSHAPE_NAMES, scores)]
+            for scores in frame.blendshapes
+        ],
+        facial_transformation_matrixes=[face_transform(face) for face in frame.faces])
+
+
+class PlaybackClock:
+    """Recording time in seconds from the start, advancing at `speed` unless paused."""
+
+    def __init__(self, position=0.0, speed=1.0, paused=False):
+        self.speed = speed
+        self.paused = paused
+        self._position = position
+        self._since = time.monotonic()
+
+    def position(self):
+        if self.paused:
+            return self._position
+        return self._position + (time.monotonic() - self._since) * self.speed
+
+    def seek(self, position):
+        self._position = max(0.0, position)
+        self._since = time.monotonic()
+
+    def set_speed(self, speed):
+        self.seek(self.position())
+        self.speed = speed
+
+    def set_paused(self, paused):
+        self.seek(self.position())
+        self.paused = paused
+
+
+class Player:
+    """One recording served on its modality's usual port."""
+
+    def __init__(self, recording, origin):
+        self.recording = recording
+        self.name = MODALITY_NAMES[recording.modality]
+        self.port = SOCKET_PORTS[recording.modality]
+        # Recording timestamps relative to the shared clock
+        self.times = recording.timestamps - origin
+        self.stream_server = make_stream_server(
+            SOCKET_HOST, self.port, stream=f'replay_{self.name}', udp=UDP_STREAM, modality=recording.modality)
+        self.delta_encoder = DeltaEncoder(recording.modality)
+        self.sent_index = -1
+        self.seq = 0
+
+    def start(self):
+        self.stream_server.start()
+        print(f"[Replay] {self.recording.path}: {len(self.recording)} {self.name} frames, "
+              f"{self.recording.duration:.1f}s on port {self.port}")
+
+    def index_at(self, position):
+        """Frame due at `position`, or -1 before the first one."""
+        if not len(self.recording) or position < self.times[0]:
+            return -1
+        return self.recording.frame_at(self.recording.start_time + position - self.times[0])
+
+    def previous_time(self, position):
+        """Clock position of the last frame before `position`, or None."""
+        i = self.index_at(position)
+        if i >= 0 and self.times[i] >= position - 1e-9:
+            i -= 1
+        return float(self.times[i]) if i >= 0 else None
+
+    def next_time(self, position):
+        """Clock position of the first frame after `position`, or None at the end."""
+        i = self.index_at(position) + 1
+        return float(self.times[i]) if i < len(self.recording) else None
+
+    def update(self, position, seeked=False):
+        if self.stream_server.take_keyframe_request(ENCODING_DELTA) or seeked:
+            self.delta_encoder.request_keyframe()
+        index = self.index_at(position)
+        if index < 0 or index == self.sent_index:
+            return
+        self.sent_index = index
+        if not self.stream_server.client_count:
+            return
+        self.seq += 1
+        self.send(self.recording.frame(index), self.seq, time.time())
+
+    def send(self, body, seq, timestamp):
+        decoded = []
+
+        def frame():
+            if not decoded:
+                decoded.append(decode_binary(body))
+            return decoded[0]
+
+        def encode(view):
+            if view == FULL_VIEWS[ENCODING_BINARY]:
+                version, modality, item_count, _, _ = read_frame_header(body)
+                data = bytearray(LENGTH_PREFIX.size + len(body))
+                LENGTH_PREFIX.pack_into(data, 0, len(body))
+                data[LENGTH_PREFIX.size:] = body
+                FRAME_HEADER.pack_into(data, LENGTH_PREFIX.size, version, modality, item_count, seq & 0xFFFFFFFF, timestamp)
+                return bytes(data)
+            if self.recording.modality == MODALITY_POSE:
+                return encode_pose_frame(view, frame().pose, seq, timestamp, self.delta_encoder)
+            if self.recording.modality == MODALITY_HAND:
+                return encode_hand_frames(view, frame().hands, seq, timestamp, self.delta_encoder)
+            return encode_face_frames(view, frame().faces, face_result(frame()), seq, timestamp, self.delta_encoder)
+
+        self.stream_server.publish(encode, capture_time=timestamp)
+
+
+def read_commands(commands, wake):
+    for line in sys.stdin:
+        commands.append(line.strip())
+        wake.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded landmark streams on the tracking server ports.")
+    parser.add_argument('recordings', nargs='+', help="*.lmrec files, at most one per modality")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed factor (default: 1)")
+    parser.add_argument('--start', type=float, default=0.0, help="start this many seconds in (default: 0)")
+    parser.add_argument('--loop', action='store_true', help="restart at the end instead of pausing")
+    parser.add_argument('--paused', action='store_true', help="start paused, step with Enter")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    recordings = [Recording(path) for path in args.recordings]
+    modalities = [r.modality for r in recordings]
+    if len(set(modalities)) != len(modalities):
+        parser.error("only one recording per modality can be served (they share a port)")
+    recordings = [r for r in recordings if len(r)]
+    if not recordings:
+        parser.error("the recordings contain no frames")
+
+    origin = min(r.start_time for r in recordings)
+    players = [Player(r, origin) for r in recordings]
+    end = max(float(p.times[-1]) for p in players)
+    for player in players:
+        player.start()
+
+    clock = PlaybackClock(args.start, args.speed, args.paused)
+    commands = collections.deque()
+    wake = threading.Event()
+    threading.Thread(target=read_commands, args=(commands, wake), daemon=True).start()
+    print("[Replay] Enter/n step, b back, p pause, x <speed>, s <sec>, f <frame>, q quit")
+
+    seeked = True
+    try:
+        while True:
+            while commands:
+                command = commands.popleft().split()
+                op = command[0] if command else 'n'
+                try:
+                    if op == 'q':
+                        return
+                    if op == 'p':
+                        clock.set_paused(not clock.paused)
+                        print(f"[Replay] {'Paused' if clock.paused else 'Playing'} at {clock.position():.3f}s")
+                    elif op in ('n', 'b'):
+                        position = clock.position()
+                        if op == 'n':
+                            candidates = [t for t in (p.next_time(position) for p in players) if t is not None]
+                            target = min(candidates) if candidates else position
+                        else:
+                            candidates = [t for t in (p.previous_time(position) for p in players) if t is not None]
+                            target = max(candidates) if candidates else 0.0
+                        clock.set_paused(True)
+                        clock.seek(target)
+                        seeked = True
+                        print(f"[Replay] Frame at {target:.3f}s")
+                    elif op == 'x':
+                        clock.set_speed(max(float(command[1]), 1e-3))
+                        print(f"[Replay] Speed x{clock.speed:g}")
+                    elif op == 's':
+                        clock.seek(float(command[1]))
+                        seeked = True
+                    elif op == 'f':
+                        # Frame index of the first recording given
+                        times = players[0].times
+                        clock.seek(float(times[min(max(int(command[1]), 0), len(times) - 1)]))
+                        seeked = True
+                    else:
+                        print(f"[Replay] Unknown command {op!r}")
+                except (IndexError, ValueError):
+                    print(f"[Replay] Bad command {' '.join(command)!r}")
+
+            position = clock.position()
+            if position > end and not clock.paused:
+                if args.loop:
+                    clock.seek(0.0)
+                    position = 0.0
+                    seeked = True
+                else:
+                    clock.seek(end)
+                    clock.set_paused(True)
+                    position = end
+                    print("[Replay] End of recording, paused ('s 0' restarts)")
+
+            for player in players:
+                if seeked:
+                    player.sent_index = -1
+                player.update(position, seeked)
+            seeked = False
+
+            # Sleep until the next frame is due (or poll while paused / idle)
+            wait = IDLE_WAIT
+            if not clock.paused:
+                upcoming = [t for t in (p.next_time(position) for p in players) if t is not None]
+                due = min(upcoming) if upcoming else end
+                wait = min(IDLE_WAIT, max(0.0, (due - clock.position()) / clock.speed))
+            # Commands cut the wait short
+            wake.wait(wait)
+            wake.clear()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# roi.py
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence, Tuple
+
+import mediapipe as mp
+import numpy as np
+
+from landmarkers import LandmarkerPool, LandmarkerRunner
+
+# Pose landmark indices used to place the secondary crops
+POSE_FACE_POINTS = tuple(range(0, 11))          # nose, eyes, ears, mouth
+POSE_HAND_POINTS = (
+    (15, 17, 19, 21),                           # left wrist, pinky, index, thumb
+    (16, 18, 20, 22),                           # right wrist, pinky, index, thumb
+)
+
+VISIBILITY_MIN = 0.5        # pose points below this are ignored
+MIN_ROI_SCALE = 0.2         # smallest crop, as a fraction of the frame
+MAX_ROI_SCALE = 0.75        # crops larger than this are not worth it, use the full frame
+ROI_SCALE_STEP = 1 / 32     # crop sizes are rounded up to this step so they do not change every frame
+FULL_FRAME_INTERVAL = 30    # every Nth frame runs on the full frame to pick up new faces / hands
+
+# Padding around the landmark extent, as a fraction of it on each side
+FACE_PADDING_FROM_POSE = 0.6    # pose only covers nose/eyes/ears/mouth, not the whole head
+HAND_PADDING_FROM_POSE = 0.5
+TRACKED_PADDING = {"face": 0.25, "hand": 0.35, "pose": 0.25}
+
+# MediaPipe face geometry camera, used to move the face transform from crop to frame
+FACE_CAMERA_VERTICAL_FOV = 63.0
+
+_LANDMARK_ATTR = {"pose": "pose_landmarks", "hand": "hand_landmarks", "face": "face_landmarks"}
+
+
+@dataclass(frozen=True)
+class RoiBox:
+    """Crop rectangle in normalized frame coordinates (0~1)."""
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @property
+    def width(self) -> float:
+        return self.x1 - self.x0
+
+    @property
+    def height(self) -> float:
+        return self.y1 - self.y0
+
+
+def _points_px(landmarks: Sequence[Any], indices: Optional[Sequence[int]], width: int, height: int) -> np.ndarray:
+    """(K, 2) pixel coordinates of the visible landmarks."""
+    if indices is not None:
+        landmarks = [landmarks[i] for i in indices if i < len(landmarks)]
+    points = []
+    for lm in landmarks:
+        visibility = getattr(lm, "visibility", None)
+        if visibility is not None and visibility < VISIBILITY_MIN:
+            continue
+        points.append((lm.x * width, lm.y * height))
+    return np.array(points, dtype=np.float32).reshape(-1, 2)
+
+
+def _square_roi(
+    points: np.ndarray,
+    padding: float,
+    width: int,
+    height: int,
+    min_size: float = 0.0,
+) -> Optional[RoiBox]:
+    """
+    Crop around `points` (pixels) that keeps the frame's aspect ratio, so the
+    secondary model sees the same geometry, just zoomed in.
+    Returns None when the crop would cover most of the frame anyway.
+    """
+    if len(points) == 0:
+        return None
+    lo = points.min(axis=0)
+    hi = points.max(axis=0)
+    size = max(float((hi - lo).max()), min_size) * (1.0 + 2.0 * padding)
+
+    scale = size / min(width, height)
+    scale = max(MIN_ROI_SCALE, math.ceil(scale / ROI_SCALE_STEP) * ROI_SCALE_STEP)
+    if scale >= MAX_ROI_SCALE:
+        return None
+
+    cx, cy = (float(v) for v in (lo + hi) / 2.0)
+    w, h = scale * width, scale * height
+    x0 = min(max(cx - w / 2.0, 0.0), width - w)
+    y0 = min(max(cy - h / 2.0, 0.0), height - h)
+    return RoiBox(x0 / width, y0 / height, (x0 + w) / width, (y0 + h) / height)
+
+
+def face_roi_from_pose(pose_landmarks: Optional[Sequence[Any]], width: int, height: int) -> Optional[RoiBox]:
+    """Face crop from the pose head points, or None if the head is not tracked."""
+    if not pose_landmarks:
+        return None
+    points = _points_px(pose_landmarks, POSE_FACE_POINTS, width, height)
+    if len(points) < 3:
+        return None
+    return _square_roi(points, FACE_PADDING_FROM_POSE, width, height)
+
+
+def hand_roi_from_pose(pose_landmarks: Optional[Sequence[Any]], width: int, height: int) -> Optional[RoiBox]:
+    """One crop covering every hand the pose can see, or None if no wrist is tracked."""
+    if not pose_landmarks:
+        return None
+    hands = [_points_px(pose_landmarks, indices, width, height) for indices in POSE_HAND_POINTS]
+    hands = [points for points in hands if len(points) >= 2]
+    if not hands:
+        return None
+    # Pose only reaches the knuckles; a hand is roughly twice the wrist-to-knuckle distance
+    hand_size = max(2.0 * float(np.linalg.norm(points - points[0], axis=1).max()) for points in hands)
+    return _square_roi(np.concatenate(hands), HAND_PADDING_FROM_POSE, width, height, min_size=hand_size)
+
+
+def roi_from_landmarks(
+    landmark_lists: Optional[Sequence[Sequence[Any]]],
+    width: int,
+    height: int,
+    padding: float,
+) -> Optional[RoiBox]:
+    """Crop around every target of a previous result (self-tracking)."""
+    if not landmark_lists:
+        return None
+    points = np.concatenate([_points_px(landmarks, None, width, height) for landmarks in landmark_lists])
+    return _square_roi(points, padding, width, height)
+
+
+def crop_roi(rgb_image: np.ndarray, box: RoiBox) -> Tuple[np.ndarray, RoiBox]:
+    """
+    Cuts `box` out of the frame. Returns the contiguous crop and the box
+    snapped to whole pixels, which is what landmarks must be mapped back with.
+    """
+    height, width = rgb_image.shape[:2]
+    px0 = int(round(box.x0 * width))
+    py0 = int(round(box.y0 * height))
+    px1 = max(px0 + 1, int(round(box.x1 * width)))
+    py1 = max(py0 + 1, int(round(box.y1 * height)))
+    crop = np.ascontiguousarray(rgb_image[py0:py1, px0:px1])
+    return crop, RoiBox(px0 / width, py0 / height, px1 / width, py1 / height)
+
+
+def _crop_translation_to_frame(matrix: Any, box: RoiBox, frame_aspect: float) -> np.ndarray:
+    """
+    The face transform of a crop places the head as seen by a zoomed-in,
+    off-center camera. Moves its translation back to the full-frame camera:
+    depth grows by the zoom factor and x/y shift by the crop center.
+    """
+    M = np.array(matrix, dtype=np.float32).reshape(4, 4)
+    tx, ty, tz = (float(v) for v in M[:3, 3])
+    if tz == 0.0:
+        return M
+
+    f = 1.0 / math.tan(math.radians(FACE_CAMERA_VERTICAL_FOV) / 2.0)
+    crop_aspect = frame_aspect * box.width / box.height
+
+    # Crop NDC -> frame NDC (y up)
+    u = (box.x0 + box.x1) - 1.0 + box.width * tx * f / (crop_aspect * -tz)
+    v = 1.0 - (box.y0 + box.y1) + box.height * ty * f / -tz
+
+    tz = tz / box.height
+    M[0, 3] = u * -tz * frame_aspect / f
+    M[1, 3] = v * -tz / f
+    M[2, 3] = tz
+    return M
+
+
+def remap_result(result: Any, box: RoiBox, frame_aspect: float) -> None:
+    """Maps a landmarker result computed on `box` back to full-frame coordinates, in place."""
+    for attr in _LANDMARK_ATTR.values():
+        for landmarks in getattr(result, attr, None) or []:
+            for lm in landmarks:
+                lm.x = box.x0 + lm.x * box.width
+                lm.y = box.y0 + lm.y * box.height
+                if lm.z is not None:
+                    lm.z = lm.z * box.width     # z shares the scale of x
+    # World landmarks are metric and need no change
+
+    matrices = getattr(result, "facial_transformation_matrixes", None)
+    if matrices:
+        for i, matrix in enumerate(matrices):
+            matrices[i] = _crop_translation_to_frame(matrix, box, frame_aspect)
+
+
+def roi_running_mode(running_mode: str, use_roi: bool) -> str:
+    """
+    Running mode for a RoiLandmarker: IMAGE whenever crops are used.
+
+    VIDEO / LIVE_STREAM tracking carries the previous result's position into
+    the next call, which is wrong as soon as the input switches between moving
+    crops and the periodic full frame. With crops the crop is the tracker;
+    asynchronous results are still available with workers > 1.
+    """
+    return "IMAGE" if use_roi else running_mode
+
+
+class RoiLandmarker:
+    """
+    LandmarkerRunner that runs on a region of interest instead of the full frame.
+
+    submit(rgb_image, roi, context) crops the frame to `roi` (e.g. from the
+    previous pose result, or tracked_roi()), runs the landmarker on the crop and
+    hands on_result(result, context) landmarks already mapped back to
+    full-frame normalized coordinates, so payload building is unchanged.
+
+    The full frame is used instead when no roi is given, when the previous
+    frame found nothing (tracking lost) and every FULL_FRAME_INTERVAL frames.
+
+    workers > 1 runs a LandmarkerPool instead of a single instance (results
+    then arrive asynchronously, in frame order).
+
+    share() returns another RoiLandmarker with its own tracking state on the
+    same model instance (e.g. one per camera); submit to all of them from one
+    thread. Use IMAGE mode whenever crops are submitted (roi_running_mode()),
+    so MediaPipe's own tracking neither mixes cameras nor fights the crops.
+    """
+
+    def __init__(
+        self,
+        task: str,
+        model_path: Optional[str],
+        running_mode: str = "VIDEO",
+        on_result: Optional[Any] = None,
+        full_frame_interval: int = FULL_FRAME_INTERVAL,
+        runner: Optional[Any] = None,
+        workers: int = 1,
+        **options: Any,
+    ):
+        self.task = task
+        self.on_result = on_result
+        self.full_frame_interval = full_frame_interval
+        self.lost = True
+        self.last_box: Optional[RoiBox] = None     # crop of the last submitted frame, None = full frame
+        self._frames_since_full = 0
+        self._last_landmarks: Sequence[Sequence[Any]] = []
+        if runner is None and workers > 1:
+            runner = LandmarkerPool(task, model_path, running_mode, on_result=_route_roi_result, workers=workers, **options)
+        elif runner is None:
+            runner = LandmarkerRunner(task, model_path, running_mode, on_result=_route_roi_result, **options)
+        self.runner = runner
+
+    @property
+    def is_async(self) -> bool:
+        return self.runner.is_async
+
+    def tracked_roi(self, width: int, height: int) -> Optional[RoiBox]:
+        """Crop around what the previous frame found (for servers without a pose result)."""
+        return roi_from_landmarks(self._last_landmarks, width, height, TRACKED_PADDING[self.task])
+
+    def submit(
+        self,
+        rgb_image: np.ndarray,
+        roi: Optional[RoiBox] = None,
+        context: Any = None,
+        mp_image: Optional[mp.Image] = None,
+    ) -> Optional[Any]:
+        height, width = rgb_image.shape[:2]
+        box = None
+        if roi is not None and not self.lost and self._frames_since_full < self.full_frame_interval:
+            crop, box = crop_roi(rgb_image, roi)
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=crop)
+            self._frames_since_full += 1
+        else:
+            self._frames_since_full = 0
+            if mp_image is None:
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+        self.last_box = box
+        return self.runner.submit(mp_image, (self, box, width / height, context))
+
+    def share(self, on_result: Optional[Any] = None) -> "RoiLandmarker":
+        return RoiLandmarker(self.task, None, on_result=on_result,
+                             full_frame_interval=self.full_frame_interval, runner=self.runner)
+
+    def close(self) -> None:
+        self.runner.close()
+
+    def _on_roi_result(self, result: Any, box: Optional[RoiBox], frame_aspect: float, context: Any) -> None:
+        if result is not None and box is not None:
+            remap_result(result, box, frame_aspect)
+
+        landmarks = getattr(result, _LANDMARK_ATTR[self.task], None) or []
+        self._last_landmarks = landmarks
+        self.lost = not landmarks
+        if self.on_result is not None:
+            self.on_result(result, context)
+
+
+def _route_roi_result(result: Any, roi_context: Any) -> None:
+    # The submitting RoiLandmarker travels in the context, so landmarkers sharing a runner get their own results
+    if roi_context is None:
+        # The runner lost track of which frame this was: nobody to route it to
+        return
+    landmarker, box, frame_aspect, context = roi_context
+    landmarker._on_roi_result(result, box, frame_aspect, context)
@@ -1,21 +1,29 @@
+import atexit
 import cv2
-import mediapipe as mp
-import socket
 import threading
-import json
 import time
 import numpy as np
-from flask import Flask, Response
-
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
+from flask import Flask, Response, request
 
 #---------------------------
-from depth_module import DepthConfig, DepthState, build_hand_payloads
+from annotation import display_available, draw_connections, draw_points, landmark_pixels
+from depth_module import DepthConfig, DepthState, compute_hand_frames
+from landmark_encoders import encode_hand_frames
+from roi import RoiLandmarker, roi_running_mode
+from frame_source import open_frame_source
+from metrics import metrics
+from pipeline import FrameChannel, LatestSlot, Pipeline
+from recording import RecordingWriter
+from stream_server import make_stream_server
+from subscription import frame_scope, in_scope
+from video_stream import JpegBroadcaster, variant_from_args
+from websocket_stream import WebSocketStreamServer, add_websocket_route
+from wire_protocol import ENCODING_DELTA, MODALITY_HAND, DeltaEncoder, encode_hands_binary
 
 depth_state = DepthState(
     DepthConfig(
         smoothing_alpha=0.35,
+        landmark_filter="none",     # "one_euro" (+ filter_prediction=True) to filter every landmark (see depth_module.py)
         pose_invert_world_z=False,
         clamp_min=-5.0,
         clamp_max=5.0,
@@ -26,19 +34,37 @@ depth_state = DepthState(
 # Configuration
 SOCKET_HOST = '0.0.0.0'
 SOCKET_PORT = 5051
+UDP_STREAM = False          # also send frames as datagrams on SOCKET_PORT/udp to clients that register (see wire_protocol.py)
 WEB_PORT = 5001
 CAMERA_INDEX = 0
-DEBUG_MODE = True
+FRAME_SOURCE = CAMERA_INDEX   # webcam index, video file, image directory or 'synthetic' (see frame_source.py)
+FRAME_SOURCE_FPS = None     # None = native rate, 0 = as fast as possible
+DEBUG_MODE = True           # OpenCV preview window (skipped without a display, see annotation.py)
 MODEL_PATH = 'models/hand_landmarker.task'
+RUNNING_MODE = 'VIDEO'      # 'IMAGE' | 'VIDEO' | 'LIVE_STREAM' (see landmarkers.py), IMAGE while USE_ROI is on
+DETECTOR_WORKERS = 1        # >1 runs that many hand landmarkers on consecutive frames, results in frame order (IMAGE / VIDEO)
+PIPELINE_REPORT_INTERVAL = 5.0  # seconds between per-stage occupancy reports, 0 disables
+STREAM_NAME = 'hand'        # label on /metrics
+RECORD_PATH = None          # e.g. 'session.lmrec': also record the landmark stream for replay.py (see recording.py)
+USE_ROI = True              # run on a crop around the previous frame's hands; the crop is the tracker, so IMAGE mode (see roi.py)
 
 # Global variables to share data between threads
-current_frame = None
-current_landmarks_result = None
-lock = threading.Lock()
+# Annotated frames for /video_feed and /snapshot, JPEG-encoded once per frame
+video_broadcaster = JpegBroadcaster(stream=STREAM_NAME)
+
+# Landmark results published by main(), one sequence number per camera frame
+landmark_channel = FrameChannel()
+
+# Keyframe + int16 delta state shared by all "delta" clients (socket thread only)
+delta_encoder = DeltaEncoder(MODALITY_HAND)
 
 # Initialize Flask
 app = Flask(__name__)
 
+# Landmark frames for browsers: ws://<host>:WEB_PORT/landmarks?encoding=binary&max_rate=15 (needs flask-sock)
+landmark_websocket = WebSocketStreamServer(stream=STREAM_NAME, modality=MODALITY_HAND)
+add_websocket_route(app, '/landmarks', lambda args: landmark_websocket)
+
 # MediaPipe Hand Connections (Standard)
 HAND_CONNECTIONS = [
     (0, 1), (1, 2), (2, 3), (3, 4),           # Thumb
@@ -48,145 +74,87 @@ HAND_CONNECTIONS = [
     (0, 17), (17, 18), (18, 19), (19, 20)     # Pinky
 ]
 
-def draw_landmarks_on_image(rgb_image, detection_result):
-    annotated_image = np.copy(rgb_image)
-    height, width, _ = annotated_image.shape
+HAND_CONNECTION_INDEX = np.array(HAND_CONNECTIONS, dtype=np.intp)
 
-    if detection_result.hand_landmarks:
+def draw_landmarks_on_image(bgr_image, detection_result):
+    # Draws in place on a BGR frame
+    height, width = bgr_image.shape[:2]
+
+    if detection_result and detection_result.hand_landmarks:
         for hand_landmarks in detection_result.hand_landmarks:
-            # Draw connections
-            for connection in HAND_CONNECTIONS:
-                start_idx = connection[0]
-                end_idx = connection[1]
-                
-                start_lm = hand_landmarks[start_idx]
-                end_lm = hand_landmarks[end_idx]
-                
-                start_point = (int(start_lm.x * width), int(start_lm.y * height))
-                end_point = (int(end_lm.x * width), int(end_lm.y * height))
-                
-                cv2.line(annotated_image, start_point, end_point, (0, 255, 0), 2)
-                
-            # Draw landmarks
-            for lm in hand_landmarks:
-                x = int(lm.x * width)
-                y = int(lm.y * height)
-                cv2.circle(annotated_image, (x, y), 3, (0, 0, 255), -1)
-
-    return annotated_image
+            points = landmark_pixels(hand_landmarks, width, height)
+            draw_connections(bgr_image, points, HAND_CONNECTION_INDEX, (0, 255, 0), 2)
+            draw_points(bgr_image, points, 3, (255, 0, 0))
+
+    return bgr_image
+
+def on_detection_result(result, capture_time):
+    # Wake the socket sender right away; annotation in main() is only for display
+    landmark_channel.publish((result, capture_time))
+
+def open_recorder():
+    if not RECORD_PATH:
+        return None
+    recorder = RecordingWriter(RECORD_PATH, MODALITY_HAND, {'stream': STREAM_NAME, 'frame_source': str(FRAME_SOURCE)})
+    # Frames are flushed about once a second; this covers the last one on exit
+    atexit.register(recorder.flush)
+    return recorder
 
 def socket_server_thread():
-    """Handles the socket connection to Unity."""
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-        server_socket.bind((SOCKET_HOST, SOCKET_PORT))
-        server_socket.listen(1)
-        print(f"[Socket] Listening on {SOCKET_HOST}:{SOCKET_PORT}")
-
-        while True:
-            client_socket, addr = server_socket.accept()
-            print(f"[Socket] Connected by {addr}")
-            try:
-                while True:
-                    global current_landmarks_result
-                    data_to_send = None
-                    
-                    #------------------------------------------
-                    #with lock:
-                        #if current_landmarks_result and current_landmarks_result.hand_landmarks:
-                            #hands_data = []
-                            
-                            #for idx, hand_landmarks in enumerate(current_landmarks_result.hand_landmarks):
-                                #landmarks_list = []
-                                #for lm in hand_landmarks:
-                                    #landmarks_list.append({
-                                        #'x': lm.x,
-                                        #'y': lm.y,
-                                        #'z': lm.z,
-                                        #'visibility': lm.visibility if hasattr(lm, 'visibility') else 1.0
-                                    #})
-                                
-                                #world_landmarks_list = []
-                                #if current_landmarks_result.hand_world_landmarks:
-                                    ## Check if index exists in world landmarks
-                                    #if idx < len(current_landmarks_result.hand_world_landmarks):
-                                        #for lm in current_landmarks_result.hand_world_landmarks[idx]:
-                                            #world_landmarks_list.append({
-                                                #'x': lm.x,
-                                                #'y': lm.y,
-                                                #'z': lm.z,
-                                                #'visibility': lm.visibility if hasattr(lm, 'visibility') else 1.0
-                                            #})
-
-                                #label = "Unknown"
-                                #if current_landmarks_result.handedness:
-                                    ## handedness is a list of lists of categories
-                                    #if idx < len(current_landmarks_result.handedness) and len(current_landmarks_result.handedness[idx]) > 0:
-                                        #label = current_landmarks_result.handedness[idx][0].category_name
-
-                                #hands_data.append({
-                                    #'handedness': label,
-                                    #'landmarks': landmarks_list,
-                                    #'world_landmarks': world_landmarks_list
-                                #})
-                                
-                            #data_to_send = json.dumps({
-                                #'hands': hands_data
-                            #})
-                    with lock:
-                        if current_landmarks_result and current_landmarks_result.hand_landmarks:
-                            hands_data = build_hand_payloads(current_landmarks_result, depth_state)
-                            data_to_send = json.dumps({
-                                'hands': hands_data
-                            })
-                    #------------------------------------------
-                    
-                    if data_to_send:
-                        client_socket.sendall((data_to_send + "\n").encode('utf-8'))
-                    
-                    time.sleep(0.033) 
-            except (ConnectionResetError, BrokenPipeError):
-                print(f"[Socket] Disconnected from {addr}")
-            finally:
-                client_socket.close()
-
-    except Exception as e:
-        print(f"[Socket] Server Error: {e}")
-    finally:
-        server_socket.close()
+    """Sends every new landmark frame exactly once to every connected Unity client."""
+    stream_server = make_stream_server(SOCKET_HOST, SOCKET_PORT, stream=STREAM_NAME, udp=UDP_STREAM,
+                                       websocket=landmark_websocket, modality=MODALITY_HAND)
+    stream_server.start()
+    recorder = open_recorder()
 
-def generate_frames():
-    """Generator function for the Flask video stream."""
+    last_seq = 0
     while True:
-        with lock:
-            if current_frame is None:
-                time.sleep(0.01)
-                continue
-            ret, buffer = cv2.imencode('.jpg', current_frame)
-            frame_bytes = buffer.tobytes()
+        # Wakes as soon as main() publishes a new result
+        seq, (detection_result, timestamp) = landmark_channel.wait(last_seq)
+        last_seq = seq
+        if stream_server.take_keyframe_request(ENCODING_DELTA):
+            delta_encoder.request_keyframe()
+
+        if not detection_result or not detection_result.hand_landmarks:
+            continue
+        if not stream_server.client_count and recorder is None:
+            continue
 
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        # Only the landmarks / world / depth some client (or the recording) uses
+        scope = frame_scope(stream_server.subscriptions, full=recorder is not None)
+        if scope is None:
+            continue
+        with metrics.timer('payload_build', STREAM_NAME):
+            hands = compute_hand_frames(detection_result, depth_state, timestamp, scope)
+        if recorder is not None:
+            recorder.append(encode_hands_binary(hands, seq, timestamp))
+        stream_server.publish(
+            lambda view: encode_hand_frames(view, hands, seq, timestamp, delta_encoder) if in_scope(view, scope) else None,
+            capture_time=timestamp)
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Optional ?scale=0.5&quality=60 for lighter debug viewers
+    variant = variant_from_args(request.args)
+    return Response(video_broadcaster.mjpeg_stream(variant), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/snapshot')
 def snapshot():
-    with lock:
-        if current_frame is None:
-            return "No frame", 503
-        ret, buffer = cv2.imencode('.jpg', current_frame)
-        return Response(buffer.tobytes(), mimetype='image/jpeg')
+    _, frame_bytes = video_broadcaster.snapshot_jpeg(variant_from_args(request.args))
+    if frame_bytes is None:
+        return "No frame", 503
+    return Response(frame_bytes, mimetype='image/jpeg')
+
+@app.route('/metrics')
+def metrics_route():
+    # Prometheus text format; per-step timings are only collected while this is being scraped
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
     return "<h1>MediaPipe Hand Server</h1><p><a href='/video_feed'>View Stream</a></p>"
 
 def main():
-    global current_frame, current_landmarks_result
-
     # Start Socket Server thread
     t_socket = threading.Thread(target=socket_server_thread, daemon=True)
     t_socket.start()
@@ -196,45 +164,93 @@ def main():
     t_flask.start()
     print(f"[Web] Server running on http://localhost:{WEB_PORT}")
 
+    show_window = DEBUG_MODE and display_available()
+    if DEBUG_MODE and not show_window:
+        print("[Display] No display available, running headless (annotating only while /video_feed is watched)")
+
     # Set up MediaPipe Hand Landmarker
-    base_options = python.BaseOptions(model_asset_path=MODEL_PATH)
-    options = vision.HandLandmarkerOptions(
-        base_options=base_options,
+    detector = RoiLandmarker(
+        'hand', MODEL_PATH, roi_running_mode(RUNNING_MODE, USE_ROI),
+        on_result=on_detection_result,
+        workers=DETECTOR_WORKERS,
         num_hands=2)
-    detector = vision.HandLandmarker.create_from_options(options)
 
     # Video Capture
-    cap = cv2.VideoCapture(CAMERA_INDEX)
+    cap = open_frame_source(FRAME_SOURCE, fps=FRAME_SOURCE_FPS, loop=True)
     
     if not cap.isOpened():
-        print("Error: Could not open camera.")
+        print(f"Error: Could not open frame source {FRAME_SOURCE!r}.")
         return
 
-    print("Starting Main Loop...")
-    while cap.isOpened():
-        success, image = cap.read()
+    # Pipeline stages, each on its own thread, connected by latest-wins slots:
+    #   capture -> infer -> annotate -> (JPEG encode on viewer threads / display below)
+    # Landmarks leave through on_detection_result, the socket thread encodes and sends them.
+    pipeline = Pipeline(report_interval=PIPELINE_REPORT_INTERVAL, stream=STREAM_NAME)
+    infer_slot = LatestSlot()
+    annotate_slot = LatestSlot()
+    display_slot = LatestSlot()
+
+    def capture_frame():
+        with metrics.timer('camera_read', STREAM_NAME):
+            success, image = cap.read()
         if not success:
-            print("Ignoring empty camera frame.")
-            continue
-
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
+            if not cap.isOpened():
+                pipeline.stop()
+            else:
+                print("Ignoring empty camera frame.")
+            return None
+        capture_time = time.time()
+
+        # MediaPipe works with RGB
+        with metrics.timer('cvt_color', STREAM_NAME):
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return image, capture_time
+
+    def infer_frame(item):
+        image, capture_time = item
+        roi = detector.tracked_roi(image.shape[1], image.shape[0]) if USE_ROI else None
+
+        # on_detection_result publishes the result (already mapped back to full-frame coordinates)
+        with metrics.timer('detect', STREAM_NAME):
+            detection_result = detector.submit(image, roi, capture_time)
+        if not (show_window or video_broadcaster.has_viewers):
+            # Nobody watching: the frame costs capture and inference only
+            return None
+        if detection_result is None:
+            # LIVE_STREAM / worker pool: the result arrives asynchronously, draw the latest one available
+            _, latest = landmark_channel.latest()
+            detection_result = latest[0] if latest else None
+        return image, detection_result
+
+    def annotate_frame(item):
+        image, detection_result = item
+        # BGR for OpenCV display and streaming; the converted copy is drawn on in place
+        annotated_image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        with metrics.timer('draw', STREAM_NAME):
+            draw_landmarks_on_image(annotated_image_bgr, detection_result)
+        video_broadcaster.publish(annotated_image_bgr)
+        return annotated_image_bgr
+
+    pipeline.add_stage('capture', capture_frame, outbox=infer_slot)
+    pipeline.add_stage('infer', infer_frame, inbox=infer_slot, outbox=annotate_slot)
+    pipeline.add_stage('annotate', annotate_frame, inbox=annotate_slot,
+                       outbox=display_slot if show_window else None)
 
-        detection_result = detector.detect(mp_image)
-
-        # Draw using simplified CV2 logic
-        annotated_image = draw_landmarks_on_image(image, detection_result)
-        
-        annotated_image_bgr = cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR)
-
-        with lock:
-            current_landmarks_result = detection_result
-            current_frame = annotated_image_bgr
-
-        if DEBUG_MODE:
-            cv2.imshow('MediaPipe Hand - Server', annotated_image_bgr)
-            if cv2.waitKey(5) & 0xFF == 27:
+    print("Starting Main Loop...")
+    pipeline.start()
+    try:
+        # OpenCV windows must be driven from the main thread
+        while pipeline.running:
+            if not show_window:
+                pipeline.wait(0.5)
+                continue
+            annotated_image_bgr = display_slot.get(timeout=0.1)
+            if annotated_image_bgr is not None:
+                cv2.imshow('MediaPipe Hand - Server', annotated_image_bgr)
+            if cv2.waitKey(1) & 0xFF == 27:
                 break
+    finally:
+        pipeline.stop()
 
     cap.release()
     cv2.destroyAllWindows()
@@ -0,0 +1,341 @@
+import cv2
+import importlib.util
+import os
+import mediapipe as mp
+import threading
+import time
+from flask import Flask, Response, request
+
+#---------------------------
+# Pose / hand / face tracking from one or more cameras in ONE process.
+#
+# Each camera is opened once and every frame is converted to RGB once. The
+# enabled landmarkers run side by side on that same frame, and each modality
+# is served on its usual socket port (5050 / 5051 / 5052) with exactly the
+# payloads of server_pose.py / server_hand.py / server_face.py: their socket
+# threads, depth settings and encoders are reused as-is.
+#
+# When both pose and face are enabled, the face landmarker also provides the
+# pose server's absolute depth, so no second FaceLandmarker is loaded. Hand
+# and face run on crops placed by the previous pose result.
+#
+# With several FRAME_SOURCES, every landmarker is still loaded once and runs on
+# one thread that takes the cameras' latest frames in turn. Camera i streams
+# on the usual ports + i * SOURCE_PORT_STRIDE (5050, 5060, 5070, ... for pose),
+# with its own depth smoothing, delta state and debug view (/video_feed?source=i).
+#---------------------------
+import server_face
+import server_hand
+import server_pose
+from annotation import display_available
+from frame_source import open_frame_source
+from metrics import metrics
+from pipeline import LatestSlot, Pipeline, RoundRobinSlots
+from roi import RoiLandmarker, face_roi_from_pose, hand_roi_from_pose, roi_running_mode
+from video_stream import JpegBroadcaster, variant_from_args
+from websocket_stream import add_websocket_route
+
+# Configuration
+MODALITIES = ['pose', 'hand', 'face']   # any combination
+POSE_USE_FACE_DEPTH = True      # run the face landmarker for pose depth even when 'face' is not streamed
+WEB_PORT = 5000
+CAMERA_INDEX = 0
+FRAME_SOURCE = CAMERA_INDEX   # webcam index, video file, image directory or 'synthetic' (see frame_source.py)
+FRAME_SOURCES = [FRAME_SOURCE]  # one entry per camera, e.g. [0, 1] or [0, 'clip.mp4']
+SOURCE_PORT_STRIDE = 10     # camera i uses socket ports + i * SOURCE_PORT_STRIDE
+FRAME_SOURCE_FPS = None     # None = native rate, 0 = as fast as possible
+DEBUG_MODE = True           # OpenCV preview window(s) (skipped without a display, see annotation.py)
+RUNNING_MODE = 'VIDEO'      # 'IMAGE' | 'VIDEO' | 'LIVE_STREAM' (see landmarkers.py); IMAGE with several cameras and for hand/face crops
+PIPELINE_REPORT_INTERVAL = 5.0  # seconds between per-stage occupancy reports, 0 disables
+STREAM_NAME = 'multi'       # label on /metrics (landmark sockets keep 'pose' / 'hand' / 'face')
+USE_ROI = True              # run hand/face on crops around the previous pose (or their own) result, in IMAGE mode (see roi.py)
+RECORD_DIR = None           # e.g. 'session/': record <modality>.lmrec per stream for replay.py (see recording.py)
+UDP_STREAM = False          # also send every stream as datagrams on its port/udp (see wire_protocol.py)
+
+SERVER_MODULES = {'pose': server_pose, 'hand': server_hand, 'face': server_face}
+
+# Per camera: the server modules that hold its landmark channels, depth state and sockets
+source_modules = []
+
+# Annotated frames (all modalities) for /video_feed and /snapshot, one per camera
+video_broadcasters = []
+
+# Flask
+app = Flask(__name__)
+
+def broadcaster_from_args(args):
+    try:
+        return video_broadcasters[int(args.get('source', 0))]
+    except (ValueError, IndexError):
+        return None
+
+@app.route('/video_feed')
+def video_feed():
+    # Optional ?source=1&scale=0.5&quality=60 for other cameras / lighter debug viewers
+    broadcaster = broadcaster_from_args(request.args)
+    if broadcaster is None:
+        return "Unknown source", 404
+    variant = variant_from_args(request.args)
+    return Response(broadcaster.mjpeg_stream(variant), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/snapshot')
+def snapshot():
+    broadcaster = broadcaster_from_args(request.args)
+    if broadcaster is None:
+        return "Unknown source", 404
+    _, frame_bytes = broadcaster.snapshot_jpeg(variant_from_args(request.args))
+    if frame_bytes is None:
+        return "No frame", 503
+    return Response(frame_bytes, mimetype='image/jpeg')
+
+def landmark_websocket_from_args(args):
+    try:
+        modules = source_modules[int(args.get('source', 0))]
+    except (ValueError, IndexError):
+        return None
+    modality = args.get('modality', MODALITIES[0])
+    return modules[modality].landmark_websocket if modality in MODALITIES else None
+
+# Landmark frames for browsers: ws://<host>:WEB_PORT/landmarks?modality=hand&source=0&encoding=binary&max_rate=15
+add_websocket_route(app, '/landmarks', landmark_websocket_from_args)
+
+@app.route('/metrics')
+def metrics_route():
+    # Prometheus text format; per-step timings are only collected while this is being scraped
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/')
+def index():
+    links = ''.join(f"<p><a href='/video_feed?source={i}'>View Stream {i} ({source!r})</a></p>"
+                    for i, source in enumerate(FRAME_SOURCES))
+    return f"<h1>MediaPipe Multi Server ({', '.join(MODALITIES)})</h1>{links}"
+
+def load_source_modules(index):
+    """
+    Server modules for camera `index`. Camera 0 uses the imported modules; the
+    others get fresh copies of them (separate landmark channels, depth state,
+    delta encoders and socket ports). Only module state is copied: no model
+    is loaded at import time, the landmarkers below are shared.
+    """
+    if index == 0:
+        return dict(SERVER_MODULES)
+    modules = {}
+    for name, module in SERVER_MODULES.items():
+        spec = importlib.util.spec_from_file_location(f'{module.__name__}_{index}', module.__file__)
+        copy = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(copy)
+        copy.SOCKET_PORT = module.SOCKET_PORT + index * SOURCE_PORT_STRIDE
+        copy.STREAM_NAME = f'{module.STREAM_NAME}{index}'
+        copy.landmark_websocket.stream = copy.STREAM_NAME
+        modules[name] = copy
+    return modules
+
+def make_face_callback(modules):
+    def on_face_result(result, capture_time):
+        # Face feeds both its own stream and the pose server's absolute depth
+        # (here it runs on every camera frame, so there is no face frame seq to record)
+        modules['pose'].on_face_result(result, None)
+        if 'face' in MODALITIES:
+            modules['face'].on_detection_result(result, capture_time)
+    return on_face_result
+
+def create_detectors(running_mode):
+    """One landmarker per modality, loaded once, with one tracking state per camera."""
+    detectors = {}
+    for i, modules in enumerate(source_modules):
+        callbacks = {}
+        if 'pose' in MODALITIES:
+            callbacks['pose'] = modules['pose'].on_pose_result
+        if 'hand' in MODALITIES:
+            callbacks['hand'] = modules['hand'].on_detection_result
+        if 'face' in MODALITIES or ('pose' in MODALITIES and POSE_USE_FACE_DEPTH):
+            callbacks['face'] = make_face_callback(modules)
+
+        for name, on_result in callbacks.items():
+            if i > 0:
+                detectors[name].append(detectors[name][0].share(on_result))
+            elif name == 'pose':
+                detectors[name] = [RoiLandmarker(
+                    'pose', server_pose.MODEL_PATH, running_mode,
+                    on_result=on_result,
+                    output_segmentation_masks=False)]
+            elif name == 'hand':
+                detectors[name] = [RoiLandmarker(
+                    'hand', server_hand.MODEL_PATH, roi_running_mode(running_mode, USE_ROI),
+                    on_result=on_result,
+                    num_hands=2)]
+            else:
+                detectors[name] = [RoiLandmarker(
+                    'face', server_face.MODEL_PATH, roi_running_mode(running_mode, USE_ROI),
+                    on_result=on_result,
+                    output_face_blendshapes='face' in MODALITIES,
+                    output_facial_transformation_matrixes=True,
+                    num_faces=1)]
+    return detectors
+
+def latest_result(modules, name):
+    _, latest = modules[name].landmark_channel.latest()
+    return latest[0] if latest else None
+
+def draw_all_landmarks(bgr_image, modules):
+    # Draws in place on a BGR frame
+    for name in ('pose', 'hand', 'face'):
+        if name in MODALITIES:
+            modules[name].draw_landmarks_on_image(bgr_image, latest_result(modules, name))
+    return bgr_image
+
+def main():
+    unknown = [name for name in MODALITIES if name not in SERVER_MODULES]
+    if not MODALITIES or unknown:
+        print(f"Error: MODALITIES must be a combination of 'pose', 'hand', 'face' (got {MODALITIES}).")
+        return
+    if not FRAME_SOURCES:
+        print("Error: FRAME_SOURCES is empty.")
+        return
+
+    running_mode = RUNNING_MODE
+    if len(FRAME_SOURCES) > 1 and RUNNING_MODE != 'IMAGE':
+        # MediaPipe's own tracking would mix cameras in a shared landmarker;
+        # each camera is tracked with its own crop instead (see roi.py)
+        print(f"[Multi] {len(FRAME_SOURCES)} cameras share each landmarker: using IMAGE mode instead of {RUNNING_MODE}")
+        running_mode = 'IMAGE'
+
+    for i in range(len(FRAME_SOURCES)):
+        source_modules.append(load_source_modules(i))
+        video_broadcasters.append(JpegBroadcaster(stream=STREAM_NAME if i == 0 else f'{STREAM_NAME}{i}'))
+
+    # Start one socket server thread per modality and camera, on that modality's usual port (+ stride)
+    if RECORD_DIR:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+    for i, modules in enumerate(source_modules):
+        for name in MODALITIES:
+            module = modules[name]
+            if RECORD_DIR:
+                module.RECORD_PATH = os.path.join(RECORD_DIR, f'{name}.lmrec' if i == 0 else f'{name}{i}.lmrec')
+            module.UDP_STREAM = UDP_STREAM
+            threading.Thread(target=module.socket_server_thread, daemon=True).start()
+
+    # Start Flask thread
+    t_flask = threading.Thread(target=lambda: app.run(host='0.0.0.0', port=WEB_PORT, debug=False, use_reloader=False), daemon=True)
+    t_flask.start()
+    print(f"[Web] Server running on http://localhost:{WEB_PORT}")
+
+    detectors = create_detectors(running_mode)
+
+    # Video Capture (once per camera)
+    caps = []
+    for source in FRAME_SOURCES:
+        cap = open_frame_source(source, fps=FRAME_SOURCE_FPS, loop=True)
+        if not cap.isOpened():
+            print(f"Error: Could not open frame source {source!r}.")
+            return
+        caps.append(cap)
+    multi_camera = len(caps) > 1
+
+    show_window = DEBUG_MODE and display_available()
+    if DEBUG_MODE and not show_window:
+        print("[Display] No display available, running headless (annotating only while /video_feed is watched)")
+
+    # Pipeline stages, each on its own thread, connected by latest-wins slots:
+    #   capture-<camera> -> infer-<modality> (one per landmarker, in parallel) -> annotate
+    # With several cameras, infer and annotate take the cameras' latest frames in turn.
+    pipeline = Pipeline(report_interval=PIPELINE_REPORT_INTERVAL, stream=STREAM_NAME)
+    infer_slots = {name: RoundRobinSlots(len(caps)) for name in detectors}
+    annotate_slots = RoundRobinSlots(len(caps))
+    display_slot = LatestSlot()
+    closed = set()
+
+    def make_capture(index, cap):
+        def capture_frame():
+            with metrics.timer('camera_read', STREAM_NAME):
+                success, image = cap.read()
+            if not success:
+                if not cap.isOpened():
+                    # Keep serving the other cameras until the last one ends
+                    closed.add(index)
+                    if len(closed) == len(caps):
+                        pipeline.stop()
+                    else:
+                        time.sleep(0.1)
+                else:
+                    print(f"Ignoring empty camera frame ({FRAME_SOURCES[index]!r}).")
+                return None
+            capture_time = time.time()
+
+            # Converted once, shared read-only by every landmarker
+            with metrics.timer('cvt_color', STREAM_NAME):
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
+            for slot in infer_slots.values():
+                slot.put(index, (index, image, mp_image, capture_time))
+            return None
+        return capture_frame
+
+    def secondary_roi(name, detector, modules, image):
+        height, width = image.shape[:2]
+        if 'pose' not in MODALITIES:
+            return detector.tracked_roi(width, height)
+        pose_result = latest_result(modules, 'pose')
+        if not pose_result or not pose_result.pose_landmarks:
+            return None
+        roi_from_pose = face_roi_from_pose if name == 'face' else hand_roi_from_pose
+        return roi_from_pose(pose_result.pose_landmarks[0], width, height)
+
+    def make_infer(name):
+        def infer_frame(item):
+            index, image, mp_image, capture_time = item
+            detector = detectors[name][index]
+            # on_result callbacks publish into each modality's landmark channel
+            roi = None
+            if name != 'pose':
+                roi = secondary_roi(name, detector, source_modules[index], image) if USE_ROI else None
+            elif multi_camera:
+                # IMAGE mode: crop around this camera's previous pose in place of MediaPipe tracking
+                roi = detector.tracked_roi(image.shape[1], image.shape[0])
+            with metrics.timer('detect', name):
+                detector.submit(image, roi, capture_time, mp_image=mp_image)
+            if show_window or video_broadcasters[index].has_viewers:
+                annotate_slots.put(index, (index, image))
+            return None
+        return infer_frame
+
+    def annotate_frame(item):
+        index, image = item
+        # BGR for OpenCV display and streaming; the converted copy is drawn on in place
+        annotated_image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        with metrics.timer('draw', STREAM_NAME):
+            draw_all_landmarks(annotated_image_bgr, source_modules[index])
+        video_broadcasters[index].publish(annotated_image_bgr)
+        return index, annotated_image_bgr
+
+    for i, cap in enumerate(caps):
+        pipeline.add_stage(f'capture-{i}' if multi_camera else 'capture', make_capture(i, cap))
+    for name in detectors:
+        pipeline.add_stage(f'infer-{name}', make_infer(name), inbox=infer_slots[name])
+    pipeline.add_stage('annotate', annotate_frame, inbox=annotate_slots,
+                       outbox=display_slot if show_window else None)
+
+    print(f"Starting Main Loop ({', '.join(MODALITIES)}, {len(caps)} camera(s))...")
+    pipeline.start()
+    try:
+        # OpenCV windows must be driven from the main thread
+        while pipeline.running:
+            if not show_window:
+                pipeline.wait(0.5)
+                continue
+            item = display_slot.get(timeout=0.1)
+            if item is not None:
+                index, annotated_image_bgr = item
+                title = 'MediaPipe Multi - Server' + (f' [{index}]' if multi_camera else '')
+                cv2.imshow(title, annotated_image_bgr)
+            if cv2.waitKey(1) & 0xFF == 27:
+                break
+    finally:
+        pipeline.stop()
+
+    for cap in caps:
+        cap.release()
+    cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,31 @@
+import atexit
 import cv2
 import mediapipe as mp
-import socket
 import threading
-import json
 import time
-import numpy as np
-from flask import Flask, Response
-
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
+from flask import Flask, Response, request
 
 #---------------------------
-from depth_module import DepthConfig, DepthState, build_pose_payload
+from annotation import display_available, draw_points, landmark_pixels
+from depth_module import DepthConfig, DepthState, compute_pose_frame
+from landmark_encoders import encode_pose_frame
+from landmarkers import LandmarkerPool, LandmarkerRunner
+from frame_source import open_frame_source
+from governor import QualityGovernor, QualityTier, available_tiers
+from metrics import metrics
+from pipeline import FrameChannel, LatestSlot, Pipeline
+from recording import RecordingWriter
+from roi import RoiLandmarker, face_roi_from_pose, roi_running_mode
+from stream_server import make_stream_server
+from subscription import frame_scope, in_scope
+from video_stream import JpegBroadcaster, variant_from_args
+from websocket_stream import WebSocketStreamServer, add_websocket_route
+from wire_protocol import ENCODING_DELTA, MODALITY_POSE, DeltaEncoder, encode_pose_binary
 
 depth_state = DepthState(
     DepthConfig(
         smoothing_alpha=0.35,
+        landmark_filter="none",     # "one_euro" (+ filter_prediction=True) to filter every landmark (see depth_module.py)
         pose_invert_world_z=False,
         face_global_scale=0.1,
         face_invert_tz=False,
@@ -28,145 +38,177 @@ depth_state = DepthState(
 # Configuration
 SOCKET_HOST = '0.0.0.0'
 SOCKET_PORT = 5050
+UDP_STREAM = False          # also send frames as datagrams on SOCKET_PORT/udp to clients that register (see wire_protocol.py)
 WEB_PORT = 5000
 CAMERA_INDEX = 0
-DEBUG_MODE = True
+FRAME_SOURCE = CAMERA_INDEX   # webcam index, video file, image directory or 'synthetic' (see frame_source.py)
+FRAME_SOURCE_FPS = None     # None = native rate, 0 = as fast as possible
+DEBUG_MODE = True           # OpenCV preview window (skipped without a display, see annotation.py)
 MODEL_PATH = 'models/pose_landmarker_heavy.task'
 FACE_MODEL_PATH = 'models/face_landmarker.task'
+RUNNING_MODE = 'VIDEO'      # 'IMAGE' | 'VIDEO' | 'LIVE_STREAM' (see landmarkers.py); the face crop uses IMAGE
+DETECTOR_WORKERS = 1        # >1 runs that many pose landmarkers on consecutive frames, results in frame order (IMAGE / VIDEO)
+PIPELINE_REPORT_INTERVAL = 5.0  # seconds between per-stage occupancy reports, 0 disables
+STREAM_NAME = 'pose'        # label on /metrics
+RECORD_PATH = None          # e.g. 'session.lmrec': also record the landmark stream for replay.py (see recording.py)
+FACE_TARGET_FPS = 10.0      # face only refines the slow-moving global_z, 0 = no limit
+USE_POSE_ROI = True         # run the face landmarker on a crop around the pose head, in IMAGE mode (see roi.py)
+QUALITY_GOVERNOR = False    # step model / input size / face rate down under load (see governor.py), replacing MODEL_PATH;
+                            # every tier model is loaded DETECTOR_WORKERS times up front, so memory grows with both
+FRAME_BUDGET = 1.0 / 30     # capture-to-pose-result seconds the governor aims for (heavy on CPU alone needs more)
+QUALITY_TIERS = [           # best first; tiers whose model is missing are skipped
+    QualityTier('heavy', MODEL_PATH, input_scale=1.0, secondary_fps=FACE_TARGET_FPS),
+    QualityTier('full', 'models/pose_landmarker_full.task', input_scale=1.0, secondary_fps=FACE_TARGET_FPS),
+    QualityTier('full_reduced', 'models/pose_landmarker_full.task', input_scale=0.75, secondary_fps=5.0),
+    QualityTier('lite', 'models/pose_landmarker_lite.task', input_scale=0.5, secondary_fps=2.0),
+]
 
 # Global variables to share data between threads
-current_frame = None
-current_landmarks_result = None
-current_face_result = None
-lock = threading.Lock()
+# Annotated frames for /video_feed and /snapshot, JPEG-encoded once per frame
+video_broadcaster = JpegBroadcaster(stream=STREAM_NAME)
+
+# Landmark results published by main(), one sequence number per camera frame
+landmark_channel = FrameChannel()
+
+# Keyframe + int16 delta state shared by all "delta" clients (socket thread only)
+delta_encoder = DeltaEncoder(MODALITY_POSE)
 
 # Face detection thread shared state
-latest_rgb_frame = None
+face_frames = FrameChannel()    # (image, mp_image, roi) offered to the face worker, seq = camera frame number
 latest_face_result = None
-face_lock = threading.Lock()
+latest_face_frame_seq = 0       # face_frames seq that latest_face_result was computed from
+
+# Current quality tier, set up in main() when QUALITY_GOVERNOR is on
+governor = None
 
 # Initialize Flask
 app = Flask(__name__)
 
+# Landmark frames for browsers: ws://<host>:WEB_PORT/landmarks?encoding=binary&max_rate=15 (needs flask-sock)
+landmark_websocket = WebSocketStreamServer(stream=STREAM_NAME, modality=MODALITY_POSE)
+add_websocket_route(app, '/landmarks', lambda args: landmark_websocket)
+
+def on_face_result(result, frame_seq):
+    global latest_face_result, latest_face_frame_seq
+    if result and getattr(result, 'face_landmarks', None):
+        latest_face_result = result
+        latest_face_frame_seq = frame_seq
+
+def on_pose_result(result, capture_time):
+    # Wake the socket sender right away; annotation in main() is only for display
+    landmark_channel.publish((result, latest_face_result, capture_time))
+    if governor is not None and capture_time is not None:
+        # Capture to result covers both the blocking and the LIVE_STREAM modes
+        governor.record(time.time() - capture_time)
+
 def face_detect_thread(face_detector):
-    """Runs face detection in a separate thread using the latest RGB frame."""
-    global latest_face_result
+    """
+    Runs face detection in a separate thread, at most FACE_TARGET_FPS times per
+    second (or the current quality tier's secondary_fps) and only on frames it
+    has not processed yet.
+    """
+    last_seq = 0
+    next_run = 0.0
     while True:
-        frame = None
-        with face_lock:
-            if latest_rgb_frame is not None:
-                frame = latest_rgb_frame
-
-        if frame is not None:
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
-            result = face_detector.detect(mp_image)
-            if result and getattr(result, 'face_landmarks', None):
-                latest_face_result = result
-        else:
-            time.sleep(0.01)
-
-def draw_landmarks_on_image(rgb_image, detection_result):
-    annotated_image = np.copy(rgb_image)
-    height, width, _ = annotated_image.shape
-
-    if detection_result.pose_landmarks:
+        delay = next_run - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        # Blocks until a newer frame arrives; frames published while busy are skipped
+        seq, (image, mp_image, roi) = face_frames.wait(last_seq)
+        last_seq = seq
+        target_fps = governor.tier.secondary_fps if governor is not None else FACE_TARGET_FPS
+        next_run = time.monotonic() + (1.0 / target_fps if target_fps > 0 else 0.0)
+        with metrics.timer('detect_face', STREAM_NAME):
+            face_detector.submit(image, roi, seq, mp_image=mp_image)    # on_face_result records the frame seq
+
+def draw_landmarks_on_image(bgr_image, detection_result):
+    # Draws in place on a BGR frame
+    height, width = bgr_image.shape[:2]
+
+    if detection_result and detection_result.pose_landmarks:
         for pose_landmarks in detection_result.pose_landmarks:
-            for lm in pose_landmarks:
-                x = int(lm.x * width)
-                y = int(lm.y * height)
-                cv2.circle(annotated_image, (x, y), 3, (0, 255, 0), -1)
+            draw_points(bgr_image, landmark_pixels(pose_landmarks, width, height), 3, (0, 255, 0))
 
-    return annotated_image
+    return bgr_image
+
+def open_recorder():
+    if not RECORD_PATH:
+        return None
+    recorder = RecordingWriter(RECORD_PATH, MODALITY_POSE, {'stream': STREAM_NAME, 'frame_source': str(FRAME_SOURCE)})
+    # Frames are flushed about once a second; this covers the last one on exit
+    atexit.register(recorder.flush)
+    return recorder
 
 def socket_server_thread():
-    """Handles the socket connection to Unity."""
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    try:
-        server_socket.bind((SOCKET_HOST, SOCKET_PORT))
-        server_socket.listen(1)
-        print(f"[Socket] Listening on {SOCKET_HOST}:{SOCKET_PORT}")
-
-        while True:
-            client_socket, addr = server_socket.accept()
-            print(f"[Socket] Connected by {addr}")
-            try:
-                while True:
-                    global current_landmarks_result, current_face_result
-                    data_to_send = None
-
-                    with lock:
-                        if current_landmarks_result and current_landmarks_result.pose_landmarks:
-                            pose_payload = build_pose_payload(
-                                current_landmarks_result, depth_state,
-                                pose_index=0,
-                                face_result=current_face_result,
-                            )
-                            if pose_payload is not None:
-                                ## DEBUG: print depth info
-                                #d = pose_payload.get('depth', {})
-                                #plz = d.get('per_landmark_z', [])
-                                #raw_tz = "N/A"
-                                #if current_face_result is not None:
-                                #    mats = getattr(current_face_result, 'facial_transformation_matrixes', None)
-                                #    if mats and len(mats) > 0:
-                                #        M = np.array(mats[0]).reshape(4,4)
-                                #        raw_tz = f"{float(M[2,3]):.2f}"
-                                #if plz:
-                                #    print(f"[Depth] mode={d.get('mode')} raw_tz={raw_tz} global_z={d.get('global_z'):.4f} "
-                                #          f"per_z min={min(plz):.4f} max={max(plz):.4f} spread={max(plz)-min(plz):.4f}")
-                                data_to_send = json.dumps(pose_payload)
-                    
-                    if data_to_send:
-                        # Send data followed by a newline as a delimiter
-                        client_socket.sendall((data_to_send + "\n").encode('utf-8'))
-                    
-                    # Sleep briefly to match typical frame rate
-                    time.sleep(0.033) 
-            except (ConnectionResetError, BrokenPipeError):
-                print(f"[Socket] Disconnected from {addr}")
-            finally:
-                client_socket.close()
-
-    except Exception as e:
-        print(f"[Socket] Server Error: {e}")
-    finally:
-        server_socket.close()
+    """Sends every new landmark frame exactly once to every connected Unity client."""
+    stream_server = make_stream_server(SOCKET_HOST, SOCKET_PORT, stream=STREAM_NAME, udp=UDP_STREAM,
+                                       websocket=landmark_websocket, modality=MODALITY_POSE)
+    stream_server.start()
+    recorder = open_recorder()
 
-def generate_frames():
-    """Generator function for the Flask video stream."""
+    last_seq = 0
     while True:
-        with lock:
-            if current_frame is None:
-                time.sleep(0.01)
-                continue
-            
-            # Encode the frame in JPEG format
-            ret, buffer = cv2.imencode('.jpg', current_frame)
-            frame_bytes = buffer.tobytes()
+        # Wakes as soon as main() publishes a new result
+        seq, (pose_result, face_result, timestamp) = landmark_channel.wait(last_seq)
+        last_seq = seq
+        if stream_server.take_keyframe_request(ENCODING_DELTA):
+            delta_encoder.request_keyframe()
+
+        if not pose_result or not pose_result.pose_landmarks:
+            continue
+        if not stream_server.client_count and recorder is None:
+            continue
 
-        # Yield the output frame in the byte format
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        # Only the landmarks / world / depth some client (or the recording) uses
+        scope = frame_scope(stream_server.subscriptions, full=recorder is not None)
+        if scope is None:
+            continue
+        with metrics.timer('payload_build', STREAM_NAME):
+            pose_frame = compute_pose_frame(
+                pose_result, depth_state,
+                pose_index=0,
+                face_result=face_result,
+                timestamp=timestamp,
+                scope=scope,
+            )
+        if pose_frame is not None:
+            ## DEBUG: print depth info
+            #plz = pose_frame.depth.per_landmark_z
+            #if plz.size:
+            #    print(f"[Depth] mode={pose_frame.depth.mode} global_z={pose_frame.depth.global_z:.4f} "
+            #          f"per_z min={plz.min():.4f} max={plz.max():.4f} spread={np.ptp(plz):.4f}")
+            if recorder is not None:
+                recorder.append(encode_pose_binary(pose_frame, seq, timestamp))
+            quality = governor.tier.name if governor is not None else None
+            stream_server.publish(
+                lambda view: encode_pose_frame(view, pose_frame, seq, timestamp, delta_encoder, quality)
+                if in_scope(view, scope) else None,
+                capture_time=timestamp)
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Optional ?scale=0.5&quality=60 for lighter debug viewers
+    variant = variant_from_args(request.args)
+    return Response(video_broadcaster.mjpeg_stream(variant), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/snapshot')
 def snapshot():
-    with lock:
-        if current_frame is None:
-            return "No frame", 503
-        ret, buffer = cv2.imencode('.jpg', current_frame)
-        return Response(buffer.tobytes(), mimetype='image/jpeg')
+    _, frame_bytes = video_broadcaster.snapshot_jpeg(variant_from_args(request.args))
+    if frame_bytes is None:
+        return "No frame", 503
+    return Response(frame_bytes, mimetype='image/jpeg')
+
+@app.route('/metrics')
+def metrics_route():
+    # Prometheus text format; per-step timings are only collected while this is being scraped
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
     return "<h1>MediaPipe Pose Server</h1><p><a href='/video_feed'>View Stream</a></p>"
 
 def main():
-    global current_frame, current_landmarks_result, current_face_result
-
     # Start Socket Server thread
     t_socket = threading.Thread(target=socket_server_thread, daemon=True)
     t_socket.start()
@@ -176,67 +218,146 @@ def main():
     t_flask.start()
     print(f"[Web] Server running on http://localhost:{WEB_PORT}")
 
-    # Set up MediaPipe Pose Landmarker
-    base_options = python.BaseOptions(model_asset_path=MODEL_PATH)
-    options = vision.PoseLandmarkerOptions(
-        base_options=base_options,
-        output_segmentation_masks=False)
-    pose_detector = vision.PoseLandmarker.create_from_options(options)
+    global governor
+
+    show_window = DEBUG_MODE and display_available()
+    if DEBUG_MODE and not show_window:
+        print("[Display] No display available, running headless (annotating only while /video_feed is watched)")
+
+    # Set up MediaPipe Pose Landmarker(s), one per quality tier model, all loaded up front
+    # so that switching tiers does not stall a frame on model loading
+    tiers = available_tiers(QUALITY_TIERS) if QUALITY_GOVERNOR else []
+    if tiers:
+        governor = QualityGovernor(tiers, FRAME_BUDGET, stream=STREAM_NAME)
+    model_paths = {tier.model_path for tier in tiers} or {MODEL_PATH}
+    if len(model_paths) > 1 and DETECTOR_WORKERS > 1:
+        print(f"[Pose] Loading {len(model_paths)} tier models x {DETECTOR_WORKERS} workers = "
+              f"{len(model_paths) * DETECTOR_WORKERS} pose landmarkers")
+    if DETECTOR_WORKERS > 1:
+        pose_detectors = {
+            path: LandmarkerPool('pose', path, RUNNING_MODE, on_result=on_pose_result, workers=DETECTOR_WORKERS,
+                                 output_segmentation_masks=False)
+            for path in model_paths
+        }
+    else:
+        pose_detectors = {
+            path: LandmarkerRunner('pose', path, RUNNING_MODE, on_result=on_pose_result, output_segmentation_masks=False)
+            for path in model_paths
+        }
 
     # Set up MediaPipe Face Landmarker (for absolute depth via transformation matrix)
-    face_base_options = python.BaseOptions(model_asset_path=FACE_MODEL_PATH)
-    face_options = vision.FaceLandmarkerOptions(
-        base_options=face_base_options,
+    face_detector = RoiLandmarker(
+        'face', FACE_MODEL_PATH, roi_running_mode(RUNNING_MODE, USE_POSE_ROI),
+        on_result=on_face_result,
         output_face_blendshapes=False,
         output_facial_transformation_matrixes=True,
         num_faces=1)
-    face_detector = vision.FaceLandmarker.create_from_options(face_options)
 
     # Video Capture
-    cap = cv2.VideoCapture(CAMERA_INDEX)
+    cap = open_frame_source(FRAME_SOURCE, fps=FRAME_SOURCE_FPS, loop=True)
 
     if not cap.isOpened():
-        print("Error: Could not open camera.")
+        print(f"Error: Could not open frame source {FRAME_SOURCE!r}.")
         return
 
-    # Start face detection thread
+    # Start face detection thread (rate-limited, fed through face_frames)
     t_face = threading.Thread(target=face_detect_thread, args=(face_detector,), daemon=True)
     t_face.start()
 
-    print("Starting Main Loop...")
-    while cap.isOpened():
-        success, image = cap.read()
+    # Pipeline stages, each on its own thread, connected by latest-wins slots:
+    #   capture -> infer -> annotate -> (JPEG encode on viewer threads / display below)
+    # Landmarks leave through on_pose_result, the socket thread encodes and sends them.
+    pipeline = Pipeline(report_interval=PIPELINE_REPORT_INTERVAL, stream=STREAM_NAME)
+    infer_slot = LatestSlot()
+    annotate_slot = LatestSlot()
+    display_slot = LatestSlot()
+
+    def capture_frame():
+        with metrics.timer('camera_read', STREAM_NAME):
+            success, image = cap.read()
         if not success:
-            print("Ignoring empty camera frame.")
-            continue
+            if not cap.isOpened():
+                pipeline.stop()
+            else:
+                print("Ignoring empty camera frame.")
+            return None
+        capture_time = time.time()
 
         # MediaPipe works with RGB
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
-
-        # Share frame for face detection thread
-        with face_lock:
-            global latest_rgb_frame
-            latest_rgb_frame = image.copy()
+        with metrics.timer('cvt_color', STREAM_NAME):
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return image, capture_time
 
-        # Detect pose landmarks
-        pose_result = pose_detector.detect(mp_image)
+    active_detector = [None]    # pose landmarker the previous frame went to
 
-        # Create annotated image
-        annotated_image = draw_landmarks_on_image(image, pose_result)
-
-        # Convert back to BGR for OpenCV display and Streaming
-        annotated_image_bgr = cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR)
-
-        with lock:
-            current_landmarks_result = pose_result
-            current_face_result = latest_face_result
-            current_frame = annotated_image_bgr
+    def infer_frame(item):
+        image, capture_time = item
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=image)
+        tier = governor.tier if governor is not None else None
+
+        # Offer the frame to the face detection thread (it only keeps a reference),
+        # with a head crop from the previous pose result
+        roi = None
+        if USE_POSE_ROI:
+            _, latest = landmark_channel.latest()
+            if latest and latest[0] and latest[0].pose_landmarks:
+                roi = face_roi_from_pose(latest[0].pose_landmarks[0], image.shape[1], image.shape[0])
+        face_frames.publish((image, mp_image, roi))
+
+        # Pose landmarks are normalized, so a downscaled input needs no remapping
+        pose_image = mp_image
+        if tier is not None and tier.input_scale < 1.0:
+            small = cv2.resize(image, None, fx=tier.input_scale, fy=tier.input_scale, interpolation=cv2.INTER_AREA)
+            pose_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=small)
+        pose_detector = pose_detectors[tier.model_path if tier is not None else MODEL_PATH]
+        if pose_detector is not active_detector[0]:
+            # Tier switch: the previous model's frames still in flight go out first, so
+            # results stay in frame order (each pool only orders its own frames)
+            if active_detector[0] is not None:
+                active_detector[0].drain()
+            active_detector[0] = pose_detector
+
+        # on_pose_result publishes the result
+        with metrics.timer('detect', STREAM_NAME):
+            pose_result = pose_detector.submit(pose_image, capture_time)
+        if not (show_window or video_broadcaster.has_viewers):
+            # Nobody watching: the frame costs capture and inference only
+            return None
+        if pose_result is None:
+            # LIVE_STREAM / worker pool: the result arrives asynchronously, draw the latest one available
+            _, latest = landmark_channel.latest()
+            pose_result = latest[0] if latest else None
+        return image, pose_result
+
+    def annotate_frame(item):
+        image, pose_result = item
+        # BGR for OpenCV display and streaming; the converted copy is drawn on in place
+        annotated_image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        with metrics.timer('draw', STREAM_NAME):
+            draw_landmarks_on_image(annotated_image_bgr, pose_result)
+        video_broadcaster.publish(annotated_image_bgr)
+        return annotated_image_bgr
+
+    pipeline.add_stage('capture', capture_frame, outbox=infer_slot)
+    pipeline.add_stage('infer', infer_frame, inbox=infer_slot, outbox=annotate_slot)
+    pipeline.add_stage('annotate', annotate_frame, inbox=annotate_slot,
+                       outbox=display_slot if show_window else None)
 
-        if DEBUG_MODE:
-            cv2.imshow('MediaPipe Pose - Server', annotated_image_bgr)
-            if cv2.waitKey(5) & 0xFF == 27:
+    print("Starting Main Loop...")
+    pipeline.start()
+    try:
+        # OpenCV windows must be driven from the main thread
+        while pipeline.running:
+            if not show_window:
+                pipeline.wait(0.5)
+                continue
+            annotated_image_bgr = display_slot.get(timeout=0.1)
+            if annotated_image_bgr is not None:
+                cv2.imshow('MediaPipe Pose - Server', annotated_image_bgr)
+            if cv2.waitKey(1) & 0xFF == 27:
                 break
+    finally:
+        pipeline.stop()
 
     cap.release()
     cv2.destroyAllWindows()
@@ -0,0 +1,549 @@
+# stream_server.py
+from __future__ import annotations
+
+import collections
+import selectors
+import socket
+import threading
+import time
+from dataclasses import replace
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from metrics import metrics
+from subscription import RateGate, Subscription, parse_subscription, subscription_info
+from wire_protocol import (HELLO_GRACE, HELLO_MAX_BYTES, HELLO_TIMEOUT, UDP_CLIENT_TIMEOUT, encode_info, parse_hello,
+                           udp_datagrams, udp_encoding)
+
+# publish(encode) calls encode(view) with a client's Subscription (see
+# subscription.py) at most once per distinct view among the clients a frame
+# goes out to; clients subscribed to the same view share the same bytes.
+Encode = Callable[[Subscription], Optional[bytes]]
+
+
+class _Client:
+    def __init__(self, sock: socket.socket, addr: Tuple[str, int], max_queue: int):
+        self.sock = sock
+        self.addr = addr
+        self.grace_deadline = time.monotonic() + HELLO_GRACE     # first frame waits for a hello until then
+        self.hello_deadline: Optional[float] = None     # set by the hello's first byte
+        self.hello_buffer = b""
+        self.hello_open = True              # nothing sent yet, a hello may still change the subscription
+        self.subscribed = False             # a hello was received and applied
+        self.ready = True                   # frames may be queued (not while a hello line is coming in)
+        self.subscription = Subscription()
+        self.rate = RateGate(0)
+        self.wants_keyframe = True          # stateful encodings must start from a full frame
+        self.queue: Deque[Tuple[bytes, Optional[float]]] = collections.deque(maxlen=max_queue)    # (frame, capture time)
+        self.sending: Optional[memoryview] = None   # frame currently being written
+        self.sending_capture_time: Optional[float] = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+
+class LandmarkStreamServer:
+    """
+    Non-blocking TCP fan-out for landmark frames.
+
+    Any number of clients can connect at once. Every client has a small
+    latest-wins outbound queue: when a client reads slower than frames are
+    published, the oldest queued frame is dropped instead of blocking. A frame
+    that has started going out on the wire is always finished, so the stream
+    stays well-formed. A slow client never delays the others.
+
+    publish() is called by the producer thread; all socket I/O happens on the
+    server's own selector thread.
+    """
+
+    def __init__(self, host: str, port: int, max_queue: int = 1, name: str = "Socket", stream: str = "",
+                 modality: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.max_queue = max(1, max_queue)
+        self.name = name
+        self.stream = stream    # label on /metrics
+        self.modality = modality    # wire_protocol.MODALITY_*, resolves named landmark subsets
+
+        self._selector = selectors.DefaultSelector()
+        self._clients: Dict[socket.socket, _Client] = {}
+        self._clients_lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ API
+
+    def start(self) -> threading.Thread:
+        metrics.add_collector(
+            "clients", "gauge", "Connected landmark socket clients.",
+            lambda: [({"stream": self.stream}, self.client_count)])
+        metrics.add_collector(
+            "client_frames_sent_total", "counter", "Frames fully written to each connected client.",
+            lambda: [(labels, c.frames_sent) for labels, c in self._client_samples()])
+        metrics.add_collector(
+            "client_frames_dropped_total", "counter",
+            "Frames dropped from each connected client's queue because it read too slowly.",
+            lambda: [(labels, c.frames_dropped) for labels, c in self._client_samples()])
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    @property
+    def client_count(self) -> int:
+        with self._clients_lock:
+            return sum(1 for c in self._clients.values() if c.ready)
+
+    @property
+    def subscriptions(self) -> Set[Subscription]:
+        """Distinct views the connected clients subscribed to."""
+        with self._clients_lock:
+            return {c.subscription for c in self._clients.values() if c.ready}
+
+    def take_keyframe_request(self, encoding: str) -> bool:
+        """
+        True once for every batch of newly connected clients using `encoding`,
+        so stateful (delta) encoders can start them off with a keyframe.
+        """
+        requested = False
+        with self._clients_lock:
+            for client in self._clients.values():
+                if client.ready and client.wants_keyframe and client.subscription.encoding == encoding:
+                    client.wants_keyframe = False
+                    requested = True
+        return requested
+
+    def publish(self, encode: Encode, capture_time: Optional[float] = None) -> int:
+        """
+        Queues one frame for every connected client that is due one (max_rate).
+        `encode(view)` is called at most once per distinct client subscription.
+        `capture_time` (time.time() of the camera frame) feeds the capture-to-send latency metric.
+        Returns the number of clients the frame was queued for.
+        """
+        encoded: Dict[Subscription, Optional[bytes]] = {}
+        queued = 0
+        now = time.monotonic()
+        with self._clients_lock:
+            for client in self._clients.values():
+                if not client.ready or not client.rate.ready(now):
+                    continue
+                view = client.subscription
+                if view not in encoded:
+                    with metrics.timer(f"encode_{view.encoding}", self.stream):
+                        encoded[view] = encode(view)
+                data = encoded[view]
+                if not data:
+                    continue
+                if len(client.queue) == client.queue.maxlen:
+                    client.frames_dropped += 1
+                client.queue.append((data, capture_time))
+                queued += 1
+        if queued:
+            self._wake()
+        return queued
+
+    # ------------------------------------------------------------ internals
+
+    def _client_samples(self) -> List[Tuple[Dict[str, str], _Client]]:
+        with self._clients_lock:
+            return [({"stream": self.stream, "client": f"{c.addr[0]}:{c.addr[1]}"}, c)
+                    for c in self._clients.values() if c.ready]
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass    # a wake-up is already pending
+
+    def _serve(self) -> None:
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server_socket.bind((self.host, self.port))
+            server_socket.listen(16)
+            server_socket.setblocking(False)
+            self._selector.register(server_socket, selectors.EVENT_READ, "accept")
+            self._selector.register(self._wake_r, selectors.EVENT_READ, "wake")
+            print(f"[{self.name}] Listening on {self.host}:{self.port}")
+
+            while True:
+                for key, mask in self._selector.select(self._next_timeout()):
+                    if key.data == "accept":
+                        self._accept(server_socket)
+                    elif key.data == "wake":
+                        self._drain_wake()
+                    else:
+                        client = key.data
+                        if mask & selectors.EVENT_READ:
+                            self._on_readable(client)
+                        if mask & selectors.EVENT_WRITE and client.sock in self._clients:
+                            self._flush(client)
+                self._expire_handshakes()
+                self._flush_all()
+
+        except Exception as e:
+            print(f"[{self.name}] Server Error: {e}")
+        finally:
+            for client in list(self._clients.values()):
+                self._drop(client)
+            self._selector.close()
+            server_socket.close()
+
+    def _next_timeout(self) -> Optional[float]:
+        with self._clients_lock:
+            deadlines = [c.hello_deadline for c in self._clients.values() if c.hello_deadline is not None]
+            deadlines += [c.grace_deadline for c in self._clients.values() if c.hello_open and c.queue]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _accept(self, server_socket: socket.socket) -> None:
+        try:
+            sock, addr = server_socket.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = _Client(sock, addr, self.max_queue)
+        with self._clients_lock:
+            self._clients[sock] = client
+        self._selector.register(sock, selectors.EVENT_READ, client)
+        print(f"[{self.name}] Connected by {addr}")
+
+    def _drain_wake(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _on_readable(self, client: _Client) -> None:
+        try:
+            data = client.sock.recv(HELLO_MAX_BYTES)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client)
+            return
+        if not client.hello_open:
+            if not client.subscribed:
+                # JSON frames already went out: switching now would leave a binary client reading them
+                # as lengths, so close and let it reconnect with the hello sent first
+                print(f"[{self.name}] {client.addr} sent a hello after JSON frames started, closing so it reconnects")
+                self._drop(client)
+            return      # nothing is expected after the hello line
+
+        if client.hello_deadline is None:
+            # The first byte decides: hold frames until the hello line is complete
+            with self._clients_lock:
+                client.ready = False
+                client.queue.clear()
+            client.hello_deadline = time.monotonic() + HELLO_TIMEOUT
+        client.hello_buffer += data
+        if b"\n" in client.hello_buffer or len(client.hello_buffer) >= HELLO_MAX_BYTES:
+            self._finish_handshake(client)
+
+    def _expire_handshakes(self) -> None:
+        now = time.monotonic()
+        with self._clients_lock:
+            expired = [c for c in self._clients.values() if c.hello_deadline is not None and c.hello_deadline <= now]
+        for client in expired:
+            self._finish_handshake(client)
+
+    def _finish_handshake(self, client: _Client) -> None:
+        hello = parse_hello(client.hello_buffer.split(b"\n", 1)[0])
+        client.hello_buffer = b""
+        subscription = parse_subscription(hello, self.modality)
+        if subscription.explicit:
+            # Goes out ahead of any frame; the latest-wins queue could drop it
+            client.sending = memoryview(encode_info(subscription_info(subscription), subscription.encoding))
+        with self._clients_lock:
+            client.subscription = subscription
+            client.rate = RateGate(subscription.max_rate)
+            client.hello_deadline = None
+            client.hello_open = False
+            client.subscribed = True
+            client.ready = True
+        print(f"[{self.name}] {client.addr} subscribed ({subscription.describe()})")
+
+    def _flush_all(self) -> None:
+        with self._clients_lock:
+            clients: List[_Client] = list(self._clients.values())
+        for client in clients:
+            if client.sending is not None or client.queue:
+                self._flush(client)
+
+    def _flush(self, client: _Client) -> None:
+        if client.hello_open and client.sending is None:
+            if time.monotonic() < client.grace_deadline:
+                return      # a hello may still be on its way (_next_timeout wakes up for it)
+            with self._clients_lock:
+                # The first frame goes out without a hello: a plain JSON client from now on
+                client.hello_open = not client.queue
+        while True:
+            if client.sending is None:
+                with self._clients_lock:
+                    if not client.queue:
+                        break
+                    data, client.sending_capture_time = client.queue.popleft()
+                    client.sending = memoryview(data)
+            try:
+                with metrics.timer("send", self.stream):
+                    sent = client.sock.send(client.sending)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                self._drop(client)
+                return
+            client.sending = client.sending[sent:]
+            if len(client.sending):
+                break   # socket buffer full, wait for EVENT_WRITE
+            client.sending = None
+            client.frames_sent += 1
+            if client.sending_capture_time is not None:
+                metrics.observe("capture_to_send_seconds", time.time() - client.sending_capture_time,
+                                stream=self.stream)
+
+        events = selectors.EVENT_READ
+        if client.sending is not None:
+            events |= selectors.EVENT_WRITE
+        self._selector.modify(client.sock, events, client)
+
+    def _drop(self, client: _Client) -> None:
+        with self._clients_lock:
+            if self._clients.pop(client.sock, None) is None:
+                return
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        print(f"[{self.name}] Disconnected from {client.addr} "
+              f"(sent {client.frames_sent}, dropped {client.frames_dropped})")
+
+
+class _UdpClient:
+    def __init__(self, addr: Tuple[str, int]):
+        self.addr = addr
+        self.hello = b""
+        self.subscription = Subscription()
+        self.rate = RateGate(0)
+        self.last_hello = time.monotonic()
+        self.frames_sent = 0
+        self.datagrams_dropped = 0
+
+
+class UdpStreamServer:
+    """
+    Datagram fan-out for landmark frames (see "UDP datagrams" in wire_protocol.py).
+
+    Clients register with a hello datagram and expire `client_timeout` seconds
+    after their last one. publish() sends every frame straight away as
+    datagrams from the producer thread: nothing is queued or retransmitted,
+    so a lost datagram costs one frame and never delays the next.
+    Same publish() / client_count API as LandmarkStreamServer.
+    """
+
+    def __init__(self, host: str, port: int, name: str = "UDP", stream: str = "",
+                 client_timeout: float = UDP_CLIENT_TIMEOUT, modality: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.name = name
+        self.stream = stream    # label on /metrics
+        self.client_timeout = client_timeout
+        self.modality = modality    # wire_protocol.MODALITY_*, resolves named landmark subsets
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._clients: Dict[Tuple[str, int], _UdpClient] = {}
+        self._clients_lock = threading.Lock()
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> threading.Thread:
+        metrics.add_collector(
+            "udp_clients", "gauge", "Registered UDP landmark clients.",
+            lambda: [({"stream": self.stream}, self.client_count)])
+        metrics.add_collector(
+            "udp_client_frames_sent_total", "counter", "Frames sent to each registered UDP client.",
+            lambda: [(labels, c.frames_sent) for labels, c in self._client_samples()])
+        metrics.add_collector(
+            "udp_client_datagrams_dropped_total", "counter",
+            "Datagrams the local socket buffer refused for each registered UDP client.",
+            lambda: [(labels, c.datagrams_dropped) for labels, c in self._client_samples()])
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    @property
+    def client_count(self) -> int:
+        with self._clients_lock:
+            return len(self._clients)
+
+    @property
+    def subscriptions(self) -> Set[Subscription]:
+        with self._clients_lock:
+            return {c.subscription for c in self._clients.values()}
+
+    def take_keyframe_request(self, encoding: str) -> bool:
+        return False    # no stateful encodings over UDP
+
+    def publish(self, encode: Encode, capture_time: Optional[float] = None) -> int:
+        """
+        Sends one frame to every registered client that is due one (max_rate).
+        `encode(view)` is called at most once per distinct client subscription.
+        Returns the number of clients the frame was sent to.
+        """
+        now = time.monotonic()
+        with self._clients_lock:
+            clients = [c for c in self._clients.values() if c.rate.ready(now)]
+        if not clients:
+            return 0
+        seq = self._next_seq()
+        timestamp = time.time() if capture_time is None else capture_time
+        datagrams: Dict[Subscription, List[bytes]] = {}
+        sent = 0
+        for client in clients:
+            view = client.subscription
+            if view not in datagrams:
+                with metrics.timer(f"encode_{view.encoding}", self.stream):
+                    data = encode(view)
+                datagrams[view] = udp_datagrams(data, seq, timestamp) if data else []
+                if data and not datagrams[view]:
+                    print(f"[{self.name}] Frame of {len(data)} bytes is too large for UDP, skipped")
+            chunks = datagrams[view]
+            if not chunks:
+                continue
+            self._send(client, chunks)
+            client.frames_sent += 1
+            sent += 1
+        if sent and capture_time is not None:
+            metrics.observe("capture_to_send_seconds", time.time() - capture_time, stream=self.stream)
+        return sent
+
+    def _next_seq(self) -> int:
+        # Frames (producer thread) and info messages (server thread) share one sequence
+        with self._seq_lock:
+            self._seq += 1
+            return self._seq
+
+    def _send(self, client: _UdpClient, chunks: List[bytes]) -> None:
+        with metrics.timer("send", self.stream):
+            for chunk in chunks:
+                try:
+                    self._sock.sendto(chunk, client.addr)
+                except (BlockingIOError, OSError):
+                    client.datagrams_dropped += 1
+
+    def _client_samples(self) -> List[Tuple[Dict[str, str], _UdpClient]]:
+        with self._clients_lock:
+            return [({"stream": self.stream, "client": f"{c.addr[0]}:{c.addr[1]}"}, c)
+                    for c in self._clients.values()]
+
+    def _serve(self) -> None:
+        try:
+            self._sock.bind((self.host, self.port))
+            self._sock.settimeout(min(1.0, self.client_timeout))
+            print(f"[{self.name}] Listening on {self.host}:{self.port}/udp")
+            while True:
+                try:
+                    data, addr = self._sock.recvfrom(HELLO_MAX_BYTES)
+                except socket.timeout:
+                    data, addr = None, None
+                except ConnectionResetError:
+                    # Windows reports an earlier datagram's ICMP port unreachable here
+                    data, addr = None, None
+                if data is not None:
+                    self._on_hello(data, addr)
+                self._expire_clients()
+        except Exception as e:
+            print(f"[{self.name}] Server Error: {e}")
+        finally:
+            self._sock.close()
+
+    def _on_hello(self, data: bytes, addr: Tuple[str, int]) -> None:
+        hello = parse_hello(data)
+        leaving = bool(hello.get("bye"))
+        with self._clients_lock:
+            if leaving:
+                client = self._clients.pop(addr, None)
+                new = changed = False
+            else:
+                client = self._clients.get(addr)
+                new = client is None
+                if new:
+                    client = self._clients[addr] = _UdpClient(addr)
+                client.last_hello = time.monotonic()
+                # Keep-alives repeat the hello; only a different one is parsed again
+                changed = data != client.hello
+                if changed:
+                    client.hello = data
+                    client.subscription = replace(parse_subscription(hello, self.modality),
+                                                  encoding=udp_encoding(hello))
+                    client.rate = RateGate(client.subscription.max_rate)
+        if leaving and client is not None:
+            print(f"[{self.name}] {addr} left (sent {client.frames_sent})")
+            return
+        if new:
+            print(f"[{self.name}] Registered {addr} ({client.subscription.describe()})")
+        if changed and client.subscription.explicit:
+            info = encode_info(subscription_info(client.subscription), client.subscription.encoding)
+            self._send(client, udp_datagrams(info, self._next_seq(), time.time()))
+
+    def _expire_clients(self) -> None:
+        deadline = time.monotonic() - self.client_timeout
+        with self._clients_lock:
+            expired = [c for c in self._clients.values() if c.last_hello < deadline]
+            for client in expired:
+                del self._clients[client.addr]
+        for client in expired:
+            print(f"[{self.name}] {client.addr} timed out (sent {client.frames_sent})")
+
+
+class StreamServerGroup:
+    """Publishes the same frames through several servers (TCP and UDP on one port number)."""
+
+    def __init__(self, servers: List):
+        self.servers = list(servers)
+
+    def start(self) -> Optional[threading.Thread]:
+        threads = [server.start() for server in self.servers]
+        return threads[0]
+
+    @property
+    def client_count(self) -> int:
+        return sum(server.client_count for server in self.servers)
+
+    @property
+    def subscriptions(self) -> Set[Subscription]:
+        return set().union(*(server.subscriptions for server in self.servers))
+
+    def take_keyframe_request(self, encoding: str) -> bool:
+        # Every server's pending requests must be taken, not just the first one's
+        return any([server.take_keyframe_request(encoding) for server in self.servers])
+
+    def publish(self, encode: Encode, capture_time: Optional[float] = None) -> int:
+        encoded: Dict[Subscription, Optional[bytes]] = {}
+
+        def shared_encode(view: Subscription) -> Optional[bytes]:
+            if view not in encoded:
+                encoded[view] = encode(view)
+            return encoded[view]
+
+        return sum(server.publish(shared_encode, capture_time) for server in self.servers)
+
+
+def make_stream_server(host: str, port: int, stream: str = "", udp: bool = False, websocket: Optional[Any] = None,
+                       modality: Optional[int] = None):
+    """
+    LandmarkStreamServer on `port`, plus a UdpStreamServer on the same port
+    number if `udp`, plus `websocket` (a WebSocketStreamServer) if given.
+    `modality` resolves the named landmark subsets clients subscribe to.
+    """
+    servers = [LandmarkStreamServer(host, port, stream=stream, modality=modality)]
+    if udp:
+        servers.append(UdpStreamServer(host, port, stream=stream, modality=modality))
+    if websocket is not None:
+        servers.append(websocket)
+    return servers[0] if len(servers) == 1 else StreamServerGroup(servers)
@@ -0,0 +1,318 @@
+# subscription.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from depth_module import FULL_SCOPE, DepthFrame, FaceFrame, FrameScope, HandFrame, LandmarkArray, PoseFrame
+from wire_protocol import (ENCODING_BINARY, ENCODING_DELTA, ENCODING_JSON, ENCODINGS, FACE_BLENDSHAPE_NAMES, MODALITY_FACE,
+                           MODALITY_HAND, MODALITY_POSE, hello_encoding)
+
+# Client subscriptions: besides "encoding", the hello a client sends when it
+# connects may narrow what it receives, e.g.
+#
+#     {"encoding": "binary", "fields": ["world_landmarks"], "subset": "upper_body", "max_rate": 30}
+#     {"subset": ["lips", "eyes"], "indices": [1, 4], "fields": ["landmarks"]}
+#
+#   fields    any of SUBSCRIPTION_FIELDS (default: all). Per-landmark depth
+#             is only sent together with "landmarks". Binary frames keep
+#             their layout: unselected arrays are sent empty.
+#   subset    a NAMED_SUBSETS name of the server's modality, or a list of them
+#   indices   landmark indices, after the subset ones, in the order given;
+#             indices outside the modality's LANDMARK_COUNTS are rejected
+#   max_rate  frames per second for this client, 0 = every frame
+#   mode      "landmarks" (default) or, on the face server, "blendshapes": only
+#             the blendshape scores and head transform of every face, in the
+#             compact frames of wire_protocol.py ("Blendshape frames")
+#   quantize  "uint8": blendshape scores as round(score * 255)
+#
+# Subscribed landmarks arrive in the resolved index order. Clients that asked
+# for anything beyond "encoding" first receive one info message describing the
+# subscription, including any rejected indices (see subscription_info /
+# encode_info in wire_protocol.py).
+#
+# Subscriptions compare equal when they select the same view (max_rate is not
+# part of it), so a server encodes every distinct view once per frame and
+# shares the bytes among its subscribers. A delta subscription with a narrowed
+# view is served as binary: the delta state is kept for the full view only.
+# Frames themselves are only built as far as the views in use need them
+# (frame_scope), e.g. 40 lip landmarks out of 478 and no per-landmark depth.
+
+MODE_LANDMARKS = "landmarks"
+MODE_BLENDSHAPES = "blendshapes"
+
+SUBSCRIPTION_FIELDS = ("landmarks", "world_landmarks", "depth", "per_landmark_z",
+                       "face_pose", "blendshapes", "depth_debug")
+
+# Landmarks per target: MediaPipe pose, hand and face (with irises) landmarkers
+LANDMARK_COUNTS: Dict[int, int] = {MODALITY_POSE: 33, MODALITY_HAND: 21, MODALITY_FACE: 478}
+
+# Index sets from MediaPipe's PoseLandmark / HandLandmark enums and FaceLandmarksConnections
+NAMED_SUBSETS: Dict[int, Dict[str, Tuple[int, ...]]] = {
+    MODALITY_POSE: {
+        "face": tuple(range(0, 11)),
+        "upper_body": tuple(range(0, 25)),
+        "arms": (11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22),
+        "torso": (11, 12, 23, 24),
+        "lower_body": tuple(range(23, 33)),
+    },
+    MODALITY_HAND: {
+        "fingertips": (4, 8, 12, 16, 20),
+        "palm": (0, 1, 5, 9, 13, 17),
+    },
+    MODALITY_FACE: {
+        "lips": (0, 13, 14, 17, 37, 39, 40, 61, 78, 80, 81, 82, 84, 87, 88, 91, 95, 146, 178, 181,
+                 185, 191, 267, 269, 270, 291, 308, 310, 311, 312, 314, 317, 318, 321, 324, 375, 402,
+                 405, 409, 415),
+        "left_eye": (249, 263, 362, 373, 374, 380, 381, 382, 384, 385, 386, 387, 388, 390, 398, 466),
+        "right_eye": (7, 33, 133, 144, 145, 153, 154, 155, 157, 158, 159, 160, 161, 163, 173, 246),
+        "left_eyebrow": (276, 282, 283, 285, 293, 295, 296, 300, 334, 336),
+        "right_eyebrow": (46, 52, 53, 55, 63, 65, 66, 70, 105, 107),
+        "left_iris": (473, 474, 475, 476, 477),
+        "right_iris": (468, 469, 470, 471, 472),
+        "contour": (10, 21, 54, 58, 67, 93, 103, 109, 127, 132, 136, 148, 149, 150, 152, 162, 172,
+                    176, 234, 251, 284, 288, 297, 323, 332, 338, 356, 361, 365, 377, 378, 379, 389,
+                    397, 400, 454),
+        "nose": (1, 2, 4, 5, 6, 19, 45, 48, 64, 94, 97, 98, 115, 168, 195, 197, 220, 275, 278, 294,
+                 326, 327, 344, 440),
+    },
+}
+_FACE = NAMED_SUBSETS[MODALITY_FACE]
+_FACE["eyes"] = tuple(sorted(_FACE["left_eye"] + _FACE["right_eye"]))
+_FACE["eyebrows"] = tuple(sorted(_FACE["left_eyebrow"] + _FACE["right_eyebrow"]))
+_FACE["irises"] = tuple(sorted(_FACE["left_iris"] + _FACE["right_iris"]))
+
+
+@dataclass(frozen=True)
+class Subscription:
+    encoding: str = ENCODING_JSON
+    fields: Optional[FrozenSet[str]] = None         # None = every field
+    indices: Optional[Tuple[int, ...]] = None       # None = every landmark
+    max_rate: float = field(default=0.0, compare=False)
+    explicit: bool = field(default=False, compare=False)   # asked for more than an encoding
+    mode: str = MODE_LANDMARKS
+    quantize: bool = False      # uint8 blendshape scores
+    rejected_indices: Tuple[Any, ...] = field(default=(), compare=False)   # as requested, for the info message
+
+    @property
+    def full(self) -> bool:
+        return self.mode == MODE_LANDMARKS and self.fields is None and self.indices is None
+
+    @property
+    def min_interval(self) -> float:
+        return 1.0 / self.max_rate if self.max_rate > 0 else 0.0
+
+    def wants(self, name: str) -> bool:
+        return self.fields is None or name in self.fields
+
+    def describe(self) -> str:
+        """Short form for connection logs, e.g. "binary, 40 landmarks, max 15 fps"."""
+        parts = [self.encoding]
+        if self.mode != MODE_LANDMARKS:
+            parts.append(self.mode + (" uint8" if self.quantize else ""))
+        if self.indices is not None:
+            parts.append(f"{len(self.indices)} landmarks")
+        if self.fields is not None:
+            parts.append("+".join(sorted(self.fields)) or "no fields")
+        if self.max_rate > 0:
+            parts.append(f"max {self.max_rate:g} fps")
+        return ", ".join(parts)
+
+
+FULL_VIEWS = {encoding: Subscription(encoding) for encoding in ENCODINGS}
+
+
+def _names(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return []
+
+
+def parse_subscription(hello: Mapping[str, Any], modality: Optional[int] = None) -> Subscription:
+    """
+    Subscription from a hello (or WebSocket query arguments, where lists are
+    comma-separated). Unknown fields and subset names are reported and ignored.
+    """
+    encoding = hello_encoding(dict(hello))
+    explicit = any(key in hello for key in ("fields", "subset", "indices", "max_rate", "mode", "quantize"))
+
+    fields = None
+    if "fields" in hello:
+        requested = _names(hello["fields"])
+        unknown = [name for name in requested if name not in SUBSCRIPTION_FIELDS]
+        if unknown:
+            print(f"[Subscription] Ignoring unknown fields {unknown}")
+        fields = frozenset(name for name in requested if name in SUBSCRIPTION_FIELDS)
+
+    indices: Optional[List[int]] = None
+    rejected: List[Any] = []
+    if "subset" in hello or "indices" in hello:
+        indices = []
+        subsets = NAMED_SUBSETS.get(modality, {})
+        for name in _names(hello.get("subset")):
+            if name in subsets:
+                indices.extend(subsets[name])
+            else:
+                print(f"[Subscription] Unknown subset {name!r} (known: {', '.join(sorted(subsets))})")
+        count = LANDMARK_COUNTS.get(modality)
+        for value in _names(hello.get("indices")):
+            try:
+                index = int(value)
+            except ValueError:
+                rejected.append(value)
+                continue
+            if index < 0 or (count is not None and index >= count):
+                rejected.append(index)
+            else:
+                indices.append(index)
+        if rejected:
+            print(f"[Subscription] Rejecting landmark indices {rejected} (valid: 0..{count - 1 if count else '?'})")
+        indices = list(dict.fromkeys(indices))
+
+    try:
+        max_rate = max(0.0, float(hello.get("max_rate", 0) or 0))
+    except (TypeError, ValueError):
+        max_rate = 0.0
+
+    mode = str(hello.get("mode", MODE_LANDMARKS)).lower()
+    if mode == MODE_BLENDSHAPES and modality != MODALITY_FACE:
+        print("[Subscription] Blendshape mode is only served by the face server, sending landmarks")
+        mode = MODE_LANDMARKS
+    elif mode not in (MODE_LANDMARKS, MODE_BLENDSHAPES):
+        print(f"[Subscription] Unknown mode {mode!r}, sending landmarks")
+        mode = MODE_LANDMARKS
+    quantize = mode == MODE_BLENDSHAPES and str(hello.get("quantize", "")).lower() in ("uint8", "true", "1")
+    if mode == MODE_BLENDSHAPES:
+        # Blendshape frames have a single layout
+        fields, indices, rejected = None, None, []
+
+    subscription = Subscription(encoding, fields, tuple(indices) if indices is not None else None, max_rate, explicit,
+                                mode, quantize, tuple(rejected))
+    if subscription.encoding == ENCODING_DELTA and not subscription.full:
+        subscription = replace(subscription, encoding=ENCODING_BINARY)
+    return subscription
+
+
+def subscription_info(subscription: Subscription) -> Dict[str, Any]:
+    """What a subscribed client is told at connect time."""
+    if subscription.mode == MODE_BLENDSHAPES:
+        return {
+            "encoding": subscription.encoding,
+            "mode": subscription.mode,
+            "blendshape_names": list(FACE_BLENDSHAPE_NAMES),
+            "quantize": "uint8" if subscription.quantize else None,
+            "max_rate": subscription.max_rate,
+        }
+    return {
+        "encoding": subscription.encoding,
+        "mode": subscription.mode,
+        "fields": sorted(subscription.fields) if subscription.fields is not None else list(SUBSCRIPTION_FIELDS),
+        "indices": list(subscription.indices) if subscription.indices is not None else None,
+        "rejected_indices": list(subscription.rejected_indices),
+        "max_rate": subscription.max_rate,
+    }
+
+
+class RateGate:
+    """
+    A client's max_rate on a stream it does not control: ready() says whether
+    the frame published now goes out. Frames are paced on a fixed grid with
+    some slack, so e.g. max_rate 15 on a jittery 30 fps camera sends every
+    other frame instead of every third.
+    """
+
+    SLACK = 0.25    # fraction of the interval a frame may arrive early
+
+    def __init__(self, max_rate: float):
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self._next = 0.0
+
+    def ready(self, now: float) -> bool:
+        if not self.interval:
+            return True
+        slack = self.SLACK * self.interval
+        if now < self._next - slack:
+            return False
+        # Stay on the grid, but do not catch up in a burst after a pause
+        self._next = max(self._next, now - slack) + self.interval
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Applying a view to computed frames
+# ---------------------------------------------------------------------------
+
+def frame_scope(views: Iterable[Subscription], full: bool = False) -> Optional[FrameScope]:
+    """
+    What compute_*_frame(s) must build for `views` (everything with full=True,
+    e.g. for a recording), or None when none of them is sent landmark frames.
+    """
+    if full:
+        return FULL_SCOPE
+    views = [view for view in views if view.mode == MODE_LANDMARKS]
+    if not views:
+        return None
+    indices = None
+    if all(view.indices is not None for view in views):
+        indices = tuple(sorted(set().union(*(view.indices for view in views))))
+    return FrameScope(indices,
+                      world=any(view.wants("world_landmarks") for view in views),
+                      per_landmark_z=any(view.wants("landmarks") for view in views))
+
+
+def in_scope(view: Subscription, scope: Optional[FrameScope]) -> bool:
+    """False for a landmark view that subscribed after `scope` was taken and needs more than it has."""
+    if view.mode != MODE_LANDMARKS:
+        return True
+    if scope is None:
+        return False
+    if scope.indices is not None and (view.indices is None or not set(view.indices) <= set(scope.indices)):
+        return False
+    if view.wants("world_landmarks") and not scope.world:
+        return False
+    return scope.per_landmark_z or not view.wants("landmarks")
+
+
+_EMPTY_LANDMARKS = np.zeros((0, 4), dtype=np.float32)
+_EMPTY_Z = np.zeros(0, dtype=np.float32)
+
+
+def _rows(array: Optional[np.ndarray], indices: Optional[Tuple[int, ...]]) -> Optional[np.ndarray]:
+    if array is None or indices is None:
+        return array
+    # parse_subscription only lets through indices below the modality's LANDMARK_COUNTS
+    return array[np.asarray(indices, dtype=np.intp)]
+
+
+def _select(lms: LandmarkArray, depth: DepthFrame, view: Subscription) -> Tuple[LandmarkArray, DepthFrame]:
+    data = _rows(lms.data, view.indices) if view.wants("landmarks") else _EMPTY_LANDMARKS
+    world = _rows(lms.world, view.indices) if view.wants("world_landmarks") else None
+    per_landmark_z = _rows(depth.per_landmark_z, view.indices) if view.wants("landmarks") else _EMPTY_Z
+    return LandmarkArray(data, world), DepthFrame(depth.mode, depth.global_z, per_landmark_z)
+
+
+def select_pose(frame: Optional[PoseFrame], view: Subscription) -> Optional[PoseFrame]:
+    if frame is None or view.full:
+        return frame
+    return PoseFrame(*_select(frame.landmarks, frame.depth, view))
+
+
+def select_hands(hands: Sequence[HandFrame], view: Subscription) -> Sequence[HandFrame]:
+    if view.full:
+        return hands
+    return [HandFrame(hand.handedness, *_select(hand.landmarks, hand.depth, view)) for hand in hands]
+
+
+def select_faces(faces: Sequence[FaceFrame], view: Subscription) -> Sequence[FaceFrame]:
+    if view.full:
+        return faces
+    return [
+        FaceFrame(*_select(face.landmarks, face.depth, view), face.face_pose if view.wants("face_pose") else None)
+        for face in faces
+    ]
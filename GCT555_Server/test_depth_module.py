@@ -0,0 +1,104 @@
+# test_depth_module.py
+# python -m unittest test_depth_module   (or pytest), from GCT555_Server/
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+
+from depth_module import DepthConfig, DepthState, LandmarkArray, OneEuroFilter
+
+FPS = 30.0
+SETTLE_FRAMES = 30      # frames at rest before the step
+STEP_FRAMES = 60        # frames after it
+
+# The same hand movement in both spaces: 10% of the frame, about 20 cm
+NORMALIZED_STEP = 0.1
+WORLD_STEP = 0.2
+
+
+def _frame(value: float, world_value: float, count: int = 21) -> LandmarkArray:
+    data = np.zeros((count, 4), dtype=np.float32)
+    data[:, :3] = value
+    data[:, 3] = 1.0
+    world = np.zeros((count, 4), dtype=np.float32)
+    world[:, :3] = world_value
+    world[:, 3] = 1.0
+    return LandmarkArray(data, world)
+
+
+def _step_response(cfg: DepthConfig, noise: float = 0.0):
+    """(normalized, world) filtered x of landmark 0, one row per frame after the step."""
+    state = DepthState(cfg)
+    rng = np.random.default_rng(0)
+    normalized, world = [], []
+    for i in range(SETTLE_FRAMES + STEP_FRAMES):
+        stepped = i >= SETTLE_FRAMES
+        lms = _frame(NORMALIZED_STEP if stepped else 0.0, WORLD_STEP if stepped else 0.0)
+        if noise:
+            lms.data[:, :3] += rng.normal(0.0, noise, lms.data[:, :3].shape)
+            lms.world[:, :3] += rng.normal(0.0, noise, lms.world[:, :3].shape)
+        state._filter_landmarks("hand", "Left", lms, timestamp=i / FPS)
+        if stepped:
+            normalized.append(lms.data[0, 0])
+            world.append(lms.world[0, 0])
+    return np.asarray(normalized), np.asarray(world)
+
+
+def _lag(trace: np.ndarray, target: float) -> float:
+    """Seconds until `trace` first reaches 90% of a step to `target`."""
+    reached = np.nonzero(trace >= 0.9 * target)[0]
+    return reached[0] / FPS if reached.size else float("inf")
+
+
+class OneEuroFilterTest(unittest.TestCase):
+    def test_first_sample_passes_through(self):
+        filt = OneEuroFilter(1.0, 10.0, 1.0)
+        np.testing.assert_allclose(filt(np.array([0.3, 0.7]), 0.0), [0.3, 0.7])
+
+    def test_step_settles_without_overshoot(self):
+        filt = OneEuroFilter(1.0, 10.0, 1.0)
+        for i in range(SETTLE_FRAMES):
+            filt(np.zeros(1), i / FPS)
+        trace = np.array([filt(np.full(1, NORMALIZED_STEP), (SETTLE_FRAMES + i) / FPS)[0]
+                          for i in range(STEP_FRAMES)])
+        self.assertLessEqual(trace.max(), NORMALIZED_STEP + 1e-6)
+        self.assertAlmostEqual(trace[-1], NORMALIZED_STEP, places=4)
+
+    def test_time_going_backwards_restarts(self):
+        filt = OneEuroFilter(1.0, 10.0, 1.0)
+        filt(np.zeros(1), 1.0)
+        np.testing.assert_allclose(filt(np.ones(1), 0.5), [1.0])
+
+
+class LandmarkFilterSpacesTest(unittest.TestCase):
+    def test_step_lag_in_both_spaces(self):
+        normalized, world = _step_response(DepthConfig(landmark_filter="one_euro"))
+        # Fast hand movement: a few frames of lag at most, in both spaces
+        self.assertLessEqual(_lag(normalized, NORMALIZED_STEP), 0.1)
+        self.assertLessEqual(_lag(world, WORLD_STEP), 0.1)
+        self.assertAlmostEqual(normalized[-1], NORMALIZED_STEP, places=4)
+        self.assertAlmostEqual(world[-1], WORLD_STEP, places=4)
+
+    def test_world_landmarks_use_world_settings(self):
+        cfg = DepthConfig(landmark_filter="one_euro", filter_world_min_cutoff=0.2, filter_world_beta=0.0)
+        normalized, world = _step_response(cfg)
+        reference, _ = _step_response(DepthConfig(landmark_filter="one_euro"))
+        np.testing.assert_allclose(normalized, reference)
+        self.assertGreater(_lag(world, WORLD_STEP), 0.5)
+
+    def test_rest_jitter_is_reduced_in_both_spaces(self):
+        noise = 0.002
+        normalized, world = _step_response(DepthConfig(landmark_filter="one_euro"), noise=noise)
+        settled = STEP_FRAMES // 2
+        self.assertLess(normalized[settled:].std(), noise / 2)
+        self.assertLess(world[settled:].std(), noise / 2)
+
+    def test_none_leaves_landmarks_untouched(self):
+        normalized, world = _step_response(DepthConfig(landmark_filter="none"))
+        np.testing.assert_allclose(normalized, NORMALIZED_STEP)
+        np.testing.assert_allclose(world, WORLD_STEP)
+
+
+if __name__ == "__main__":
+    unittest.main()
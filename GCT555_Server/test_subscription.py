@@ -0,0 +1,86 @@
+# test_subscription.py
+# python -m unittest test_subscription   (or pytest), from GCT555_Server/
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+
+from depth_module import DepthFrame, LandmarkArray, PoseFrame
+from subscription import (LANDMARK_COUNTS, MODE_BLENDSHAPES, NAMED_SUBSETS, Subscription, parse_subscription,
+                          select_pose, subscription_info)
+from wire_protocol import ENCODING_BINARY, ENCODING_DELTA, ENCODING_JSON, MODALITY_FACE, MODALITY_HAND, MODALITY_POSE
+
+
+class ParseSubscriptionTest(unittest.TestCase):
+    def test_encoding_only_is_the_full_view(self):
+        for encoding in (ENCODING_JSON, ENCODING_BINARY, ENCODING_DELTA):
+            subscription = parse_subscription({"encoding": encoding}, MODALITY_POSE)
+            self.assertEqual(subscription, Subscription(encoding))
+            self.assertTrue(subscription.full)
+            self.assertFalse(subscription.explicit)
+
+    def test_unknown_encoding_falls_back_to_json(self):
+        self.assertEqual(parse_subscription({"encoding": "xml"}).encoding, ENCODING_JSON)
+
+    def test_subset_then_indices_in_order(self):
+        subscription = parse_subscription({"subset": ["lips", "irises"], "indices": [1, 0, 4]}, MODALITY_FACE)
+        expected = NAMED_SUBSETS[MODALITY_FACE]["lips"] + NAMED_SUBSETS[MODALITY_FACE]["irises"] + (1, 4)
+        self.assertEqual(subscription.indices, expected)     # 0 is already in "lips"
+        self.assertTrue(subscription.explicit)
+
+    def test_comma_separated_query_arguments(self):
+        subscription = parse_subscription({"subset": "fingertips,palm", "fields": "landmarks"}, MODALITY_HAND)
+        self.assertEqual(subscription.indices, (4, 8, 12, 16, 20, 0, 1, 5, 9, 13, 17))
+        self.assertEqual(subscription.fields, frozenset({"landmarks"}))
+
+    def test_unknown_subset_and_fields_are_ignored(self):
+        subscription = parse_subscription({"subset": ["lips"], "fields": ["landmarks", "bones"]}, MODALITY_POSE)
+        self.assertEqual(subscription.indices, ())
+        self.assertEqual(subscription.fields, frozenset({"landmarks"}))
+
+    def test_out_of_range_indices_are_rejected(self):
+        count = LANDMARK_COUNTS[MODALITY_HAND]
+        subscription = parse_subscription({"indices": [0, -1, count - 1, count, "x", "7"]}, MODALITY_HAND)
+        self.assertEqual(subscription.indices, (0, count - 1, 7))
+        self.assertEqual(subscription.rejected_indices, (-1, count, "x"))
+        self.assertEqual(subscription_info(subscription)["rejected_indices"], [-1, count, "x"])
+
+    def test_rejected_indices_do_not_split_views(self):
+        a = parse_subscription({"indices": [0, 99]}, MODALITY_HAND)
+        b = parse_subscription({"indices": [0]}, MODALITY_HAND)
+        self.assertEqual(a, b)
+
+    def test_narrowed_delta_is_served_as_binary(self):
+        for hello in ({"fields": ["landmarks"]}, {"indices": [0]}, {"subset": "fingertips"}):
+            subscription = parse_subscription({"encoding": "delta", **hello}, MODALITY_HAND)
+            self.assertEqual(subscription.encoding, ENCODING_BINARY)
+            self.assertEqual(subscription_info(subscription)["encoding"], ENCODING_BINARY)
+        full = parse_subscription({"encoding": "delta", "max_rate": 15}, MODALITY_HAND)
+        self.assertEqual(full.encoding, ENCODING_DELTA)
+        self.assertEqual(full.max_rate, 15.0)
+
+    def test_blendshape_mode_is_face_only(self):
+        face = parse_subscription({"mode": "blendshapes", "quantize": "uint8", "indices": [1]}, MODALITY_FACE)
+        self.assertEqual((face.mode, face.quantize, face.indices), (MODE_BLENDSHAPES, True, None))
+        pose = parse_subscription({"mode": "blendshapes"}, MODALITY_POSE)
+        self.assertNotEqual(pose.mode, MODE_BLENDSHAPES)
+
+    def test_max_rate_is_not_part_of_the_view(self):
+        self.assertEqual(parse_subscription({"max_rate": 10}), parse_subscription({"max_rate": "bad"}))
+
+
+class SelectTest(unittest.TestCase):
+    def test_select_pose_rows_and_fields(self):
+        rng = np.random.default_rng(0)
+        frame = PoseFrame(LandmarkArray(rng.random((33, 4), dtype=np.float32), rng.random((33, 4), dtype=np.float32)),
+                          DepthFrame("pose_world", 1.0, rng.random(33, dtype=np.float32)))
+        view = parse_subscription({"subset": "torso", "fields": ["world_landmarks"]}, MODALITY_POSE)
+        selected = select_pose(frame, view)
+        self.assertEqual(selected.landmarks.data.shape, (0, 4))
+        np.testing.assert_array_equal(selected.landmarks.world, frame.landmarks.world[[11, 12, 23, 24]])
+        self.assertIs(select_pose(frame, Subscription()), frame)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,276 @@
+# test_wire_protocol.py
+# python -m unittest test_wire_protocol   (or pytest), from GCT555_Server/
+from __future__ import annotations
+
+import json
+import unittest
+
+import numpy as np
+
+from depth_module import DepthFrame, FaceFrame, HandFrame, LandmarkArray, PoseFrame
+from wire_protocol import (DELTA_KIND_DELTA, DELTA_KIND_KEYFRAME, DELTA_RESOLUTION, FACE_BLENDSHAPE_NAMES,
+                           LENGTH_PREFIX, MODALITY_FACE, MODALITY_HAND, MODALITY_POSE, UDP_MAX_DATAGRAM, DeltaDecoder,
+                           DeltaEncoder, UdpFrameAssembler, decode_binary, encode_faces_binary, encode_faces_json,
+                           encode_hands_binary, encode_hands_json, encode_json, encode_pose_binary, encode_pose_json,
+                           udp_datagrams)
+
+
+def _landmarks(rng: np.random.Generator, count: int, world: bool = True) -> LandmarkArray:
+    data = rng.random((count, 4), dtype=np.float32)
+    return LandmarkArray(data, rng.random((count, 4), dtype=np.float32) if world else None)
+
+
+def _pose(rng: np.random.Generator) -> PoseFrame:
+    return PoseFrame(_landmarks(rng, 33), DepthFrame("pose_world", 1.5, rng.random(33, dtype=np.float32)))
+
+
+def _hands(rng: np.random.Generator):
+    return [HandFrame(handedness, _landmarks(rng, 21), DepthFrame("hand_world", 0.4, rng.random(21, dtype=np.float32)))
+            for handedness in ("Left", "Right")]
+
+
+def _face(rng: np.random.Generator) -> FaceFrame:
+    depth = DepthFrame("face_transform_plus_local", -0.5, rng.random(478, dtype=np.float32))
+    return FaceFrame(_landmarks(rng, 478, world=False), depth, (1.0, 2.0, -30.0))
+
+
+def _body(frame: bytes) -> bytes:
+    (length,) = LENGTH_PREFIX.unpack_from(frame, 0)
+    assert length == len(frame) - LENGTH_PREFIX.size
+    return frame[LENGTH_PREFIX.size:]
+
+
+def _moved(frame: PoseFrame, rows, offset: float) -> PoseFrame:
+    data, world = frame.landmarks.data.copy(), frame.landmarks.world.copy()
+    data[rows, :3] += offset
+    world[rows, :3] += offset
+    return PoseFrame(LandmarkArray(data, world), frame.depth)
+
+
+def _delta_kind(frame: bytes) -> int:
+    return _body(frame)[2]
+
+
+def _assert_same_json(test: unittest.TestCase, written: bytes, expected: bytes) -> None:
+    """Same keys in the same order and the same values, floats compared as the float32 they were."""
+    test.assertTrue(written.endswith(b"\n") and written.count(b"\n") == 1)
+
+    def compare(a, b, path="$"):
+        if isinstance(b, dict):
+            test.assertIsInstance(a, dict, path)
+            test.assertEqual(list(a), list(b), path)
+            for key in b:
+                compare(a[key], b[key], f"{path}.{key}")
+        elif isinstance(b, list):
+            test.assertIsInstance(a, list, path)
+            test.assertEqual(len(a), len(b), path)
+            for i, (x, y) in enumerate(zip(a, b)):
+                compare(x, y, f"{path}[{i}]")
+        elif isinstance(b, float):
+            test.assertEqual(np.float32(a), np.float32(b), path)
+        else:
+            test.assertEqual(a, b, path)
+
+    compare(json.loads(written), json.loads(expected))
+
+
+class BinaryRoundTripTest(unittest.TestCase):
+    def test_pose(self):
+        pose = _pose(np.random.default_rng(0))
+        decoded = decode_binary(_body(encode_pose_binary(pose, 7, 12.5)))
+        self.assertEqual((decoded.modality, decoded.frame_id, decoded.timestamp), (MODALITY_POSE, 7, 12.5))
+        np.testing.assert_array_equal(decoded.pose.landmarks.data, pose.landmarks.data)
+        np.testing.assert_array_equal(decoded.pose.landmarks.world, pose.landmarks.world)
+        np.testing.assert_array_equal(decoded.pose.depth.per_landmark_z, pose.depth.per_landmark_z)
+        self.assertEqual(decoded.pose.depth.mode, "pose_world")
+        self.assertAlmostEqual(decoded.pose.depth.global_z, 1.5)
+
+    def test_no_pose(self):
+        decoded = decode_binary(_body(encode_pose_binary(None, 1, 0.0)))
+        self.assertIsNone(decoded.pose)
+
+    def test_hands(self):
+        hands = _hands(np.random.default_rng(1))
+        decoded = decode_binary(_body(encode_hands_binary(hands, 3, 1.0)))
+        self.assertEqual(decoded.modality, MODALITY_HAND)
+        self.assertEqual([hand.handedness for hand in decoded.hands], ["Left", "Right"])
+        for sent, received in zip(hands, decoded.hands):
+            np.testing.assert_array_equal(received.landmarks.data, sent.landmarks.data)
+            np.testing.assert_array_equal(received.landmarks.world, sent.landmarks.world)
+            np.testing.assert_array_equal(received.depth.per_landmark_z, sent.depth.per_landmark_z)
+
+    def test_faces(self):
+        rng = np.random.default_rng(2)
+        face, scores = _face(rng), rng.random(52, dtype=np.float32)
+        decoded = decode_binary(_body(encode_faces_binary([face], [scores], 9, 2.0)))
+        self.assertEqual(decoded.modality, MODALITY_FACE)
+        np.testing.assert_array_equal(decoded.faces[0].landmarks.data, face.landmarks.data)
+        self.assertIsNone(decoded.faces[0].landmarks.world)
+        self.assertEqual(decoded.faces[0].face_pose, face.face_pose)
+        np.testing.assert_array_equal(decoded.blendshapes[0], scores)
+
+
+class JsonWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(6)
+
+    def _tiny(self, lms: LandmarkArray) -> LandmarkArray:
+        # Values %.6f would have written as 0.000000
+        lms.data[0, :3] = (3e-7, -4.5e-8, 1.25e-12)
+        return lms
+
+    def test_pose(self):
+        pose = _pose(self.rng)
+        self._tiny(pose.landmarks)
+        written = encode_pose_json(pose, 5, 1760000000.123456, "heavy")
+        expected = encode_json({**pose.to_payload(), "seq": 5, "timestamp": 1760000000.123456, "quality": "heavy"})
+        _assert_same_json(self, written, expected)
+        self.assertIn(b'"timestamp": 1760000000.123456', written)
+        self.assertEqual(np.float32(json.loads(written)["landmarks"][0]["x"]), np.float32(3e-7))
+
+    def test_pose_fields(self):
+        pose = _pose(self.rng)
+        fields = frozenset({"world_landmarks", "depth"})
+        payload = pose.to_payload()
+        del payload["landmarks"]
+        del payload["depth"]["per_landmark_z"]
+        _assert_same_json(self, encode_pose_json(pose, 1, 2.0, fields=fields),
+                          encode_json({**payload, "seq": 1, "timestamp": 2.0}))
+
+    def test_hands(self):
+        hands = _hands(self.rng)
+        self._tiny(hands[1].landmarks)
+        _assert_same_json(self, encode_hands_json(hands, 2, 3.5),
+                          encode_json({"seq": 2, "timestamp": 3.5, "hands": [hand.to_payload() for hand in hands]}))
+        _assert_same_json(self, encode_hands_json([], 3, 4.0), encode_json({"seq": 3, "timestamp": 4.0, "hands": []}))
+
+    def test_faces(self):
+        faces = [_face(self.rng), _face(self.rng)]
+        self._tiny(faces[0].landmarks)
+        faces[1].face_pose = None
+        scores = [self.rng.random(52, dtype=np.float32), self.rng.random(52, dtype=np.float32)]
+        names = [FACE_BLENDSHAPE_NAMES] * 2
+        expected = encode_json({
+            "seq": 4, "timestamp": 5.0,
+            "faces": [face.to_payload() for face in faces],
+            "blendshapes": [dict(zip(n, s.tolist())) for n, s in zip(names, scores)],
+            "depth_debug": [face.pose_dict() for face in faces if face.face_pose is not None],
+        })
+        _assert_same_json(self, encode_faces_json(faces, names, scores, 4, 5.0), expected)
+
+    def test_non_finite_falls_back_to_encode_json(self):
+        pose = _pose(self.rng)
+        pose.landmarks.data[3, 0] = np.nan
+        expected = encode_json({**pose.to_payload(), "seq": 1, "timestamp": 2.0})
+        self.assertEqual(encode_pose_json(pose, 1, 2.0), expected)
+
+
+class DeltaRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.pose = _pose(np.random.default_rng(3))
+        self.encoder = DeltaEncoder(MODALITY_POSE, keyframe_interval=100)
+        self.decoder = DeltaDecoder()
+
+    def test_keyframe_delta_forced_keyframe(self):
+        frame = self.encoder.encode_pose(self.pose, 1, 0.0)
+        self.assertEqual(_delta_kind(frame), DELTA_KIND_KEYFRAME)
+        decoded = self.decoder.decode(_body(frame))
+        np.testing.assert_array_equal(decoded.pose.landmarks.data, self.pose.landmarks.data)
+
+        moved = _moved(self.pose, [11, 12], 0.01)
+        frame = self.encoder.encode_pose(moved, 2, 0.033)
+        self.assertEqual(_delta_kind(frame), DELTA_KIND_DELTA)
+        self.assertLess(len(frame), len(encode_pose_binary(moved, 2, 0.033)) // 4)
+        decoded = self.decoder.decode(_body(frame))
+        self.assertEqual(decoded.frame_id, 2)
+        np.testing.assert_allclose(decoded.pose.landmarks.data, moved.landmarks.data, atol=DELTA_RESOLUTION)
+        np.testing.assert_allclose(decoded.pose.landmarks.world, moved.landmarks.world, atol=DELTA_RESOLUTION)
+
+        self.encoder.request_keyframe()
+        frame = self.encoder.encode_pose(moved, 3, 0.066)
+        self.assertEqual(_delta_kind(frame), DELTA_KIND_KEYFRAME)
+        decoded = self.decoder.decode(_body(frame))
+        np.testing.assert_array_equal(decoded.pose.landmarks.data, moved.landmarks.data)
+
+    def test_deadband_skips_still_landmarks(self):
+        self.encoder.encode_pose(self.pose, 1, 0.0)
+        still = self.encoder.encode_pose(self.pose, 2, 0.033)
+        moved = self.encoder.encode_pose(_moved(self.pose, [0], 0.01), 3, 0.066)
+        self.assertEqual(_delta_kind(still), DELTA_KIND_DELTA)
+        self.assertLess(len(still), len(moved))
+
+    def test_delta_without_its_keyframe_is_ignored(self):
+        self.encoder.encode_pose(self.pose, 1, 0.0)
+        frame = self.encoder.encode_pose(_moved(self.pose, [0], 0.01), 2, 0.033)
+        self.assertIsNone(self.decoder.decode(_body(frame)))
+
+    def test_large_move_falls_back_to_keyframe(self):
+        self.encoder.encode_pose(self.pose, 1, 0.0)
+        frame = self.encoder.encode_pose(_moved(self.pose, [0], 5.0), 2, 0.033)
+        self.assertEqual(_delta_kind(frame), DELTA_KIND_KEYFRAME)
+
+    def test_faces_and_hands(self):
+        rng = np.random.default_rng(4)
+        face, scores = _face(rng), rng.random(52, dtype=np.float32)
+        encoder, decoder = DeltaEncoder(MODALITY_FACE), DeltaDecoder()
+        decoded = decoder.decode(_body(encoder.encode_faces([face], [scores], 1, 0.0)))
+        np.testing.assert_array_equal(decoded.faces[0].landmarks.data, face.landmarks.data)
+        np.testing.assert_array_equal(decoded.blendshapes[0], scores)
+        self.assertEqual(decoded.faces[0].face_pose, face.face_pose)
+
+        hands = _hands(rng)
+        encoder, decoder = DeltaEncoder(MODALITY_HAND), DeltaDecoder()
+        decoded = decoder.decode(_body(encoder.encode_hands(hands, 1, 0.0)))
+        self.assertEqual([hand.handedness for hand in decoded.hands], ["Left", "Right"])
+        np.testing.assert_array_equal(decoded.hands[1].landmarks.world, hands[1].landmarks.world)
+
+
+class UdpReassemblyTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.frames = [encode_faces_binary([_face(rng)], [], seq, float(seq)) for seq in range(1, 4)]
+        self.datagrams = [udp_datagrams(frame, seq, float(seq)) for seq, frame in enumerate(self.frames, 1)]
+
+    def test_chunking(self):
+        self.assertGreater(len(self.datagrams[0]), 1)
+        self.assertTrue(all(len(d) <= UDP_MAX_DATAGRAM for d in self.datagrams[0]))
+
+    def test_reordered_chunks(self):
+        assembler = UdpFrameAssembler()
+        chunks = self.datagrams[0]
+        results = [assembler.add(d) for d in reversed(chunks)]
+        self.assertTrue(all(r is None for r in results[:-1]))
+        self.assertEqual(results[-1], (1, 1.0, self.frames[0]))
+
+    def test_lost_chunk_abandons_frame(self):
+        assembler = UdpFrameAssembler()
+        for d in self.datagrams[0][1:]:
+            self.assertIsNone(assembler.add(d))
+        completed = [r for r in map(assembler.add, self.datagrams[1]) if r is not None]
+        self.assertEqual(completed, [(2, 2.0, self.frames[1])])
+        self.assertEqual(assembler.frames_lost, 1)
+
+    def test_stale_and_duplicate_chunks_are_dropped(self):
+        assembler = UdpFrameAssembler()
+        for d in self.datagrams[1]:
+            assembler.add(d)
+        self.assertTrue(all(assembler.add(d) is None for d in self.datagrams[0]))
+        self.assertTrue(all(assembler.add(d) is None for d in self.datagrams[1]))
+
+    def test_late_chunks_of_an_older_frame_are_dropped(self):
+        assembler = UdpFrameAssembler()
+        first, *rest = self.datagrams[1]
+        arrivals = [first] + self.datagrams[2] + rest
+        completed = [r for r in map(assembler.add, arrivals) if r is not None]
+        self.assertEqual(completed, [(3, 3.0, self.frames[2])])
+        self.assertEqual(assembler.frames_lost, 1)
+
+    def test_sequence_wraps_around(self):
+        assembler = UdpFrameAssembler()
+        frame = self.frames[0]
+        self.assertIsNotNone([assembler.add(d) for d in udp_datagrams(frame, 0xFFFFFFFF, 0.0)][-1])
+        self.assertEqual([assembler.add(d) for d in udp_datagrams(frame, 0x100000000, 1.0)][-1][0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+# video_stream.py
+from __future__ import annotations
+
+import collections
+import threading
+import time
+from typing import Any, Iterator, Mapping, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from metrics import metrics
+from pipeline import FrameChannel
+
+DEFAULT_JPEG_QUALITY = 95   # same as cv2.imencode default
+MAX_CACHED_VARIANTS = 4     # distinct (scale, quality) encodings kept per frame
+SNAPSHOT_DEMAND = 2.0       # seconds a /snapshot keeps annotation running, for pollers
+SNAPSHOT_WAIT = 1.0         # seconds a /snapshot waits for a freshly annotated frame
+
+Variant = Tuple[float, int]
+
+
+def variant_from_args(args: Mapping[str, Any]) -> Variant:
+    """
+    Reads optional ?scale=0.5&quality=60 query parameters.
+    Values are clamped and rounded so similar requests share one cached encoding.
+    """
+    try:
+        scale = float(args.get("scale", 1.0))
+    except (TypeError, ValueError):
+        scale = 1.0
+    try:
+        quality = int(args.get("quality", DEFAULT_JPEG_QUALITY))
+    except (TypeError, ValueError):
+        quality = DEFAULT_JPEG_QUALITY
+    scale = round(min(1.0, max(0.1, scale)), 2)
+    quality = min(100, max(10, quality))
+    return scale, quality
+
+
+class JpegBroadcaster:
+    """
+    Shares JPEG-encoded frames between every /video_feed viewer and /snapshot.
+
+    publish() only stores a reference to the annotated BGR frame, so the capture
+    loop never pays for encoding. Each frame is encoded at most once per
+    requested variant (scale, quality), on the first viewer thread that needs
+    it; every other viewer gets the same bytes.
+
+    has_viewers tells the server whether annotating frames is worth it at all:
+    true while an mjpeg_stream() is being consumed and for SNAPSHOT_DEMAND
+    seconds after a snapshot_jpeg().
+    """
+
+    def __init__(self, max_variants: int = MAX_CACHED_VARIANTS, stream: str = ""):
+        self.stream = stream    # label on /metrics
+        self._frames = FrameChannel()
+        self._max_variants = max_variants
+        self._encode_lock = threading.Lock()
+        self._cache_seq = 0
+        self._cache: "collections.OrderedDict[Variant, bytes]" = collections.OrderedDict()
+        self._viewers = 0
+        self._viewers_lock = threading.Lock()
+        self._demand_until = 0.0
+
+    @property
+    def has_viewers(self) -> bool:
+        return self._viewers > 0 or time.monotonic() < self._demand_until
+
+    def publish(self, frame_bgr: np.ndarray) -> int:
+        return self._frames.publish(frame_bgr)
+
+    def latest_jpeg(self, variant: Variant = (1.0, DEFAULT_JPEG_QUALITY)) -> Tuple[int, Optional[bytes]]:
+        seq, frame = self._frames.latest()
+        if frame is None:
+            return seq, None
+        return seq, self._encode(seq, frame, variant)
+
+    def snapshot_jpeg(self, variant: Variant = (1.0, DEFAULT_JPEG_QUALITY)) -> Tuple[int, Optional[bytes]]:
+        """
+        Latest frame for a one-off request. Frames are not annotated without
+        viewers, so this asks for them and waits briefly for a fresh one,
+        falling back to the last frame published (possibly stale, or None).
+        """
+        self._demand_until = max(self._demand_until, time.monotonic() + SNAPSHOT_DEMAND)
+        seq, _ = self._frames.latest()
+        fresh_seq, frame_bytes = self.wait_jpeg(seq, variant, timeout=SNAPSHOT_WAIT)
+        if frame_bytes is not None:
+            return fresh_seq, frame_bytes
+        return self.latest_jpeg(variant)
+
+    def wait_jpeg(
+        self,
+        last_seq: int,
+        variant: Variant = (1.0, DEFAULT_JPEG_QUALITY),
+        timeout: Optional[float] = None,
+    ) -> Tuple[int, Optional[bytes]]:
+        """
+        Blocks until a frame newer than `last_seq` is published.
+        Returns (seq, jpeg_bytes); jpeg_bytes is None on timeout.
+        """
+        seq, frame = self._frames.wait(last_seq, timeout)
+        if seq == last_seq or frame is None:
+            return seq, None
+        return seq, self._encode(seq, frame, variant)
+
+    def mjpeg_stream(self, variant: Variant = (1.0, DEFAULT_JPEG_QUALITY)) -> Iterator[bytes]:
+        """Multipart chunks for a multipart/x-mixed-replace; boundary=frame response."""
+        with self._viewers_lock:
+            self._viewers += 1
+        try:
+            last_seq = 0
+            while True:
+                last_seq, frame_bytes = self.wait_jpeg(last_seq, variant)
+                if frame_bytes is None:
+                    continue
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        finally:
+            # The WSGI server closes the generator when the viewer disconnects
+            with self._viewers_lock:
+                self._viewers -= 1
+
+    def _encode(self, seq: int, frame: np.ndarray, variant: Variant) -> bytes:
+        with self._encode_lock:
+            if seq != self._cache_seq:
+                if seq < self._cache_seq:
+                    # A newer frame is already cached; the caller is late, serve it uncached
+                    return self._encode_variant(frame, variant)
+                self._cache_seq = seq
+                self._cache.clear()
+
+            jpeg = self._cache.get(variant)
+            if jpeg is None:
+                jpeg = self._encode_variant(frame, variant)
+                self._cache[variant] = jpeg
+                while len(self._cache) > self._max_variants:
+                    self._cache.popitem(last=False)
+            return jpeg
+
+    def _encode_variant(self, frame: np.ndarray, variant: Variant) -> bytes:
+        scale, quality = variant
+        with metrics.timer("jpeg_encode", self.stream):
+            if scale < 1.0:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        return buffer.tobytes() if ok else b""
@@ -0,0 +1,178 @@
+# websocket_stream.py
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import replace
+from typing import Any, Callable, List, Mapping, Optional, Set
+
+from flask import request
+
+from metrics import metrics
+from pipeline import FrameChannel
+from subscription import Subscription, parse_subscription, subscription_info
+from wire_protocol import ENCODING_BINARY, ENCODING_JSON, LENGTH_PREFIX, encode_info
+
+try:
+    from flask_sock import Sock
+except ImportError:     # optional: pip install flask-sock
+    Sock = None
+
+# Landmark frames over WebSocket, on the Flask app (and port) that already
+# serves /video_feed, for browser dashboards and WebXR pages:
+#
+#   ws://<host>:5000/landmarks?encoding=binary&max_rate=15
+#
+#   encoding  "json" (default): text messages, the JSON objects of the TCP stream
+#             "binary": binary messages, one wire_protocol.py binary frame each
+#             (without the 4-byte length prefix, WebSocket frames messages itself)
+#   max_rate  frames per second for this connection, newest frame wins (default: every frame)
+#
+# plus the other subscription.py options as comma-separated lists, e.g.
+# ?subset=lips,eyes&fields=landmarks. Frames are the ones the TCP / UDP
+# servers send: each is encoded once per subscribed view in use and the same
+# payload goes to every connection with that view.
+
+WEBSOCKET_ENCODINGS = (ENCODING_JSON, ENCODING_BINARY)
+IDLE_CHECK = 1.0        # seconds between connection checks while no frames arrive
+
+_missing_warned = False
+
+
+class _WsClient:
+    def __init__(self, addr: str, subscription: Subscription):
+        self.addr = addr
+        self.subscription = subscription
+        self.frames_sent = 0
+
+
+class WebSocketStreamServer:
+    """
+    Landmark fan-out to WebSocket connections, with the publish() /
+    client_count API of LandmarkStreamServer so it can join a
+    StreamServerGroup. Each connection runs serve() on its own Flask request
+    thread and sends the newest published frame, at most at its max_rate.
+    """
+
+    def __init__(self, stream: str = "", name: str = "WebSocket", modality: Optional[int] = None):
+        self.stream = stream    # label on /metrics
+        self.name = name
+        self.modality = modality    # wire_protocol.MODALITY_*, resolves named landmark subsets
+        self._frames = FrameChannel()
+        self._clients: List[_WsClient] = []
+        self._clients_lock = threading.Lock()
+
+    def start(self) -> None:
+        metrics.add_collector(
+            "websocket_clients", "gauge", "Connected landmark WebSocket clients.",
+            lambda: [({"stream": self.stream}, self.client_count)])
+
+    @property
+    def client_count(self) -> int:
+        with self._clients_lock:
+            return len(self._clients)
+
+    @property
+    def subscriptions(self) -> Set[Subscription]:
+        with self._clients_lock:
+            return {client.subscription for client in self._clients}
+
+    def take_keyframe_request(self, encoding: str) -> bool:
+        return False    # no stateful encodings over WebSocket
+
+    def publish(self, encode: Callable[[Subscription], Optional[bytes]], capture_time: Optional[float] = None) -> int:
+        """Encodes the frame once per subscribed view in use and wakes every connection."""
+        with self._clients_lock:
+            views = {client.subscription for client in self._clients}
+            count = len(self._clients)
+        if not count:
+            return 0
+        payloads = {}
+        for view in views:
+            with metrics.timer(f"encode_{view.encoding}", self.stream):
+                data = encode(view)
+            if data:
+                payloads[view] = _message(view.encoding, data)
+        self._frames.publish((payloads, capture_time))
+        return count
+
+    def serve(self, ws: Any, args: Mapping[str, Any]) -> None:
+        """Sends frames to one connection until it closes."""
+        subscription = parse_subscription(args, self.modality)
+        if subscription.encoding not in WEBSOCKET_ENCODINGS:
+            subscription = replace(subscription, encoding=ENCODING_JSON)
+        client = _WsClient(request.remote_addr or "?", subscription)
+        with self._clients_lock:
+            self._clients.append(client)
+        print(f"[{self.name}] Connected by {client.addr} ({subscription.describe()})")
+
+        last_seq, _ = self._frames.latest()
+        last_sent = 0.0
+        try:
+            if not subscription.full:
+                # ?max_rate predates subscriptions; only narrowed views are announced
+                ws.send(_message(subscription.encoding,
+                                 encode_info(subscription_info(subscription), subscription.encoding)))
+            while ws.connected:
+                seq, frame = self._frames.wait(last_seq, IDLE_CHECK)
+                if seq == last_seq:
+                    continue
+                pause = subscription.min_interval - (time.monotonic() - last_sent)
+                if pause > 0:
+                    # Rate limited: send whatever is newest once the interval is up
+                    time.sleep(pause)
+                    seq, frame = self._frames.latest()
+                last_seq = seq
+                payloads, capture_time = frame
+                data = payloads.get(subscription)
+                if data is None:
+                    continue    # published before this connection's view was in use
+                with metrics.timer("send", self.stream):
+                    ws.send(data)
+                last_sent = time.monotonic()
+                client.frames_sent += 1
+                if capture_time is not None:
+                    metrics.observe("capture_to_send_seconds", time.time() - capture_time, stream=self.stream)
+        except Exception:
+            pass    # connection closed while sending
+        finally:
+            with self._clients_lock:
+                self._clients.remove(client)
+            print(f"[{self.name}] Disconnected from {client.addr} (sent {client.frames_sent})")
+
+
+def _message(encoding: str, data: bytes) -> Any:
+    # JSON as a text message without the newline, binary without the length prefix
+    if encoding == ENCODING_JSON:
+        return bytes(data).rstrip(b"\n").decode("utf-8")
+    return bytes(data[LENGTH_PREFIX.size:])
+
+
+def add_websocket_route(
+    app: Any,
+    route: str,
+    select: Callable[[Mapping[str, Any]], Optional[WebSocketStreamServer]],
+) -> bool:
+    """
+    Registers a WebSocket `route` on the Flask `app`; `select(request.args)`
+    picks the server for a connection (None refuses it). Returns False, with a
+    one-time notice, when flask-sock is not installed.
+    """
+    global _missing_warned
+    if Sock is None:
+        if not _missing_warned:
+            print(f"[WebSocket] flask-sock is not installed, {route} is disabled (pip install flask-sock)")
+            _missing_warned = True
+        return False
+
+    sock = Sock(app)
+
+    @sock.route(route)
+    def landmarks(ws):
+        server = select(request.args)
+        if server is None:
+            ws.close(reason=1008, message="Unknown stream")
+            return
+        server.serve(ws, request.args)
+
+    return True
@@ -0,0 +1,997 @@
+# wire_protocol.py
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from depth_module import DepthFrame, FaceFrame, HandFrame, LandmarkArray, PoseFrame
+
+
+# ---------------------------------------------------------------------------
+# Connection handshake
+# ---------------------------------------------------------------------------
+# Right after connecting, a client may send ONE line of JSON describing how it
+# wants to be served, e.g.
+#
+#     {"encoding": "binary"}\n       (or "delta", see the end of this file)
+#
+# Clients that send nothing (the existing Unity StreamClient) keep receiving
+# newline-delimited JSON, exactly as before. The first byte decides: JSON
+# frames start right away (after HELLO_GRACE, the hello's trip over the
+# network), and a hello switches the client only if it arrives before the
+# first frame went out. A hello must be sent at once, not after reading; one
+# that arrives later closes the connection, so the client reconnects instead
+# of reading JSON as binary frames.
+
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+ENCODING_DELTA = "delta"
+
+ENCODINGS = (ENCODING_JSON, ENCODING_BINARY, ENCODING_DELTA)
+
+HELLO_GRACE = 0.02          # seconds a new client's first frame waits for a hello (the only delay JSON clients see)
+HELLO_TIMEOUT = 0.25        # seconds to finish a hello line once its first byte arrived
+HELLO_MAX_BYTES = 4096
+
+
+def parse_hello(line: bytes) -> Dict[str, Any]:
+    """
+    Parses the hello line a client sent right after connecting.
+    Returns {} for an empty or malformed line.
+    """
+    line = line.strip()
+    if not line:
+        return {}
+    try:
+        hello = json.loads(line.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        print(f"[Socket] Ignoring malformed hello: {line[:64]!r}")
+        return {}
+    return hello if isinstance(hello, dict) else {}
+
+
+def hello_encoding(hello: Dict[str, Any]) -> str:
+    encoding = str(hello.get("encoding", ENCODING_JSON)).lower()
+    return encoding if encoding in ENCODINGS else ENCODING_JSON
+
+
+# ---------------------------------------------------------------------------
+# Newline JSON
+# ---------------------------------------------------------------------------
+
+def encode_json(payload: Dict[str, Any]) -> bytes:
+    return (json.dumps(payload) + "\n").encode("utf-8")
+
+
+# Fixed-schema writers for the landmark frames. They produce the same objects,
+# keys, key order and separators as encode_json() on the servers' payload
+# dicts, so Unity parses them unchanged, but skip building those dicts: each
+# frame is one bytes %-format of a template cached per frame shape, filled
+# from the landmark arrays. Values of the float32 arrays are written as %.9g,
+# which reads back as the same float32 (json.dumps writes 17 digits of their
+# float64 value); timestamps, global_z and the face pose are written exactly
+# as json.dumps writes them. Frames holding NaN / inf fall back to
+# encode_json(), which writes them the way it always has.
+
+_JSON_FLOAT = b"%.9g"
+_JSON_LANDMARK = b'{"x": %.9g, "y": %.9g, "z": %.9g, "visibility": %.9g}'
+_JSON_CACHE_SIZE = 256      # distinct frame shapes (templates) kept
+
+_json_templates: Dict[Any, bytes] = {}
+
+
+def _json_string(value: str) -> bytes:
+    # A literal inside a %-template
+    return json.dumps(value).encode("utf-8").replace(b"%", b"%%")
+
+
+def _json_list(item: bytes, count: int) -> bytes:
+    return b"[" + b", ".join([item] * count) + b"]"
+
+
+def _json_depth(count: Optional[int]) -> bytes:
+    if count is None:
+        return b'{"mode": %s, "global_z": %r}'
+    return b'{"mode": %s, "global_z": %r, "per_landmark_z": ' + _json_list(_JSON_FLOAT, count) + b"}"
+
+
+def _wants(fields: Optional[FrozenSet[str]], name: str) -> bool:
+    return fields is None or name in fields
+
+
+def _json_template(key: Any, build) -> bytes:
+    template = _json_templates.get(key)
+    if template is None:
+        if len(_json_templates) >= _JSON_CACHE_SIZE:
+            _json_templates.clear()
+        template = _json_templates[key] = build()
+    return template
+
+
+def _all_finite(*arrays: Optional[np.ndarray]) -> bool:
+    return all(a is None or bool(np.isfinite(a).all()) for a in arrays)
+
+
+def _landmark_members(n: int, m: Optional[int], z: int, fields: Optional[FrozenSet[str]]) -> List[bytes]:
+    # "landmarks", "world_landmarks" (m is None: no such key) and "depth" template members
+    members = []
+    if _wants(fields, "landmarks"):
+        members.append(b'"landmarks": ' + _json_list(_JSON_LANDMARK, n))
+    if m is not None and _wants(fields, "world_landmarks"):
+        members.append(b'"world_landmarks": ' + _json_list(_JSON_LANDMARK, m))
+    if _wants(fields, "depth"):
+        members.append(b'"depth": ' + _json_depth(z if _wants(fields, "per_landmark_z") else None))
+    return members
+
+
+def _landmark_values(values: List[Any], lms: LandmarkArray, world: bool, depth: DepthFrame,
+                     fields: Optional[FrozenSet[str]] = None) -> None:
+    # Fills the _landmark_members() placeholders, in the same order
+    if _wants(fields, "landmarks"):
+        values.extend(lms.data.ravel().tolist())
+    if world and _wants(fields, "world_landmarks") and lms.world is not None:
+        values.extend(lms.world.ravel().tolist())
+    if _wants(fields, "depth"):
+        values.append(json.dumps(depth.mode).encode("utf-8"))
+        values.append(float(depth.global_z))
+        if _wants(fields, "per_landmark_z"):
+            values.extend(depth.per_landmark_z.tolist())
+
+
+def _select_payload(payload: Dict[str, Any], fields: Optional[FrozenSet[str]]) -> Dict[str, Any]:
+    # The dict-path counterpart of _landmark_members() for one item
+    if fields is None:
+        return payload
+    for name in ("landmarks", "world_landmarks", "depth", "face_pose"):
+        if name in payload and name not in fields:
+            del payload[name]
+    if "depth" in payload and "per_landmark_z" not in fields:
+        payload["depth"] = {k: v for k, v in payload["depth"].items() if k != "per_landmark_z"}
+    return payload
+
+
+def encode_pose_json(frame: PoseFrame, seq: int, timestamp: float, quality: Optional[str] = None,
+                     fields: Optional[FrozenSet[str]] = None) -> bytes:
+    """
+    Bytes of encode_json({**frame.to_payload(), 'seq', 'timestamp'[, 'quality']}).
+    `fields` (see subscription.py) leaves out the members not in it.
+    """
+    lms, depth = frame.landmarks, frame.depth
+    if not _all_finite(lms.data, lms.world, depth.per_landmark_z, np.float64(depth.global_z)):
+        payload = _select_payload(frame.to_payload(), fields)
+        payload["seq"] = seq
+        payload["timestamp"] = timestamp
+        if quality is not None:
+            payload["quality"] = quality
+        return encode_json(payload)
+
+    world_count = len(lms.world) if lms.world is not None else 0
+    key = ("pose", len(lms), world_count, len(depth.per_landmark_z), quality is not None, fields)
+    template = _json_template(key, lambda: (
+        b"{" + b", ".join(_landmark_members(len(lms), world_count, len(depth.per_landmark_z), fields)
+                          + [b'"seq": %d, "timestamp": %r']
+                          + ([b'"quality": %s'] if quality is not None else []))
+        + b"}\n"))
+    values: List[Any] = []
+    _landmark_values(values, lms, True, depth, fields)
+    values.append(seq)
+    values.append(float(timestamp))
+    if quality is not None:
+        values.append(json.dumps(quality).encode("utf-8"))
+    return template % tuple(values)
+
+
+def encode_hands_json(hands: Sequence[HandFrame], seq: int, timestamp: float,
+                      fields: Optional[FrozenSet[str]] = None) -> bytes:
+    """
+    Bytes of encode_json({'seq', 'timestamp', 'hands': [hand.to_payload(), ...]}).
+    `fields` (see subscription.py) leaves out the members not in it.
+    """
+    if not all(_all_finite(h.landmarks.data, h.landmarks.world, h.depth.per_landmark_z, np.float64(h.depth.global_z))
+               for h in hands):
+        return encode_json({"seq": seq, "timestamp": timestamp,
+                            "hands": [_select_payload(hand.to_payload(), fields) for hand in hands]})
+
+    shapes = tuple(
+        (len(h.landmarks), len(h.landmarks.world) if h.landmarks.world is not None else 0, len(h.depth.per_landmark_z))
+        for h in hands)
+    template = _json_template(("hand", shapes, fields), lambda: (
+        b'{"seq": %d, "timestamp": %r, "hands": ['
+        + b", ".join(
+            b"{" + b", ".join([b'"handedness": %s'] + _landmark_members(n, m, z, fields)) + b"}"
+            for n, m, z in shapes)
+        + b"]}\n"))
+    values: List[Any] = [seq, float(timestamp)]
+    for hand in hands:
+        values.append(json.dumps(hand.handedness).encode("utf-8"))
+        _landmark_values(values, hand.landmarks, True, hand.depth, fields)
+    return template % tuple(values)
+
+
+def encode_faces_json(
+    faces: Sequence[FaceFrame],
+    blendshape_names: Sequence[Sequence[str]],
+    blendshapes: Sequence[np.ndarray],
+    seq: int,
+    timestamp: float,
+    fields: Optional[FrozenSet[str]] = None,
+) -> bytes:
+    """
+    Bytes of the face server's JSON frame: seq, timestamp, faces, blendshapes
+    (one {name: score} object per face, names in the order given) and
+    depth_debug. `fields` (see subscription.py) leaves out the members not in it.
+    """
+    with_pose = _wants(fields, "face_pose")
+    with_blendshapes = _wants(fields, "blendshapes")
+    with_debug = _wants(fields, "depth_debug")
+    finite = all(_all_finite(f.landmarks.data, f.depth.per_landmark_z, np.float64(f.depth.global_z),
+                             np.asarray(f.face_pose if f.face_pose is not None else (), dtype=np.float64))
+                 for f in faces) and _all_finite(*blendshapes)
+    if not finite:
+        payload = {
+            "seq": seq,
+            "timestamp": timestamp,
+            "faces": [_select_payload(face.to_payload(), fields) for face in faces],
+            "blendshapes": [dict(zip(names, scores.tolist())) for names, scores in zip(blendshape_names, blendshapes)],
+            "depth_debug": [face.pose_dict() for face in faces if face.face_pose is not None],
+        }
+        if not with_blendshapes:
+            del payload["blendshapes"]
+        if not with_debug:
+            del payload["depth_debug"]
+        return encode_json(payload)
+
+    face_shapes = tuple((len(f.landmarks), len(f.depth.per_landmark_z), f.face_pose is not None) for f in faces)
+    names_key = tuple(tuple(names) for names in blendshape_names) if with_blendshapes else ()
+    pose_object = b'{"tx": %r, "ty": %r, "tz": %r}'
+
+    def build() -> bytes:
+        faces_json = b", ".join(
+            b"{" + b", ".join(
+                _landmark_members(n, None, z, fields)
+                + ([b'"face_pose": ' + (pose_object if has_pose else b"null")] if with_pose else []))
+            + b"}"
+            for n, z, has_pose in face_shapes)
+        members = [b'"seq": %d, "timestamp": %r', b'"faces": [' + faces_json + b"]"]
+        if with_blendshapes:
+            members.append(b'"blendshapes": [' + b", ".join(
+                b"{" + b", ".join(_json_string(name) + b": " + _JSON_FLOAT for name in names) + b"}"
+                for names in names_key) + b"]")
+        if with_debug:
+            members.append(b'"depth_debug": [' + b", ".join(
+                pose_object for _, _, has_pose in face_shapes if has_pose) + b"]")
+        return b"{" + b", ".join(members) + b"}\n"
+
+    template = _json_template(("face", face_shapes, names_key, fields), build)
+    values: List[Any] = [seq, float(timestamp)]
+    for face in faces:
+        _landmark_values(values, face.landmarks, False, face.depth, fields)
+        if with_pose and face.face_pose is not None:
+            values.extend(map(float, face.face_pose))
+    if with_blendshapes:
+        for scores in blendshapes[:len(names_key)]:
+            values.extend(scores.tolist())
+    if with_debug:
+        for face in faces:
+            if face.face_pose is not None:
+                values.extend(map(float, face.face_pose))
+    return template % tuple(values)
+
+
+# ---------------------------------------------------------------------------
+# Binary framing
+# ---------------------------------------------------------------------------
+# All values are little-endian.
+#
+#   uint32  body_length                      (bytes that follow)
+#   header  : uint8 version, uint8 modality, uint16 item_count,
+#             uint32 frame_id, float64 timestamp (seconds, time.time())
+#   item_count x item:
+#       uint16 n_landmarks, uint16 n_world, uint16 n_blendshapes,
+#       uint8 depth_mode, uint8 flags, float32 global_z
+#       float32[n_landmarks * 4]  landmarks        (x, y, z, visibility)
+#       float32[n_world * 4]      world_landmarks  (x, y, z, visibility)
+#       float32[n_landmarks]      per_landmark_z
+#       float32[n_blendshapes]    blendshape scores (MediaPipe category order)
+#       float32[3]                face_pose tx, ty, tz   (only if FLAG_FACE_POSE)
+#
+# flags: bits 0-1 handedness (0 unknown, 1 left, 2 right), bit 2 face_pose present.
+
+PROTOCOL_VERSION = 1
+
+LENGTH_PREFIX = struct.Struct("<I")
+FRAME_HEADER = struct.Struct("<BBHId")
+ITEM_HEADER = struct.Struct("<HHHBBf")
+
+MODALITY_POSE = 0
+MODALITY_HAND = 1
+MODALITY_FACE = 2
+
+DEPTH_MODES = {
+    "pose_world": 0,
+    "pose_face_abs": 1,
+    "hand_world": 2,
+    "face_transform_plus_local": 3,
+}
+
+HANDEDNESS_CODES = {"Left": 1, "Right": 2}
+HANDEDNESS_NAMES = {code: name for name, code in HANDEDNESS_CODES.items()}
+DEPTH_MODE_NAMES = {code: name for name, code in DEPTH_MODES.items()}
+FLAG_FACE_POSE = 0x04
+
+# Blendshape categories in the order face_landmarker.task reports them
+FACE_BLENDSHAPE_NAMES = (
+    "_neutral", "browDownLeft", "browDownRight", "browInnerUp", "browOuterUpLeft", "browOuterUpRight",
+    "cheekPuff", "cheekSquintLeft", "cheekSquintRight", "eyeBlinkLeft", "eyeBlinkRight",
+    "eyeLookDownLeft", "eyeLookDownRight", "eyeLookInLeft", "eyeLookInRight", "eyeLookOutLeft",
+    "eyeLookOutRight", "eyeLookUpLeft", "eyeLookUpRight", "eyeSquintLeft", "eyeSquintRight",
+    "eyeWideLeft", "eyeWideRight", "jawForward", "jawLeft", "jawOpen", "jawRight", "mouthClose",
+    "mouthDimpleLeft", "mouthDimpleRight", "mouthFrownLeft", "mouthFrownRight", "mouthFunnel",
+    "mouthLeft", "mouthLowerDownLeft", "mouthLowerDownRight", "mouthPressLeft", "mouthPressRight",
+    "mouthPucker", "mouthRight", "mouthRollLower", "mouthRollUpper", "mouthShrugLower",
+    "mouthShrugUpper", "mouthSmileLeft", "mouthSmileRight", "mouthStretchLeft", "mouthStretchRight",
+    "mouthUpperUpLeft", "mouthUpperUpRight", "noseSneerLeft", "noseSneerRight",
+)
+
+_F32 = np.dtype("<f4")
+_EMPTY = np.zeros(0, dtype=_F32)
+
+
+def blendshape_scores(result: Any) -> List[np.ndarray]:
+    """
+    Per-face blendshape scores as float32 vectors in MediaPipe category order.
+    """
+    face_blendshapes = getattr(result, "face_blendshapes", None)
+    if not face_blendshapes:
+        return []
+    return [
+        np.fromiter((category.score for category in categories), dtype=_F32, count=len(categories))
+        for categories in face_blendshapes
+    ]
+
+
+def _item_chunks(
+    landmarks: np.ndarray,
+    world: Optional[np.ndarray],
+    per_landmark_z: np.ndarray,
+    global_z: float,
+    depth_mode: str,
+    flags: int = 0,
+    blendshapes: Optional[np.ndarray] = None,
+    face_pose: Optional[Sequence[float]] = None,
+) -> List[bytes]:
+    if world is None:
+        world = _EMPTY
+    if blendshapes is None:
+        blendshapes = _EMPTY
+    if face_pose is not None:
+        flags |= FLAG_FACE_POSE
+
+    chunks = [
+        ITEM_HEADER.pack(
+            landmarks.shape[0], world.shape[0], blendshapes.shape[0],
+            DEPTH_MODES.get(depth_mode, 255), flags, global_z),
+        np.ascontiguousarray(landmarks, dtype=_F32).tobytes(),
+        np.ascontiguousarray(world, dtype=_F32).tobytes(),
+        np.ascontiguousarray(per_landmark_z, dtype=_F32).tobytes(),
+        np.ascontiguousarray(blendshapes, dtype=_F32).tobytes(),
+    ]
+    if face_pose is not None:
+        chunks.append(np.asarray(face_pose, dtype=_F32).tobytes())
+    return chunks
+
+
+def _frame(modality: int, frame_id: int, timestamp: float, items: List[List[bytes]]) -> bytes:
+    body = [FRAME_HEADER.pack(PROTOCOL_VERSION, modality, len(items), frame_id & 0xFFFFFFFF, timestamp)]
+    for chunks in items:
+        body.extend(chunks)
+    body_bytes = b"".join(body)
+    return LENGTH_PREFIX.pack(len(body_bytes)) + body_bytes
+
+
+def encode_pose_binary(frame: Optional[PoseFrame], frame_id: int, timestamp: float) -> bytes:
+    items = []
+    if frame is not None:
+        items.append(_item_chunks(
+            frame.landmarks.data, frame.landmarks.world,
+            frame.depth.per_landmark_z, frame.depth.global_z, frame.depth.mode))
+    return _frame(MODALITY_POSE, frame_id, timestamp, items)
+
+
+def encode_hands_binary(hands: Sequence[HandFrame], frame_id: int, timestamp: float) -> bytes:
+    items = [
+        _item_chunks(
+            hand.landmarks.data, hand.landmarks.world,
+            hand.depth.per_landmark_z, hand.depth.global_z, hand.depth.mode,
+            flags=HANDEDNESS_CODES.get(hand.handedness, 0))
+        for hand in hands
+    ]
+    return _frame(MODALITY_HAND, frame_id, timestamp, items)
+
+
+def encode_faces_binary(
+    faces: Sequence[FaceFrame],
+    blendshapes: Sequence[np.ndarray],
+    frame_id: int,
+    timestamp: float,
+) -> bytes:
+    items = [
+        _item_chunks(
+            face.landmarks.data, None,
+            face.depth.per_landmark_z, face.depth.global_z, face.depth.mode,
+            blendshapes=blendshapes[i] if i < len(blendshapes) else None,
+            face_pose=face.face_pose)
+        for i, face in enumerate(faces)
+    ]
+    return _frame(MODALITY_FACE, frame_id, timestamp, items)
+
+
+class BinaryFrame:
+    """
+    A decoded binary frame (see decode_binary), back in depth_module types.
+      pose : PoseFrame or None      hands : List[HandFrame]
+      faces: List[FaceFrame]        blendshapes : per-face float32 scores
+    """
+    __slots__ = ("modality", "frame_id", "timestamp", "pose", "hands", "faces", "blendshapes")
+
+    def __init__(self, modality: int, frame_id: int, timestamp: float):
+        self.modality = modality
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.pose: Optional[PoseFrame] = None
+        self.hands: List[HandFrame] = []
+        self.faces: List[FaceFrame] = []
+        self.blendshapes: List[np.ndarray] = []
+
+
+def read_frame_header(body: Any) -> tuple:
+    """(version, modality, item_count, frame_id, timestamp) of a frame body (after the length prefix)."""
+    return FRAME_HEADER.unpack_from(body, 0)
+
+
+def decode_binary(body: Any) -> BinaryFrame:
+    """Inverse of encode_*_binary; `body` is one frame without its length prefix."""
+    _, modality, item_count, frame_id, timestamp = FRAME_HEADER.unpack_from(body, 0)
+    frame = BinaryFrame(modality, frame_id, timestamp)
+    offset = FRAME_HEADER.size
+
+    def floats(count: int) -> np.ndarray:
+        nonlocal offset
+        values = np.frombuffer(body, dtype=_F32, count=count, offset=offset)
+        offset += count * 4
+        return values
+
+    for _ in range(item_count):
+        n_lm, n_world, n_blend, depth_mode, flags, global_z = ITEM_HEADER.unpack_from(body, offset)
+        offset += ITEM_HEADER.size
+        landmarks = floats(n_lm * 4).reshape(n_lm, 4)
+        world = floats(n_world * 4).reshape(n_world, 4) if n_world else None
+        depth = DepthFrame(DEPTH_MODE_NAMES.get(depth_mode, "unknown"), global_z, floats(n_lm))
+        scores = floats(n_blend)
+        face_pose = tuple(float(v) for v in floats(3)) if flags & FLAG_FACE_POSE else None
+
+        lms = LandmarkArray(landmarks, world)
+        if modality == MODALITY_POSE:
+            frame.pose = PoseFrame(lms, depth)
+        elif modality == MODALITY_HAND:
+            frame.hands.append(HandFrame(HANDEDNESS_NAMES.get(flags & 0x03, "Unknown"), lms, depth))
+        else:
+            frame.faces.append(FaceFrame(lms, depth, face_pose))
+            frame.blendshapes.append(scores)
+    return frame
+
+
+# ---------------------------------------------------------------------------
+# Blendshape frames ("mode": "blendshapes", face server only)
+# ---------------------------------------------------------------------------
+# For avatars driven by the blendshape scores alone. The score order is sent
+# once, as "blendshape_names" in the connection's info message; every frame
+# then carries per face only the scores in that order and the head transform
+# (the top three rows of MediaPipe's 4x4 facial transformation matrix,
+# row-major; the fourth row is always 0 0 0 1).
+#
+#   binary : uint32 body_length
+#            header : uint8 version, uint8 modality (MODALITY_BLENDSHAPES),
+#                     uint8 face_count, uint8 quantized, uint32 frame_id,
+#                     float64 timestamp
+#            face_count x face:
+#                uint8 flags (bit 0: transform present), uint8 n_scores
+#                float32[n_scores] scores, or uint8[n_scores] round(score * 255) if quantized
+#                float32[12] transform   (only if flagged)
+#   json   : {"seq": 1, "timestamp": 2.0, "faces": [{"scores": [...], "transform": [12 floats] | null}]}
+#            with integer 0-255 scores if quantized
+
+MODALITY_BLENDSHAPES = 3
+
+BLENDSHAPE_FRAME_HEADER = struct.Struct("<BBBBId")
+BLENDSHAPE_FACE_HEADER = struct.Struct("<BB")
+FLAG_TRANSFORM = 0x01
+
+_U8 = np.dtype("u1")
+
+
+def head_transforms(result: Any) -> List[Optional[np.ndarray]]:
+    """Per-face (12,) float32 head transforms (see above), None where the model gave none."""
+    matrices = getattr(result, "facial_transformation_matrixes", None) or []
+    transforms: List[Optional[np.ndarray]] = []
+    for matrix in matrices:
+        M = np.asarray(matrix if matrix is not None else (), dtype=_F32)
+        transforms.append(np.ascontiguousarray(M.reshape(4, 4)[:3]).reshape(12) if M.size == 16 else None)
+    return transforms
+
+
+def quantize_scores(scores: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(scores * 255.0), 0, 255).astype(_U8)
+
+
+def encode_blendshapes_binary(
+    blendshapes: Sequence[np.ndarray],
+    transforms: Sequence[Optional[np.ndarray]],
+    frame_id: int,
+    timestamp: float,
+    quantized: bool = False,
+) -> bytes:
+    body = [BLENDSHAPE_FRAME_HEADER.pack(PROTOCOL_VERSION, MODALITY_BLENDSHAPES, len(blendshapes), int(quantized),
+                                         frame_id & 0xFFFFFFFF, timestamp)]
+    for i, scores in enumerate(blendshapes):
+        transform = transforms[i] if i < len(transforms) else None
+        body.append(BLENDSHAPE_FACE_HEADER.pack(FLAG_TRANSFORM if transform is not None else 0, len(scores)))
+        body.append(quantize_scores(scores).tobytes() if quantized else np.ascontiguousarray(scores, dtype=_F32).tobytes())
+        if transform is not None:
+            body.append(transform.tobytes())
+    body_bytes = b"".join(body)
+    return LENGTH_PREFIX.pack(len(body_bytes)) + body_bytes
+
+
+def encode_blendshapes_json(
+    blendshapes: Sequence[np.ndarray],
+    transforms: Sequence[Optional[np.ndarray]],
+    seq: int,
+    timestamp: float,
+    quantized: bool = False,
+) -> bytes:
+    transforms = [transforms[i] if i < len(transforms) else None for i in range(len(blendshapes))]
+    if not _all_finite(*blendshapes, *transforms):
+        return encode_json({"seq": seq, "timestamp": timestamp, "faces": [
+            {"scores": quantize_scores(scores).tolist() if quantized else scores.tolist(),
+             "transform": transform.tolist() if transform is not None else None}
+            for scores, transform in zip(blendshapes, transforms)]})
+
+    shapes = tuple((len(scores), transform is not None) for scores, transform in zip(blendshapes, transforms))
+    score = b"%d" if quantized else _JSON_FLOAT
+    template = _json_template(("blendshapes", shapes, quantized), lambda: (
+        b'{"seq": %d, "timestamp": %r, "faces": ['
+        + b", ".join(
+            b'{"scores": ' + _json_list(score, n)
+            + b', "transform": ' + (_json_list(_JSON_FLOAT, 12) if has_transform else b"null") + b"}"
+            for n, has_transform in shapes)
+        + b"]}\n"))
+    values: List[Any] = [seq, float(timestamp)]
+    for scores, transform in zip(blendshapes, transforms):
+        values.extend(quantize_scores(scores).tolist() if quantized else scores.tolist())
+        if transform is not None:
+            values.extend(transform.tolist())
+    return template % tuple(values)
+
+
+def decode_blendshapes(body: Any) -> Tuple[int, float, List[np.ndarray], List[Optional[np.ndarray]]]:
+    """Inverse of encode_blendshapes_binary: (frame_id, timestamp, scores, transforms); uint8 scores come back / 255."""
+    _, _, face_count, quantized, frame_id, timestamp = BLENDSHAPE_FRAME_HEADER.unpack_from(body, 0)
+    offset = BLENDSHAPE_FRAME_HEADER.size
+    blendshapes: List[np.ndarray] = []
+    transforms: List[Optional[np.ndarray]] = []
+    for _ in range(face_count):
+        flags, count = BLENDSHAPE_FACE_HEADER.unpack_from(body, offset)
+        offset += BLENDSHAPE_FACE_HEADER.size
+        if quantized:
+            blendshapes.append(np.frombuffer(body, dtype=_U8, count=count, offset=offset).astype(_F32) / 255.0)
+            offset += count
+        else:
+            blendshapes.append(np.frombuffer(body, dtype=_F32, count=count, offset=offset))
+            offset += count * 4
+        if flags & FLAG_TRANSFORM:
+            transforms.append(np.frombuffer(body, dtype=_F32, count=12, offset=offset))
+            offset += 48
+        else:
+            transforms.append(None)
+    return frame_id, timestamp, blendshapes, transforms
+
+
+# ---------------------------------------------------------------------------
+# Info messages
+# ---------------------------------------------------------------------------
+# Sent once, before any frame, to clients that subscribed to more than an
+# encoding (see subscription.py), describing what they will receive:
+#
+#   json            {"info": {...}}\n
+#   binary / delta  uint32 body_length, frame header with modality
+#                   MODALITY_INFO and item_count 0, then the info object as
+#                   UTF-8 JSON
+#
+# Clients that do not care skip them: a JSON line with an "info" key, or a
+# frame whose second byte is MODALITY_INFO (in both binary and delta framing).
+
+MODALITY_INFO = 0xFF
+
+
+def encode_info(info: Dict[str, Any], encoding: str, timestamp: float = 0.0) -> bytes:
+    if encoding == ENCODING_JSON:
+        return encode_json({"info": info})
+    body = FRAME_HEADER.pack(PROTOCOL_VERSION, MODALITY_INFO, 0, 0, timestamp) + json.dumps(info).encode("utf-8")
+    return LENGTH_PREFIX.pack(len(body)) + body
+
+
+def decode_info(body: Any) -> Optional[Dict[str, Any]]:
+    """The info object of a frame body (without length prefix), None if it is a landmark frame."""
+    if len(body) < FRAME_HEADER.size or body[1] != MODALITY_INFO:
+        return None
+    return json.loads(bytes(body[FRAME_HEADER.size:]).decode("utf-8"))
+
+
+# ---------------------------------------------------------------------------
+# Delta framing ("delta" encoding)
+# ---------------------------------------------------------------------------
+# For low-bandwidth clients (e.g. Wi-Fi headsets). A keyframe carries every
+# value as float32. The frames in between only carry the landmarks that moved
+# by at least `deadband` since they were last sent, as int16 deltas against the
+# keyframe in steps of `resolution`:
+#
+#     value = keyframe_value + delta * resolution
+#
+# Deltas are taken against the keyframe, not the previous frame, so a delta
+# frame dropped by a client's latest-wins queue does not corrupt later ones;
+# at worst a landmark it carried stays stale until it moves again or the next
+# keyframe. A client that misses a keyframe ignores deltas until the next one
+# (every `keyframe_interval` frames, and whenever a new delta client connects).
+#
+#   uint32  body_length
+#   header  : uint8 version, uint8 modality, uint8 kind (0 keyframe, 1 delta),
+#             uint16 item_count, uint32 frame_id, uint32 keyframe_id,
+#             float64 timestamp, float32 resolution
+#   item_count x item:
+#       uint8 depth_mode, uint8 flags, uint8 n_channels, float32 global_z
+#       float32[3]  face_pose tx, ty, tz   (only if FLAG_FACE_POSE)
+#       n_channels x channel:
+#           uint16 rows, uint8 cols, uint16 n_sent
+#           keyframe : float32[rows * cols]
+#           delta    : uint16[n_sent] row indices, int16[n_sent * cols]
+#
+# Channels per modality:
+#   pose / hand : 0 landmarks (x, y, z, visibility, per_landmark_z), 1 world_landmarks (x, y, z, visibility)
+#   face        : 0 landmarks (x, y, z, visibility, per_landmark_z), 1 blendshape scores
+# flags are the same as in the binary framing.
+
+DELTA_PROTOCOL_VERSION = 1
+
+DELTA_FRAME_HEADER = struct.Struct("<BBBHIIdf")
+DELTA_ITEM_HEADER = struct.Struct("<BBBf")
+DELTA_CHANNEL_HEADER = struct.Struct("<HBH")
+
+DELTA_KIND_KEYFRAME = 0
+DELTA_KIND_DELTA = 1
+
+DELTA_RESOLUTION = 1e-4             # normalized units / meters per int16 step (~0.13 px at 1280 px)
+DELTA_DEADBAND = 5e-4               # changes smaller than this are not resent (~0.6 px at 1280 px)
+DELTA_KEYFRAME_INTERVAL = 30        # frames between keyframes
+
+_I16 = np.dtype("<i2")
+_U16 = np.dtype("<u2")
+_I16_MAX = 32767
+
+
+class _DeltaItem:
+    __slots__ = ("channels", "global_z", "depth_mode", "flags", "face_pose")
+
+    def __init__(
+        self,
+        channels: List[np.ndarray],
+        global_z: float,
+        depth_mode: str,
+        flags: int = 0,
+        face_pose: Optional[Sequence[float]] = None,
+    ):
+        self.channels = [np.nan_to_num(np.asarray(ch, dtype=_F32).reshape(ch.shape[0], -1)) for ch in channels]
+        self.global_z = global_z
+        self.depth_mode = DEPTH_MODES.get(depth_mode, 255)
+        self.flags = flags | (FLAG_FACE_POSE if face_pose is not None else 0)
+        self.face_pose = face_pose
+
+    def layout(self) -> tuple:
+        return (self.flags & 0x03,) + tuple(ch.shape for ch in self.channels)
+
+
+def _landmark_channel(landmarks: np.ndarray, per_landmark_z: np.ndarray) -> np.ndarray:
+    return np.column_stack((landmarks, per_landmark_z.reshape(-1, 1)))
+
+
+class DeltaEncoder:
+    """
+    Keyframe + quantized delta encoder for one landmark stream.
+
+    Keeps the last keyframe and the values each landmark was last sent with,
+    so it must see every frame it encodes in order (one instance per socket,
+    shared by all "delta" clients since they all receive the same bytes).
+    """
+
+    def __init__(
+        self,
+        modality: int,
+        resolution: float = DELTA_RESOLUTION,
+        deadband: float = DELTA_DEADBAND,
+        keyframe_interval: int = DELTA_KEYFRAME_INTERVAL,
+    ):
+        self.modality = modality
+        self.resolution = resolution
+        self.deadband = deadband
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._keyframe_id = 0
+        self._keyframe_layout: Optional[tuple] = None
+        self._keyframe: List[List[np.ndarray]] = []
+        self._sent: List[List[np.ndarray]] = []
+        self._since_keyframe = 0
+        self._force_keyframe = True
+
+    def request_keyframe(self) -> None:
+        """The next encoded frame will be a keyframe (e.g. a delta client just connected)."""
+        self._force_keyframe = True
+
+    def encode_pose(self, frame: Optional[PoseFrame], frame_id: int, timestamp: float) -> bytes:
+        items = []
+        if frame is not None:
+            world = frame.landmarks.world if frame.landmarks.has_world else np.zeros((0, 4), dtype=_F32)
+            items.append(_DeltaItem(
+                [_landmark_channel(frame.landmarks.data, frame.depth.per_landmark_z), world],
+                frame.depth.global_z, frame.depth.mode))
+        return self._encode(items, frame_id, timestamp)
+
+    def encode_hands(self, hands: Sequence[HandFrame], frame_id: int, timestamp: float) -> bytes:
+        items = []
+        for hand in hands:
+            world = hand.landmarks.world if hand.landmarks.has_world else np.zeros((0, 4), dtype=_F32)
+            items.append(_DeltaItem(
+                [_landmark_channel(hand.landmarks.data, hand.depth.per_landmark_z), world],
+                hand.depth.global_z, hand.depth.mode,
+                flags=HANDEDNESS_CODES.get(hand.handedness, 0)))
+        return self._encode(items, frame_id, timestamp)
+
+    def encode_faces(
+        self,
+        faces: Sequence[FaceFrame],
+        blendshapes: Sequence[np.ndarray],
+        frame_id: int,
+        timestamp: float,
+    ) -> bytes:
+        items = []
+        for i, face in enumerate(faces):
+            scores = blendshapes[i] if i < len(blendshapes) else _EMPTY
+            items.append(_DeltaItem(
+                [_landmark_channel(face.landmarks.data, face.depth.per_landmark_z), scores.reshape(-1, 1)],
+                face.depth.global_z, face.depth.mode,
+                face_pose=face.face_pose))
+        return self._encode(items, frame_id, timestamp)
+
+    def _encode(self, items: List[_DeltaItem], frame_id: int, timestamp: float) -> bytes:
+        layout = tuple(item.layout() for item in items)
+        body = None
+        if not self._force_keyframe and layout == self._keyframe_layout and self._since_keyframe < self.keyframe_interval:
+            body = self._delta_body(items)      # None if a delta does not fit in int16
+        if body is None:
+            body = self._keyframe_body(items, frame_id, layout)
+            kind = DELTA_KIND_KEYFRAME
+        else:
+            kind = DELTA_KIND_DELTA
+            self._since_keyframe += 1
+
+        header = DELTA_FRAME_HEADER.pack(
+            DELTA_PROTOCOL_VERSION, self.modality, kind, len(items),
+            frame_id & 0xFFFFFFFF, self._keyframe_id & 0xFFFFFFFF, timestamp, self.resolution)
+        body_bytes = header + b"".join(body)
+        return LENGTH_PREFIX.pack(len(body_bytes)) + body_bytes
+
+    @staticmethod
+    def _item_header(item: _DeltaItem) -> List[bytes]:
+        chunks = [DELTA_ITEM_HEADER.pack(item.depth_mode, item.flags, len(item.channels), item.global_z)]
+        if item.face_pose is not None:
+            chunks.append(np.asarray(item.face_pose, dtype=_F32).tobytes())
+        return chunks
+
+    def _keyframe_body(self, items: List[_DeltaItem], frame_id: int, layout: tuple) -> List[bytes]:
+        self._force_keyframe = False
+        self._since_keyframe = 0
+        self._keyframe_id = frame_id
+        self._keyframe_layout = layout
+        self._keyframe = [[ch.copy() for ch in item.channels] for item in items]
+        self._sent = [[ch.copy() for ch in item.channels] for item in items]
+
+        body: List[bytes] = []
+        for item in items:
+            body.extend(self._item_header(item))
+            for ch in item.channels:
+                rows, cols = ch.shape
+                body.append(DELTA_CHANNEL_HEADER.pack(rows, cols, rows))
+                body.append(ch.tobytes())
+        return body
+
+    def _delta_body(self, items: List[_DeltaItem]) -> Optional[List[bytes]]:
+        body: List[bytes] = []
+        updates = []
+        for item, keyframe, sent in zip(items, self._keyframe, self._sent):
+            body.extend(self._item_header(item))
+            for ch, key_ch, sent_ch in zip(item.channels, keyframe, sent):
+                rows, cols = ch.shape
+                if rows:
+                    moved = np.abs(ch - sent_ch).max(axis=1) >= self.deadband
+                    idx = np.flatnonzero(moved)
+                else:
+                    idx = np.zeros(0, dtype=np.intp)
+                q = np.rint((ch[idx] - key_ch[idx]) / self.resolution)
+                if q.size and np.abs(q).max() > _I16_MAX:
+                    return None
+                updates.append((sent_ch, key_ch, idx, q))
+                body.append(DELTA_CHANNEL_HEADER.pack(rows, cols, idx.size))
+                body.append(idx.astype(_U16).tobytes())
+                body.append(q.astype(_I16).tobytes())
+
+        # Remember what the client now holds, so the deadband compares against it
+        for sent_ch, key_ch, idx, q in updates:
+            sent_ch[idx] = key_ch[idx] + q * self.resolution
+        return body
+
+
+class DeltaDecoder:
+    """
+    Receiver side of DeltaEncoder: decode() every frame body (without its
+    length prefix) in order. Returns the frame as a BinaryFrame, or None for
+    a delta against a keyframe it has not received.
+    """
+
+    def __init__(self):
+        self.keyframe_id: Optional[int] = None
+        self._keyframe: List[List[np.ndarray]] = []
+        self._current: List[List[np.ndarray]] = []
+
+    def decode(self, body: Any) -> Optional[BinaryFrame]:
+        _, modality, kind, item_count, frame_id, keyframe_id, timestamp, resolution = \
+            DELTA_FRAME_HEADER.unpack_from(body, 0)
+        if kind != DELTA_KIND_KEYFRAME and (keyframe_id != self.keyframe_id or item_count != len(self._current)):
+            return None
+        offset = DELTA_FRAME_HEADER.size
+        items = []
+        for i in range(item_count):
+            depth_mode, flags, n_channels, global_z = DELTA_ITEM_HEADER.unpack_from(body, offset)
+            offset += DELTA_ITEM_HEADER.size
+            face_pose = None
+            if flags & FLAG_FACE_POSE:
+                face_pose = tuple(float(v) for v in np.frombuffer(body, dtype=_F32, count=3, offset=offset))
+                offset += 12
+            channels = []
+            for c in range(n_channels):
+                rows, cols, n_sent = DELTA_CHANNEL_HEADER.unpack_from(body, offset)
+                offset += DELTA_CHANNEL_HEADER.size
+                if kind == DELTA_KIND_KEYFRAME:
+                    ch = np.frombuffer(body, dtype=_F32, count=rows * cols, offset=offset).reshape(rows, cols).copy()
+                    offset += rows * cols * 4
+                else:
+                    idx = np.frombuffer(body, dtype=_U16, count=n_sent, offset=offset).astype(np.intp)
+                    offset += n_sent * 2
+                    q = np.frombuffer(body, dtype=_I16, count=n_sent * cols, offset=offset).reshape(n_sent, cols)
+                    offset += n_sent * cols * 2
+                    ch = self._current[i][c]
+                    ch[idx] = self._keyframe[i][c][idx] + q * resolution
+                channels.append(ch)
+            items.append((depth_mode, flags, global_z, face_pose, channels))
+
+        if kind == DELTA_KIND_KEYFRAME:
+            self.keyframe_id = keyframe_id
+            self._keyframe = [[ch.copy() for ch in item[4]] for item in items]
+            self._current = [item[4] for item in items]
+
+        frame = BinaryFrame(modality, frame_id, timestamp)
+        for depth_mode, flags, global_z, face_pose, (landmarks, second) in items:
+            depth = DepthFrame(DEPTH_MODE_NAMES.get(depth_mode, "unknown"), global_z, landmarks[:, 4].copy())
+            if modality == MODALITY_FACE:
+                frame.faces.append(FaceFrame(LandmarkArray(landmarks[:, :4].copy()), depth, face_pose))
+                frame.blendshapes.append(second[:, 0].copy())
+                continue
+            lms = LandmarkArray(landmarks[:, :4].copy(), second.copy() if len(second) else None)
+            if modality == MODALITY_POSE:
+                frame.pose = PoseFrame(lms, depth)
+            else:
+                frame.hands.append(HandFrame(HANDEDNESS_NAMES.get(flags & 0x03, "Unknown"), lms, depth))
+        return frame
+
+
+# ---------------------------------------------------------------------------
+# UDP datagrams
+# ---------------------------------------------------------------------------
+# Optional transport for same-LAN clients: a lost or late datagram never holds
+# back newer frames the way a lost TCP segment does.
+#
+# A client registers by sending a hello datagram to the server's UDP port (the
+# same JSON as the TCP hello line, e.g. {"encoding": "binary"}) and repeats it
+# at least every UDP_CLIENT_TIMEOUT seconds to stay registered; {"bye": true}
+# unregisters. "delta" is served as "binary": a lost delta frame would leave
+# the client wrong until the next keyframe.
+#
+# Every landmark frame is sent as one or more datagrams:
+#   magic "GU", uint8 chunk index, uint8 chunk count, uint32 frame seq,
+#   float64 capture timestamp, then up to UDP_CHUNK_PAYLOAD bytes of the frame
+#   exactly as the TCP stream would carry it (length-prefixed binary / JSON line)
+# Frame seq goes up by one per frame. A receiver keeps only chunks of frames
+# newer than the last one it completed and abandons a partial frame as soon
+# as a chunk of a newer one arrives.
+
+UDP_MAGIC = b"GU"
+UDP_CHUNK_HEADER = struct.Struct("<2sBBId")
+UDP_MAX_DATAGRAM = 1200         # stays under a 1500-byte Ethernet MTU with IPv4/IPv6 + UDP headers
+UDP_CHUNK_PAYLOAD = UDP_MAX_DATAGRAM - UDP_CHUNK_HEADER.size
+UDP_MAX_CHUNKS = 255
+UDP_CLIENT_TIMEOUT = 5.0        # seconds without a hello before a client is dropped
+
+
+def udp_encoding(hello: Dict[str, Any]) -> str:
+    encoding = hello_encoding(hello)
+    return ENCODING_BINARY if encoding == ENCODING_DELTA else encoding
+
+
+def udp_datagrams(frame: bytes, seq: int, timestamp: float) -> List[bytes]:
+    """Splits one encoded frame into datagrams. Returns [] if it needs more than UDP_MAX_CHUNKS."""
+    count = max(1, -(-len(frame) // UDP_CHUNK_PAYLOAD))
+    if count > UDP_MAX_CHUNKS:
+        return []
+    seq &= 0xFFFFFFFF
+    view = memoryview(frame)
+    return [
+        UDP_CHUNK_HEADER.pack(UDP_MAGIC, i, count, seq, timestamp)
+        + view[i * UDP_CHUNK_PAYLOAD:(i + 1) * UDP_CHUNK_PAYLOAD]
+        for i in range(count)
+    ]
+
+
+class UdpFrameAssembler:
+    """
+    Receiver side of udp_datagrams(): add() every datagram, it returns
+    (seq, timestamp, frame) once all chunks of a frame newer than the last
+    completed one are in, and None otherwise. Stale, duplicate and
+    out-of-order datagrams are discarded.
+    """
+
+    def __init__(self):
+        self.last_seq: Optional[int] = None
+        self.frames_lost = 0        # partial frames abandoned for a newer one
+        self._seq: Optional[int] = None
+        self._timestamp = 0.0
+        self._chunks: List[Optional[bytes]] = []
+        self._missing = 0
+
+    def _newer(self, seq: int, than: Optional[int]) -> bool:
+        # uint32 serial number arithmetic, so the stream survives wrap-around
+        return than is None or 0 < ((seq - than) & 0xFFFFFFFF) < 0x80000000
+
+    def add(self, datagram: bytes) -> Optional[Tuple[int, float, bytes]]:
+        if len(datagram) < UDP_CHUNK_HEADER.size:
+            return None
+        magic, index, count, seq, timestamp = UDP_CHUNK_HEADER.unpack_from(datagram, 0)
+        if magic != UDP_MAGIC or index >= count or not self._newer(seq, self.last_seq):
+            return None
+        if seq != self._seq:
+            if self._seq is not None and not self._newer(seq, self._seq):
+                return None     # a late chunk of an older frame
+            if self._seq is not None and self._missing:
+                self.frames_lost += 1
+            self._seq, self._timestamp = seq, timestamp
+            self._chunks = [None] * count
+            self._missing = count
+        if count != len(self._chunks) or self._chunks[index] is not None:
+            return None
+        self._chunks[index] = bytes(datagram[UDP_CHUNK_HEADER.size:])
+        self._missing -= 1
+        if self._missing:
+            return None
+        self.last_seq = seq
+        frame = b"".join(self._chunks)
+        self._seq, self._chunks = None, []
+        return seq, self._timestamp, frame